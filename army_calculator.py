@@ -1,128 +1,140 @@
 import os
 import configparser
-from flask import Flask, request, jsonify, render_template, Response
-from flask_sqlalchemy import SQLAlchemy
+import itertools
+import json
+import time
+from functools import partial
+from flask import Blueprint, Flask, current_app, request, jsonify, render_template, stream_with_context, url_for, Response
 from flask_wtf.csrf import CSRFProtect
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+import battle_sessions
+import breakpoints
+import campaign
+import catalog
+import database
+import engine
+import execution
+import instrumentation
+import jobs
+import optimizer
+import outcome_cache
+import reference_data
+import search
 from forms.forces import ForcesForm
 from forms.military_units import MilitaryUnitsForm
+from models import db, data_version, Force, Fortification, Nation, Quality, Order, Force_Ritual, Fortification_Ritual
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-config = configparser.ConfigParser()
-config.read('configuration.ini')
-
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URI') or 'sqlite:///' + os.path.join(basedir, 'empire_army_manouveres.db')
-app.config['SECRET_KEY'] = config['FLASK']['SECRET_KEY']
-
-csrf = CSRFProtect(app)
-db = SQLAlchemy(app)
-
-class Force(db.Model):
-    force_id = db.Column(db.Integer, primary_key=True, index=True)
-    force_name = db.Column(db.String(80), unique=True, nullable=False)
-    force_is_army = db.Column(db.Boolean, nullable=False)
-    nation_id = db.Column(db.Integer, db.ForeignKey('nation.nation_id'), nullable=False)
-    quality_id = db.Column(db.Integer, db.ForeignKey('quality.quality_id'), nullable=False)
-    large = db.Column(db.Boolean, nullable=False)
-
-    nation = db.relationship('Nation', lazy='joined')
-    quality = db.relationship('Quality', lazy='joined')
-
-    def __repr__(self):
-        return '<Force %r>' % self.force_name
-    
-class Fortification(db.Model):
-    fortification_id = db.Column(db.Integer, primary_key=True, index=True)
-    fortification_name = db.Column(db.String(80), unique=True, nullable=False)
-    fortification_level = db.Column(db.Integer, nullable=False)
-    fortification_maximum_strength = db.Column(db.Integer, nullable=False)
-
-    def __repr__(self):
-        return '<Fortification %r>' % self.fortification_name
-    
-class Nation(db.Model):
-    nation_id = db.Column(db.Integer, primary_key=True, index=True)
-    nation_name = db.Column(db.String(80), unique=True, nullable=False)
-    nation_faction = db.Column(db.String(80), nullable=False)
-
-    def __repr__(self):
-        return '<Nation %r>' % self.nation_name
-    
-quality_order_association = db.Table('quality_order',
-    db.Column('quality_id', db.Integer, db.ForeignKey('quality.quality_id'), primary_key=True),
-    db.Column('order_id', db.Integer, db.ForeignKey('order.order_id'), primary_key=True)
-)
-
-class Quality(db.Model):
-    quality_id = db.Column(db.Integer, primary_key=True, index=True)
-    quality_name = db.Column(db.String(80), unique=True, nullable=False)
-    quality_effects = db.Column(db.Text, nullable=False)
-    quality_descriptors = db.Column(db.Text, nullable=False)
-    quality_description = db.Column(db.Text, nullable=False)
-    quality_orders = db.relationship('Order', secondary=quality_order_association,  lazy='subquery',
-                             backref=db.backref('qualities', lazy=True))
-
-    def __repr__(self):
-        return '<Quality %r>' % self.quality_name
-    
-    def effects_as_list(self):
-        return self.quality_effects.split('. ')
-
-class Order(db.Model):
-    order_id = db.Column(db.Integer, primary_key=True, index=True)
-    order_name = db.Column(db.String(80), unique=True, nullable=False)
-    offensive_order = db.Column(db.Boolean, nullable=False)
-    order_effects = db.Column(db.Text, nullable=False)
-    order_description = db.Column(db.Text(80), nullable=False)
-    casualties_inflicted_modifier = db.Column(db.Float, nullable=False)
-    casualties_suffered_modifier = db.Column(db.Float, nullable=False)
-    territory_claimed_modifier = db.Column(db.Float, nullable=False)
-    territory_defence_modifier = db.Column(db.Float, nullable=False)
-
-    def __repr__(self):
-        return '<Order %r>' % self.order_name
-    
-    def effects_as_list(self):
-        return self.order_effects.split('. ')
-
-class Force_Ritual(db.Model):
-    force_ritual_id = db.Column(db.Integer, primary_key=True, index=True)
-    force_ritual_name = db.Column(db.String(80), unique=True, nullable=False)
-    army_ritual = db.Column(db.Boolean, nullable=False)
-    force_ritual_effects = db.Column(db.Text, nullable=False)
-    force_ritual_quality_id = db.Column(db.Integer, db.ForeignKey('quality.quality_id'), nullable=True)
-    force_effective_strength_modifier = db.Column(db.Integer, nullable=False)
-
-    def __repr__(self):
-        return '<Force_Ritual %r>' % self.force_ritual_name
-
-class Fortification_Ritual(db.Model):
-    fortification_ritual_id = db.Column(db.Integer, primary_key=True, index=True)
-    fortification_ritual_name = db.Column(db.String(80), unique=True, nullable=False)
-    fortification_ritual_effects = db.Column(db.Text, nullable=False)
-    fortification_effective_strength_modifier = db.Column(db.Integer, nullable=False)
-
-    def __repr__(self):
-        return '<Fortification_Ritual %r>' % self.fortification_ritual_name
-
-class Territory_Ritual(db.Model):
-    territory_ritual_id = db.Column(db.Integer, primary_key=True, index=True)
-    territory_ritual_name = db.Column(db.String(80), unique=True, nullable=False)
-    territory_ritual_effects = db.Column(db.Text, nullable=False)
-    territory_ritual_casualties = db.Column(db.Integer, nullable=False)
-    territory_ritual_modifier = db.Column(db.Float, nullable=False)
-
-    def __repr__(self):
-        return '<Territory_Ritual %r>' % self.territory_ritual_name
-
-with app.app_context():
-    db.create_all()
+MAX_BATCH_SCENARIOS = 1000
+MAX_STREAM_SCENARIOS = 100000
+STREAM_PROGRESS_INTERVAL = 100
+NDJSON = 'application/x-ndjson'
+REFERENCE_MAX_AGE = 300
+
+csrf = CSRFProtect()
+views = Blueprint('army_calculator', __name__)
+
+def create_app(config_file='configuration.ini', database_uri=None):
+    # Nothing touches the database here; tables are created by create_data.py or flask create-db
+    started = time.perf_counter()
+    config = configparser.ConfigParser()
+    config.read(config_file)
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri or os.environ.get('DATABASE_URI') or 'sqlite:///' + os.path.join(basedir, 'empire_army_manouveres.db')
+    app.config['SECRET_KEY'] = config['FLASK']['SECRET_KEY']
+
+    execution.configure(
+        workers=config.getint('EXECUTION', 'WORKERS', fallback=0),
+        chunk_size=config.getint('EXECUTION', 'CHUNK_SIZE', fallback=execution.DEFAULT_CHUNK_SIZE)
+    )
+    outcome_cache.configure(
+        max_entries=config.getint('CACHE', 'MAX_ENTRIES', fallback=outcome_cache.DEFAULT_MAX_ENTRIES),
+        ttl=config.getint('CACHE', 'TTL', fallback=outcome_cache.DEFAULT_TTL)
+    )
 
-@app.route('/', methods=['GET', 'POST'])
+    battle_sessions.configure(
+        max_sessions=config.getint('SESSIONS', 'MAX_SESSIONS', fallback=battle_sessions.DEFAULT_MAX_SESSIONS),
+        ttl=config.getint('SESSIONS', 'TTL', fallback=battle_sessions.DEFAULT_TTL)
+    )
+
+    database_settings = database.configure(app, config)
+    csrf.init_app(app)
+    db.init_app(app)
+    database.install(app, db, database_settings)
+
+    if config.getboolean('METRICS', 'ENABLED', fallback=False):
+        instrumentation.init_app(app, database.engines(app, db), server_timing=config.getboolean('METRICS', 'SERVER_TIMING', fallback=True))
+
+    app.extensions['jobs'] = jobs.queue_from_config(config)
+    app.register_blueprint(views)
+    app.cli.command('create-db', help='Create any missing database tables.')(create_db)
+    catalog.set_loader(partial(load_reference_catalog, app), probe=partial(read_data_version, app),
+                       check_interval=config.getfloat('CATALOG', 'CHECK_INTERVAL', fallback=catalog.DEFAULT_CHECK_INTERVAL))
+    search.set_loader(partial(load_search_index, app))
+
+    app.extensions['startup_seconds'] = time.perf_counter() - started
+    app.logger.info('Application created in %.1f ms', app.extensions['startup_seconds'] * 1000)
+    return app
+
+def __getattr__(name):
+    # army_calculator.app, as gunicorn army_calculator:app asks for it, is built on first use
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+def create_db():
+    db.create_all()
+    print('Database tables created.')
+
+def load_reference_catalog(app):
+    with app.app_context(), database.read_only_session(db) as session:
+        return catalog.ReferenceCatalog(
+            nations=[catalog.NationEntry(nation.nation_id, nation.nation_name, nation.nation_faction) for nation in session.query(Nation).all()],
+            qualities=[catalog.QualityEntry(quality.quality_id, quality.quality_name, tuple(sorted(order.order_id for order in quality.quality_orders)))
+                       for quality in session.query(Quality).all()],
+            orders=[catalog.OrderEntry(order.order_id, order.order_name, order.offensive_order, order.casualties_inflicted_modifier,
+                                       order.casualties_suffered_modifier, order.territory_claimed_modifier, order.territory_defence_modifier)
+                    for order in session.query(Order).all()],
+            forces=[catalog.ForceEntry(force.force_id, force.force_name, force.force_is_army, force.nation_id, force.quality_id, force.large)
+                    for force in session.query(Force).all()],
+            fortifications=[catalog.FortificationEntry(fortification.fortification_id, fortification.fortification_name,
+                                                       fortification.fortification_level, fortification.fortification_maximum_strength)
+                            for fortification in session.query(Fortification).all()],
+            force_rituals=[catalog.ForceRitualEntry(ritual.force_ritual_id, ritual.force_ritual_name, ritual.army_ritual,
+                                                    ritual.force_ritual_quality_id or 0, ritual.force_effective_strength_modifier)
+                           for ritual in session.query(Force_Ritual).all()],
+            fortification_rituals=[catalog.FortificationRitualEntry(ritual.fortification_ritual_id, ritual.fortification_ritual_name,
+                                                                    ritual.fortification_effective_strength_modifier)
+                                   for ritual in session.query(Fortification_Ritual).all()]
+        )
+
+def read_data_version(app):
+    # The hash create_data.py stamps on every load; a database it never loaded has none
+    with app.app_context(), database.read_only_session(db) as session:
+        try:
+            return session.execute(select(data_version.c.content_hash)).scalar()
+        except OperationalError:
+            return None
+
+def load_search_index(app, reference):
+    # The catalog leaves out the long texts, so they are read here once per catalog version
+    with app.app_context(), database.read_only_session(db) as session:
+        order_text = {order_id: (effects, description) for order_id, effects, description
+                      in session.query(Order.order_id, Order.order_effects, Order.order_description)}
+        quality_text = {quality_id: (effects, descriptors, description) for quality_id, effects, descriptors, description
+                        in session.query(Quality.quality_id, Quality.quality_effects, Quality.quality_descriptors, Quality.quality_description)}
+    return search.build_index(reference, order_text, quality_text)
+
+@views.route('/', methods=['GET', 'POST'])
 def index():
-    imperial_forces = [(force.force_id, force.force_name) for force in Force.query.join(Nation).filter(Nation.nation_faction == 'The Empire').all()]
-    barbarian_forces = [(force.force_id, force.force_name) for force in Force.query.join(Nation).filter(Nation.nation_faction == 'Barbarian').all()]
+    with database.read_only_session(db) as session:
+        imperial_forces = [(force.force_id, force.force_name) for force in session.query(Force).join(Nation).filter(Nation.nation_faction == 'The Empire').all()]
+        barbarian_forces = [(force.force_id, force.force_name) for force in session.query(Force).join(Nation).filter(Nation.nation_faction == 'Barbarian').all()]
     imperial_forces.insert(0, ('', 'Select Force'))
     barbarian_forces.insert(0, ('', 'Select Force'))
     rituals = []
@@ -147,606 +159,384 @@ def index():
     return render_template('index.html', imperial_form=imperial_form, barbarian_form=barbarian_form, imperial_military_units_form=imperial_military_units_form, barbarian_military_units_form=barbarian_military_units_form)
 
 
-@app.route('/get_force_options', methods=['POST'])
-def get_force_options():
-    role = request.form.get('role')
-    selected_barbarian = request.form.get('selected_barbarian', '')
-    is_barbarian = request.form.get('barbarian', 'false') == 'true'
+def cached_json(payload, not_found='Not found'):
+    # Precomputed reference payloads, revalidated with If-None-Match on GET
+    if payload is None:
+        return jsonify({'error': not_found}), 404
+    response = Response(payload.body, mimetype='application/json')
+    response.set_etag(payload.etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = REFERENCE_MAX_AGE
+    return response.make_conditional(request)
 
-    forces = []
+@views.route('/bootstrap')
+def bootstrap():
+    return cached_json(reference_data.get_payloads().bootstrap)
 
-    if is_barbarian:
-        force_list = Force.query.filter(Force.force_name.contains(selected_barbarian)).all()
-        forces = [(force.force_id, force.force_name) for force in force_list]
-    else:
-        # Fetch imperial forces or other logic based on the role
-        forces = [(force.force_id, force.force_name) for force in Force.query.join(Nation).filter(Nation.nation_faction == 'The Empire').all()]
-    
-    return jsonify({'forces': forces})
+@views.route('/get_force_options', methods=['GET', 'POST'])
+def get_force_options():
+    selected_barbarian = request.values.get('selected_barbarian', '')
+    is_barbarian = request.values.get('barbarian', 'false') == 'true'
+    return cached_json(reference_data.get_payloads().force_options(is_barbarian, selected_barbarian))
 
-@app.route('/get_force_info', methods=['POST'])
+@views.route('/get_force_info', methods=['GET', 'POST'])
 def get_force_info():
-    force_id = request.form['force_id']
-    force = Force.query.get(force_id)
-    if force:
-        return jsonify({
-            'quality': force.quality.quality_id,
-            'large': force.large
-        })
-    return jsonify({'error': 'Force not found'}), 404
-
-from flask import Flask, request, jsonify
-
-@app.route('/get_rituals_by_force', methods=['POST'])
-def get_rituals_by_force():
-    rituals = Force_Ritual.query.filter_by(army_ritual=True).all()
-    ritual_list = [(ritual.force_ritual_id, ritual.force_ritual_name) for ritual in rituals]
+    return cached_json(reference_data.get_payloads().force_info_for(request.values.get('force_id')), 'Force not found')
 
-    return jsonify({'rituals': ritual_list})
+@views.route('/get_rituals_by_force', methods=['GET', 'POST'])
+def get_rituals_by_force():
+    return cached_json(reference_data.get_payloads().force_rituals)
 
-@app.route('/get_force_ritual_effect', methods=['POST'])
+@views.route('/get_force_ritual_effect', methods=['GET', 'POST'])
 def get_force_ritual_effect():
-    ritual_id = request.form.get('ritual_id')
-    ritual = Force_Ritual.query.get(ritual_id)
-    if ritual:
-        return jsonify({
-            'force_effective_strength_modifier': ritual.force_effective_strength_modifier,
-            'force_ritual_quality_id': ritual.force_ritual_quality_id
-        })
-    return jsonify({'error': 'Ritual not found'}), 404
-
-@app.route('/get_orders_by_force', methods=['POST'])
+    return cached_json(reference_data.get_payloads().force_ritual_effect_for(request.values.get('ritual_id')), 'Ritual not found')
+
+@views.route('/get_orders_by_force', methods=['GET', 'POST'])
 def get_orders_by_force():
-    force_id = request.form.get('force_id')
-    if not force_id:
+    # The quality comes from the force itself and the selected ritual, never from the client
+    reference = catalog.get_catalog()
+    try:
+        force = reference.force(request.values.get('force_id'))
+        ritual = reference.force_ritual(request.values.get('ritual_id'))
+    except (KeyError, TypeError, ValueError):
         return jsonify({'orders': []})
-    
-    force = Force.query.get(force_id)
-    if not force:
-        return jsonify({'orders': []})
-    
-    force_quality = request.form.get('force_quality') 
-    quality = Quality.query.get(force_quality)
-    if not quality:
-        return jsonify({'orders': []})
-    
-    orders = Order.query.filter(Order.order_id.between(1, 8)).all()
-    order_list = [(order.order_id, order.order_name, order.offensive_order) for order in orders]
-
-    if force.nation_id == 7:
-        national_orders = Order.query.filter(Order.order_id == 40).first()
-        if national_orders:
-            order_list.append((national_orders.order_id, national_orders.order_name, national_orders.offensive_order))
-        order_list = [order for order in order_list if order[0] != 5]
 
-    if force.nation.nation_faction != "The Empire":
-        order_list = [order for order in order_list if order[0] !=4]
+    return jsonify({'orders': [(order.order_id, order.order_name) for order in reference.orders_for_force(force, ritual)]})
 
-    additional_order_list = [(order.order_id, order.order_name, order.offensive_order) for order in quality.quality_orders]
-    order_list.extend(additional_order_list)
-
-    order_list = sorted(order_list, key=lambda x: (not x[2], x[0]))
-    order_list = [(order[0], order[1]) for order in order_list]
-
-    return jsonify({'orders': order_list})
-
-@app.route('/get_fortification_options', methods=['POST'])
+@views.route('/get_fortification_options', methods=['GET', 'POST'])
 def get_fortification_options():
-    role = request.form['role']
-
-    if role == 'imperial':
-        fortifications = [(fortification.fortification_id, fortification.fortification_name) for fortification in Fortification.query.filter(Fortification.fortification_id >= 6, Fortification.fortification_id < 34).all()]
-    elif role == 'barbarian':
-        fortifications = [(fortification.fortification_id, fortification.fortification_name) for fortification in Fortification.query.filter(Fortification.fortification_id > 0, Fortification.fortification_id < 6).all()]
-    else:
-        fortifications = []
-
-    return jsonify({'fortifications': fortifications})
+    return cached_json(reference_data.get_payloads().fortification_options_for(request.values.get('role')))
 
-@app.route('/get_fortification_info', methods=['POST'])
+@views.route('/get_fortification_info', methods=['GET', 'POST'])
 def get_fortification_info():
-    fortification_id = request.form['fortification_id']
-    fortification = Fortification.query.get(fortification_id)
-    if fortification:
-        return jsonify({
-            'strength': fortification.fortification_maximum_strength
-        })
-    return jsonify({'error': 'Fortification not found'}), 404
-
-@app.route('/get_rituals_by_fortification', methods=['POST'])
-def get_rituals_by_fortification():
-    fortification_rituals = Fortification_Ritual.query.filter(Fortification_Ritual.fortification_ritual_id > 0).all()
-    fortification_ritual_list = [(ritual.fortification_ritual_id, ritual.fortification_ritual_name) for ritual in fortification_rituals]
+    return cached_json(reference_data.get_payloads().fortification_info_for(request.values.get('fortification_id')), 'Fortification not found')
 
-    return jsonify({'rituals': fortification_ritual_list})
+@views.route('/get_rituals_by_fortification', methods=['GET', 'POST'])
+def get_rituals_by_fortification():
+    return cached_json(reference_data.get_payloads().fortification_rituals)
 
-@app.route('/get_fortification_ritual_effect', methods=['POST'])
+@views.route('/get_fortification_ritual_effect', methods=['GET', 'POST'])
 def get_fortification_ritual_effect():
-    ritual_id = request.form.get('ritual_id')
-    ritual = Fortification_Ritual.query.get(ritual_id)
-    if ritual:
-        return jsonify({
-            'fortification_effective_strength_modifier': ritual.fortification_effective_strength_modifier,
-        })
-    return jsonify({'error': 'Ritual not found'}), 404
-
-@app.route('/calculate_outcome', methods=['POST'])
+    return cached_json(reference_data.get_payloads().fortification_ritual_effect_for(request.values.get('ritual_id')), 'Ritual not found')
+
+@views.route('/search')
+def search_catalog():
+    # Typeahead over forces, orders and qualities: ?q=...&type=force,order&faction=...&offensive=true&quality=3&limit=10
+    args = request.args
+    types = [name for name in args.get('type', '').split(',') if name]
+    if any(name not in search.TYPES for name in types):
+        return jsonify({'error': 'type must be one of %s' % ', '.join(search.TYPES)}), 400
+    offensive = args.get('offensive')
+    try:
+        limit = int(args.get('limit', search.DEFAULT_LIMIT))
+        quality = int(args['quality']) if args.get('quality') else None
+    except ValueError:
+        return jsonify({'error': 'limit and quality must be whole numbers'}), 400
+    if not 0 < limit <= search.MAX_LIMIT:
+        return jsonify({'error': 'limit must be between 1 and %d' % search.MAX_LIMIT}), 400
+
+    return jsonify(search.get_index().search(
+        args.get('q', ''), types=types or None, faction=args.get('faction') or None,
+        offensive=None if offensive in (None, '') else offensive == 'true', quality=quality, limit=limit
+    ))
+
+@views.route('/calculate_outcome', methods=['POST'])
 def calculate_outcome():
+    reference = catalog.get_catalog()
+    try:
+        battle = engine.battle_from_dict(request.json, reference)
+    except engine.IllegalOrderError as error:
+        return jsonify({'error': str(error)}), 400
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Invalid battle data'}), 400
+
+    # Repeat calculations of the same battle are answered from the outcome cache
+    result = outcome_cache.resolve_cached(battle, reference, resolve_outcome)
+    with instrumentation.phase('serialization'):
+        return jsonify(result)
+
+def resolve_outcome(battle):
+    result = engine.resolve_battle(battle)
+    with instrumentation.phase('serialization'):
+        return engine.result_to_dict(result)
+
+def session_response(session_id, session, status=200):
+    # Shares the outcome cache with /calculate_outcome: a battle either one has resolved is answered from it,
+    # and a miss is resolved from the session's kept contributions
+    try:
+        result = outcome_cache.resolve_cached(session.battle(), catalog.get_catalog(), lambda battle: engine.result_to_dict(session.resolve()))
+    except Exception:
+        return jsonify({'error': 'Battle could not be resolved', 'session_id': session_id}), 400
+    return jsonify({'session_id': session_id, 'result': result}), status
+
+@views.route('/battle_sessions', methods=['POST'])
+def create_battle_session():
+    # Later edits send only what changed to /battle_sessions/<session_id>
+    try:
+        battle = engine.battle_from_dict(request.json, catalog.get_catalog())
+    except engine.IllegalOrderError as error:
+        return jsonify({'error': str(error)}), 400
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Invalid battle data'}), 400
+
+    session_id, session = battle_sessions.get_store().create(battle)
+    return session_response(session_id, session, 201)
+
+@views.route('/battle_sessions/<session_id>', methods=['PATCH'])
+def update_battle_session(session_id):
+    session = battle_sessions.get_store().get(session_id)
+    if session is None:
+        return jsonify({'error': 'Session not found'}), 404
     data = request.json
-    
-    # Initialize variables to store total strengths for forces and fortifications
-    total_imperial_casualties_inflicted = 0
-    total_imperial_victory_contribution = 0
-    imperial_offensive_victory_contribution = 0
-    imperial_defensive_victory_contribution = 0
-    total_barbarian_casualties_inflicted = 0
-    total_barbarian_victory_contribution = 0
-    barbarian_offensive_victory_contribution = 0
-    barbarian_defensive_victory_contribution = 0
-    all_imperial_forces = []
-    imperial_forces = []
-    imperial_fortifications = []
-    all_barbarian_forces = []
-    barbarian_forces = []
-    barbarian_fortifications = []
-    forces_data = {}
-    fortifications_data = {}
-    
-    # Calculate total imperial force victory contribution and casualties inflicted
-    for imperial_force_data in data['imperial_forces']:
-        force_id = imperial_force_data['force']
-        force = Force.query.get(force_id)
-        casualties_inflicted, offensive_victory_contribution, defensive_victory_contribution = calculate_force_strength(imperial_force_data, data['imperial_forces'])
-        total_imperial_casualties_inflicted += int(casualties_inflicted)
-        imperial_offensive_victory_contribution += int(offensive_victory_contribution)
-        imperial_defensive_victory_contribution += int(defensive_victory_contribution)
-        total_imperial_victory_contribution += int(offensive_victory_contribution) + int(defensive_victory_contribution)
-        imperial_forces.append(imperial_force_data)
-        all_imperial_forces.append(imperial_force_data)
-        forces_data[imperial_force_data['force']] = {
-            'force_name': force.force_name,
-            'strength': imperial_force_data['strength'],
-            'casualties_taken': 0,
-            'remaining_strength': imperial_force_data['strength']
-        }
-
-    # Calculate total imperial fortification victory contribution and casualties inflicted
-    for imperial_fort_data in data['imperial_fortifications']:
-        force_id = imperial_fort_data['fortification']
-        force = Fortification.query.get(force_id)
-        casualties_inflicted, victory_contribution = calculate_fortification_strength(imperial_fort_data)
-        imperial_defensive_victory_contribution += int(victory_contribution)
-        total_imperial_victory_contribution += int(victory_contribution)
-        total_imperial_casualties_inflicted += int(casualties_inflicted)
-        imperial_fortifications.append(imperial_fort_data)
-        all_imperial_forces.append(imperial_fort_data)
-        fortifications_data[imperial_fort_data['fortification']] = {
-            'fortification_name': force.fortification_name,
-            'strength': imperial_fort_data['strength'],
-            'casualties_taken': 0,
-            'remaining_strength': imperial_fort_data['strength']
-        }
-
-    # Calculate total barbarian force victory contribution and casualties inflicted
-    for barbarian_force_data in data['barbarian_forces']:
-        force_id = barbarian_force_data['force']
-        force = Force.query.get(force_id)
-        casualties_inflicted, offensive_victory_contribution, defensive_victory_contribution = calculate_force_strength(barbarian_force_data, data['barbarian_forces'])
-        total_barbarian_casualties_inflicted += int(casualties_inflicted)
-        barbarian_offensive_victory_contribution += int(offensive_victory_contribution)
-        barbarian_defensive_victory_contribution += int(defensive_victory_contribution)
-        total_barbarian_victory_contribution += int(offensive_victory_contribution) + int(defensive_victory_contribution)
-        barbarian_forces.append(barbarian_force_data)
-        all_barbarian_forces.append(barbarian_force_data)
-        forces_data[barbarian_force_data['force']] = {
-            'force_name': force.force_name,
-            'strength': barbarian_force_data['strength'],
-            'casualties_taken': 0,
-            'remaining_strength': barbarian_force_data['strength']
-        }
-
-    # Calculate total imperial fortification victory contribution and casualties inflicted
-    for barbarian_fort_data in data['barbarian_fortifications']:
-        force_id = barbarian_fort_data['fortification']
-        force = Fortification.query.get(force_id)
-        casualties_inflicted, victory_contribution = calculate_fortification_strength(barbarian_fort_data)
-        barbarian_defensive_victory_contribution += int(victory_contribution)
-        total_barbarian_victory_contribution += int(victory_contribution)
-        total_barbarian_casualties_inflicted += int(casualties_inflicted)
-        barbarian_fortifications.append(barbarian_fort_data)
-        all_barbarian_forces.append(barbarian_fort_data)
-        fortifications_data[barbarian_fort_data['fortification']] = {
-            'fortification_name': force.fortification_name,
-            'strength': barbarian_fort_data['strength'],
-            'casualties_taken': 0,
-            'remaining_strength': barbarian_fort_data['strength']
-        }
-
-    total_victory_points, offensive_victory_points, defensive_victory_points, outcome = calculate_victory_points(
-        total_imperial_victory_contribution, imperial_offensive_victory_contribution, imperial_defensive_victory_contribution,
-        total_barbarian_victory_contribution, barbarian_offensive_victory_contribution, barbarian_defensive_victory_contribution,
-        all_imperial_forces, all_barbarian_forces
-    )
-    
-    # Distribute casualties and calculate remaining strengths for forces
-    imperial_force_casualties_taken, imperial_force_remaining_strength, offensive_victory_points = distribute_force_casualties(
-        total_barbarian_casualties_inflicted, imperial_forces, outcome, offensive_victory_points, defensive_victory_points, all_imperial_forces, all_barbarian_forces, is_barbarian = False
-    )
-    barbarian_force_casualties_taken, barbarian_force_remaining_strength, offensive_victory_points = distribute_force_casualties(
-        total_imperial_casualties_inflicted, barbarian_forces, outcome, offensive_victory_points, defensive_victory_points, all_imperial_forces, all_barbarian_forces, is_barbarian = True
-    )
-
-    # Distribute casualties and calculate remaining strengths for fortifications
-    imperial_fort_casualties_taken, imperial_fort_remaining_strength = distribute_fortification_casualties(
-        total_barbarian_casualties_inflicted, imperial_fortifications, outcome, defensive_victory_points, all_imperial_forces, all_barbarian_forces, is_barbarian=False
-    )
-    barbarian_fort_casualties_taken, barbarian_fort_remaining_strength = distribute_fortification_casualties(
-        total_imperial_casualties_inflicted, barbarian_fortifications, outcome, defensive_victory_points, all_imperial_forces, all_barbarian_forces, is_barbarian = True
-    )
-    if total_victory_points - defensive_victory_points != offensive_victory_points:
-        total_victory_points = defensive_victory_points + offensive_victory_points
-
-    # Update forces_data with casualties and remaining strengths for imperial forces and fortifications
-    for force_id, casualties in imperial_force_casualties_taken.items():
-        forces_data[force_id]['casualties_taken'] = casualties
-        forces_data[force_id]['remaining_strength'] = imperial_force_remaining_strength[force_id]
-    
-    for force_id, casualties in imperial_fort_casualties_taken.items():
-        fortifications_data[force_id]['casualties_taken'] = casualties
-        fortifications_data[force_id]['remaining_strength'] = imperial_fort_remaining_strength[force_id]
-
-    # Update forces_data with casualties and remaining strengths for barbarian forces and fortifications
-    for force_id, casualties in barbarian_force_casualties_taken.items():
-        forces_data[force_id]['casualties_taken'] = casualties
-        forces_data[force_id]['remaining_strength'] = barbarian_force_remaining_strength[force_id]
-    
-    for force_id, casualties in barbarian_fort_casualties_taken.items():
-        fortifications_data[force_id]['casualties_taken'] = casualties
-        fortifications_data[force_id]['remaining_strength'] = barbarian_fort_remaining_strength[force_id]
-
-    # Summarize the outcome
-    summary = {
-        'total_victory_points': str(total_victory_points),
-        'offensive_victory_points': str(offensive_victory_points),
-        'defensive_victory_points': str(defensive_victory_points),
-        'outcome': outcome,
-        'forces_data': forces_data,
-        'fortifications_data': fortifications_data
-    }
-    
-    return jsonify(summary)
+    with session.lock:
+        try:
+            changes = session.parse_changes(data.get('changes') if isinstance(data, dict) else None, catalog.get_catalog())
+        except engine.IllegalOrderError as error:
+            return jsonify({'error': str(error)}), 400
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'Invalid change'}), 400
+        session.apply(changes)
+        return session_response(session_id, session)
+
+@views.route('/battle_sessions/<session_id>', methods=['DELETE'])
+def delete_battle_session(session_id):
+    if not battle_sessions.get_store().delete(session_id):
+        return jsonify({'error': 'Session not found'}), 404
+    return '', 204
+
+@views.route('/calculate_outcomes', methods=['POST'])
+def calculate_outcomes():
+    # NDJSON in, or asked for with Accept, streams the results instead
+    if request.mimetype == NDJSON or request.accept_mimetypes.best_match(['application/json', NDJSON]) == NDJSON:
+        return stream_outcomes()
 
-def calculate_force_strength(force_data, all_forces):
-    victory_modifier = 0
-    force_data_strength = force_data['strength']
-    if force_data_strength == '':
-        force_data_strength = 0
-    force_strength = int(force_data_strength)
-    order_id = force_data['order']
-    if order_id == '':
-        order_id = 6
-    order = Order.query.get(order_id)
-    force_ritual_id = force_data['ritual']
-    if force_ritual_id == '':
-        force_ritual_id = 0
-    force_ritual = Force_Ritual.query.get(force_ritual_id)
-    ritual_strength = force_ritual.force_effective_strength_modifier
-    force_strength += ritual_strength
-    casualties_inflicted_modifier = order.casualties_inflicted_modifier
-    
-    additional_casualties_inflicted_modifier = 0
-    for other_force in all_forces:
-        if other_force == force_data:
-            continue
-        other_order_id = other_force['order']
-        if other_order_id == '':
-            other_order_id = 6
-        other_order = Order.query.get(other_order_id)
-        if other_order.order_name == "Whatever it Takes":
-            additional_casualties_inflicted_modifier += 0.1
-        if other_order.order_name == "Fire in the Blood" and force_data.offensive_order:
-            additional_casualties_inflicted_modifier += 0.1
-    
-    casualties_inflicted = int(((force_strength * (1 + casualties_inflicted_modifier + additional_casualties_inflicted_modifier))/10))
-    if force_ritual.force_ritual_id == 2:
-        victory_modifier = 2000
-    if order.offensive_order:
-        offensive_victory_modifier = order.territory_claimed_modifier
-        offensive_victory_contribution = force_strength * (1 + offensive_victory_modifier) + victory_modifier
-        defensive_victory_contribution = 0
-    else:
-        defensive_victory_modifier = order.territory_defence_modifier
-        defensive_victory_contribution = force_strength * (1 + defensive_victory_modifier) + victory_modifier
-        offensive_victory_contribution = 0
-    return casualties_inflicted, offensive_victory_contribution, defensive_victory_contribution
-
-def calculate_fortification_strength(fort_data):
-    fort_casualties_inflicted = 0
-    fort_ritual_id = fort_data['ritual']
-    if fort_ritual_id == '':
-        fort_ritual_id = 0
-    fort_ritual = Fortification_Ritual.query.get(fort_ritual_id)
-    fort_ritual_strength = fort_ritual.fortification_effective_strength_modifier
-    if fort_data['strength'].isdigit():
-        fort_strength = int(fort_data['strength'])
-    fort_strength += fort_ritual_strength
-    if fort_data['besieged']:
-        fort_victory_contribution = fort_strength * 2
-        fort_casualties_inflicted = fort_strength/10
+    data = request.json
+    scenarios = data.get('scenarios') if isinstance(data, dict) else data
+    if not isinstance(scenarios, list):
+        return jsonify({'error': 'Expected a list of scenarios'}), 400
+    if len(scenarios) > MAX_BATCH_SCENARIOS:
+        return jsonify({'error': 'Too many scenarios, the limit is %d' % MAX_BATCH_SCENARIOS}), 400
+
+    # Every scenario shares one catalog, and one bad scenario only fails its own entry
+    reference = catalog.get_catalog()
+    results = list(execution.resolve_scenarios(scenarios, reference))
+    with instrumentation.phase('serialization'):
+        return jsonify({'results': results})
+
+def stream_outcomes():
+    # Scenarios posted as NDJSON are read line by line as they are resolved, so neither side of a long batch is held in memory
+    if request.mimetype == NDJSON:
+        scenarios, total = read_ndjson(request.stream), None
     else:
-        fort_victory_contribution = fort_strength
-    
-    return fort_casualties_inflicted, fort_victory_contribution
-
-def calculate_victory_points(total_imperial_victory_contribution, imperial_offensive_victory_contribution,
-                             imperial_defensive_victory_contribution, total_barbarian_victory_contribution,
-                             barbarian_offensive_victory_contribution, barbarian_defensive_victory_contribution,
-                             all_imperial_forces, all_barbarian_forces):
-    
-    offensive_victory_points = 0
-    defensive_victory_points = 0
-    imperial_orders = []
-    imperial_offensive_orders = []
-    imperial_defensive_orders = []
-    barbarian_offensive_orders = []
-    barbarian_defensive_orders = []
-
-    for force in all_imperial_forces:
-        if 'force' in force and force['force']:
-            order_id = force['order']
-            if order_id == '':
-                order_id = 6
-            order = Order.query.get(order_id)
-            imperial_orders.append(order)
-            if order.offensive_order:
-                imperial_offensive_orders.append(order.order_name)
-            else:
-                imperial_defensive_orders.append(order.order_name)
-    
-    for force in all_barbarian_forces:
-        if 'force' in force and force['force']:
-            order_id = force['order']
-            if order_id == '':
-                order_id = 6
-            order = Order.query.get(order_id)
-            if order.offensive_order:
-                barbarian_offensive_orders.append(order.order_name)
-            else:
-                barbarian_defensive_orders.append(order.order_name)
-
-    disciplined_vp = 0
-    if 'Strategic Defence' in imperial_defensive_orders:
-        disciplined_vp = len(barbarian_offensive_orders)
-        if disciplined_vp > 5:
-            disciplined_vp = 5
-
-    skirmishing_vp = 0
-    if 'Outmanouvere' in imperial_offensive_orders:
-        skirmishing_vp = len(barbarian_defensive_orders)
-        if skirmishing_vp > 5:
-            skirmishing_vp = 5
-
-    if total_imperial_victory_contribution > total_barbarian_victory_contribution:
-        outcome = 'Imperial Victory'
-        total_victory_points = int((total_imperial_victory_contribution - total_barbarian_victory_contribution) / 1000)
-
-        if imperial_offensive_victory_contribution == 0:
-            offensive_victory_points = 0
-            defensive_victory_points = int((imperial_defensive_victory_contribution - total_barbarian_victory_contribution) / 1000)
-            defensive_victory_points += disciplined_vp
-        elif imperial_defensive_victory_contribution == 0:
-            offensive_victory_points = int((imperial_offensive_victory_contribution - total_barbarian_victory_contribution) / 1000)
-            offensive_victory_points += skirmishing_vp
-            defensive_victory_points = 0
+        data = request.json
+        scenarios = data.get('scenarios') if isinstance(data, dict) else data
+        if not isinstance(scenarios, list):
+            return jsonify({'error': 'Expected a list of scenarios'}), 400
+        if len(scenarios) > MAX_STREAM_SCENARIOS:
+            return jsonify({'error': 'Too many scenarios, the limit is %d' % MAX_STREAM_SCENARIOS}), 400
+        total = len(scenarios)
+
+    reference = catalog.get_catalog()
+    return Response(stream_with_context(outcome_records(scenarios, total, reference)), mimetype=NDJSON)
+
+def read_ndjson(lines):
+    # A line that is not JSON becomes None, which resolves to an invalid battle error in its place
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+def ndjson_line(record):
+    return json.dumps(record, sort_keys=True, separators=(',', ':')) + '\n'
+
+def outcome_records(scenarios, total, reference):
+    # A result or error record per scenario, in order, a progress record every STREAM_PROGRESS_INTERVAL and a done record last
+    scenarios = iter(scenarios)
+    completed = errors = 0
+    for index, result in enumerate(execution.resolve_scenarios(itertools.islice(scenarios, MAX_STREAM_SCENARIOS), reference)):
+        if 'error' in result:
+            errors += 1
+            yield ndjson_line({'type': 'error', 'index': index, 'error': result['error']})
         else:
-            difference = total_imperial_victory_contribution - total_barbarian_victory_contribution
-            offensive_split = imperial_offensive_victory_contribution / total_imperial_victory_contribution
-            defensive_split = imperial_defensive_victory_contribution / total_imperial_victory_contribution
-
-            # Calculate victory points without rounding to integers
-            offensive_victory_points = int(difference * offensive_split / 1000)
-            offensive_victory_points += skirmishing_vp
-            defensive_victory_points = int(difference * defensive_split / 1000)
-            defensive_victory_points += disciplined_vp
-
-        # Adjust the split to ensure the total victory points remain consistent
-        remaining_points = total_victory_points - (int(offensive_victory_points) + int(defensive_victory_points))
-        if remaining_points != 0:
-            if offensive_split > defensive_split:
-                offensive_victory_points += remaining_points
-            else:
-                defensive_victory_points += remaining_points
-
-    elif total_imperial_victory_contribution == total_barbarian_victory_contribution:
-        outcome = 'Draw'
-        total_victory_points = 0
+            yield ndjson_line({'type': 'result', 'index': index, 'result': result})
+        completed += 1
+        if completed % STREAM_PROGRESS_INTERVAL == 0:
+            yield ndjson_line({'type': 'progress', 'completed': completed, 'errors': errors, 'total': total})
+    if any(True for _ in itertools.islice(scenarios, 1)):
+        yield ndjson_line({'type': 'error', 'error': 'Too many scenarios, the limit is %d' % MAX_STREAM_SCENARIOS})
+    yield ndjson_line({'type': 'done', 'completed': completed, 'errors': errors, 'total': total})
+
+@views.route('/simulate_outcome', methods=['POST'])
+def simulate_outcome():
+    # Imported here so only processes that simulate pay for NumPy
+    import simulation
+    data = request.json
+    try:
+        battle, strength_specs = simulation.simulation_from_dict(data, catalog.get_catalog())
+        samples = int(data.get('samples', simulation.DEFAULT_SAMPLES))
+        summary = simulation.simulate(battle, strength_specs, samples, data.get('seed'))
+    except engine.IllegalOrderError as error:
+        return jsonify({'error': str(error)}), 400
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Invalid simulation data'}), 400
 
-    else:
-        outcome = 'Barbarian Victory'
-        total_victory_points = int((total_barbarian_victory_contribution - total_imperial_victory_contribution) / 1000)
-        if barbarian_offensive_victory_contribution == 0:
-            offensive_victory_points = 0
-            defensive_victory_points = int((barbarian_defensive_victory_contribution - total_imperial_victory_contribution) / 1000)
-        elif barbarian_defensive_victory_contribution == 0:
-            offensive_victory_points = int((barbarian_offensive_victory_contribution - total_imperial_victory_contribution) / 1000)
-            defensive_victory_points = 0
-        else:
-            difference = total_barbarian_victory_contribution - total_imperial_victory_contribution
-            offensive_split = barbarian_offensive_victory_contribution / total_barbarian_victory_contribution
-            defensive_split = barbarian_defensive_victory_contribution / total_barbarian_victory_contribution
-            offensive_victory_points = int((difference * offensive_split) / 1000 + 0.5)
-            defensive_victory_points = int((difference * defensive_split) / 1000 + 0.5)
-
-    return total_victory_points, offensive_victory_points, defensive_victory_points, outcome
-
-def distribute_force_casualties(total_casualties_inflicted, forces, outcome, offensive_victory_points, defensive_victory_points, all_imperial_forces, all_barbarian_forces, is_barbarian):
-    casualties_taken = {}
-    remaining_strength = {}
-    exceptions = []
-    force_break = 1000
-    large_force_break = 1250
-    offensive_victory_points = offensive_victory_points
-
-    # Filter forces based on conditions
-    filtered_forces = [force for force in forces if 'force' in force and force.get('order') != "42"]
-    # Filter forces based on conditions
-    if is_barbarian:
-        total_forces = all_barbarian_forces
-        exempt_fortifications = [force for force in all_barbarian_forces if 'fortification' in force and not force.get('besieged')]
-    else:
-        total_forces = all_imperial_forces
-        exempt_fortifications = [force for force in all_imperial_forces if 'fortification' in force and not force.get('besieged')]
-
-    exempt_forces = [force for force in forces if 'force' in force and force.get('order') == "42"]
-    exceptions = exempt_fortifications + exempt_forces
-
-    # Check for global effects from barbarian and imperial orders
-    if any(force in all_barbarian_forces for force in forces):
-        for force in all_imperial_forces:
-            order_id = force.get('order')
-            if order_id == '':
-                order_id = 6
-            if order_id:
-                order = Order.query.get(order_id)
-                if order.order_name == "Merciless Onslaught":
-                    force_break = 1500
-                    large_force_break = 2250
-
-    for force in filtered_forces:
-        modifier = 1
-        force_id = force.get('force')
-        order_id = force.get('order')
-        if order_id == '':
-            order_id = 6
-        force_data_strength = force['strength']
-        if force_data_strength == '':
-            force_data_strength = 0
-        force_strength = int(force_data_strength)
-
-        force_details = Force.query.get(force_id)
-
-        if order_id:
-            order = Order.query.get(order_id)
-            modifier += order.casualties_suffered_modifier
-
-        additional_casualty_reduction_modifier = 0
-        for other_force in filtered_forces:
-            if other_force == force:
-                continue
-            other_order_id = other_force.get('order')
-            if other_order_id:
-                other_order = Order.query.get(other_order_id)
-                if other_order and other_order.order_name == "Tend the Fallen":
-                    additional_casualty_reduction_modifier = -0.1
-        modifier += additional_casualty_reduction_modifier
-
-        if (outcome == 'Imperial Victory' and force in all_imperial_forces) or (outcome == 'Barbarian Victory' and force in all_barbarian_forces):
-            modifier -= (defensive_victory_points / 100)
-
-        modified_casualties = int(total_casualties_inflicted / (len(total_forces) - len(exceptions)) * modifier)
-        if order_id and order.order_name == 'Lay Low':
-            modified_casualties = 0
-
-        casualties_taken[force_id] = modified_casualties
-        new_strength = force_strength - casualties_taken[force_id]
-
-        if not force_details.large and new_strength < force_break:
-            new_strength = 0
-        elif force_details.large and new_strength < large_force_break:
-            new_strength = 0
-        if order.order_name == 'Final Stand':
-            new_strength, additional_casualties, offensive_victory_points = calculate_final_stand_casualties(force, offensive_victory_points)
-            casualties_taken[force_id] += additional_casualties
-
-        remaining_strength[force_id] = new_strength
-
-    return casualties_taken, remaining_strength, offensive_victory_points
-
-def distribute_fortification_casualties(total_casualties_inflicted, forces, outcome, defensive_victory_points, imperial_forces, barbarian_forces, is_barbarian):
-    casualties_taken = {}
-    remaining_strength = {}
-    fortification_break = 1000
-    extra_fortification_casualties = 0
-
-    # Filter forces based on conditions
-    filtered_fortifications = [force for force in forces if 'fortification' in force and force.get('besieged')]
-    if is_barbarian:
-        total_forces = barbarian_forces
-        exempt_forces = [force for force in total_forces if 'force' in force and force.get('order') == "42"]
-    else:
-        total_forces = imperial_forces
-        exempt_forces = [force for force in total_forces if 'force' in force and force.get('order') == "42"]
-    exempt_fortifications = [force for force in forces if 'fortification' in force and not force.get('besieged')]
-    exceptions = exempt_forces + exempt_fortifications
-
-    # Only apply Storm the Walls logic if processing barbarian fortifications
-    if is_barbarian:
-        for force in imperial_forces:
-            order_id = force.get('order')
-            if order_id:
-                order = Order.query.get(order_id)
-                if order and order.order_name == "Storm the Walls":
-                    extra_fortification_casualties = 0.3
-
-    for force in filtered_fortifications:
-        modifier = 1
-        force_id = force.get('fortification')
-        force_data_strength = force['strength']
-        if force_data_strength == '':
-            force_data_strength = 0
-        force_strength = int(force_data_strength)
-
-        modifier += extra_fortification_casualties
-
-        if (outcome == 'Imperial Victory' and force in imperial_forces) or (outcome == 'Barbarian Victory' and force in barbarian_forces):
-            modifier -= (defensive_victory_points / 100)
-
-        modified_casualties = int(total_casualties_inflicted / (len(total_forces) - len(exceptions)) * modifier)
-
-        casualties_taken[force_id] = modified_casualties
-        new_strength = force_strength - casualties_taken[force_id]
-
-        if new_strength < fortification_break:
-            new_strength = 0
-
-        remaining_strength[force_id] = new_strength
-
-    return casualties_taken, remaining_strength
-
-def calculate_final_stand_casualties(force, offensive_vp):
-    vp = offensive_vp
-    additional_casualties = 0
-    force_id = force.get('force')
-    strength = int(force.get('strength'))
-    force = Force.query.get(force_id)
-    if force.large:
-        break_limit = 1500
-    else:
-        break_limit = 1000
-    while strength > break_limit and vp > 0:
-        strength -= 100
-        additional_casualties += 100
-        vp -= 1
-    if strength < break_limit:
-        strength = 0
-    return strength, additional_casualties, vp
-
-@app.route('/forces')
+    return jsonify(summary)
+
+@views.route('/outcome_grid', methods=['POST'])
+def outcome_grid():
+    import simulation
+    data = request.json
+    try:
+        battle, strength_specs = simulation.simulation_from_dict(data, catalog.get_catalog())
+        grid = simulation.evaluate_grid(battle, strength_specs, data['x'], data['y'])
+    except engine.IllegalOrderError as error:
+        return jsonify({'error': str(error)}), 400
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Invalid grid request'}), 400
+
+    return jsonify(grid)
+
+@views.route('/plan_siege', methods=['POST'])
+def plan_siege():
+    import siege
+    try:
+        plan = siege.siege_from_dict(request.json, catalog.get_catalog())
+    except engine.IllegalOrderError as error:
+        return jsonify({'error': str(error)}), 400
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Invalid siege request'}), 400
+
+    return jsonify(plan)
+
+@views.route('/optimize_orders', methods=['POST'])
+def optimize_orders():
+    data = request.json
+    reference = catalog.get_catalog()
+    try:
+        battle = engine.battle_from_dict(data, reference)
+        result = optimizer.optimize_orders(
+            battle, data.get('side', 'imperial'), data.get('objective', 'total_vp'), reference,
+            top_k=int(data.get('top_k', optimizer.DEFAULT_TOP_K)),
+            time_budget=float(data.get('time_budget', optimizer.DEFAULT_TIME_BUDGET))
+        )
+    except engine.IllegalOrderError as error:
+        return jsonify({'error': str(error)}), 400
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Invalid optimization request'}), 400
+
+    return jsonify(result)
+
+@views.route('/find_breakpoint', methods=['POST'])
+def find_breakpoint():
+    try:
+        result = breakpoints.breakpoint_from_dict(request.json, catalog.get_catalog())
+    except engine.IllegalOrderError as error:
+        return jsonify({'error': str(error)}), 400
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Invalid breakpoint request'}), 400
+
+    return jsonify(result)
+
+@views.route('/simulate_campaign', methods=['POST'])
+def simulate_campaign():
+    try:
+        result = campaign.simulate_campaign(request.json, catalog.get_catalog())
+    except engine.IllegalOrderError as error:
+        return jsonify({'error': str(error)}), 400
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Invalid campaign data'}), 400
+
+    return jsonify(result)
+
+def job_queue():
+    return current_app.extensions['jobs']
+
+def job_client():
+    # Jobs in progress are limited per remote address; anything the client sends could be changed to dodge the limit
+    return request.remote_addr or 'unknown'
+
+@views.route('/jobs', methods=['POST'])
+def submit_job():
+    data = request.json
+    if not isinstance(data, dict) or not isinstance(data.get('payload'), (dict, list)):
+        return jsonify({'error': 'Expected a job type and payload'}), 400
+    try:
+        job_id = job_queue().submit(data.get('type'), data['payload'], job_client())
+    except jobs.JobLimitError as error:
+        return jsonify({'error': str(error)}), 429
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+
+    response = jsonify(job_queue().get(job_id))
+    response.status_code = 202
+    response.headers['Location'] = url_for('.job_status', job_id=job_id)
+    return response
+
+@views.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    # ?wait=N holds the request until the job finishes, for up to N seconds
+    try:
+        wait = float(request.args.get('wait', 0))
+    except ValueError:
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+    job = job_queue().wait(job_id, wait) if wait > 0 else job_queue().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@views.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = job_queue().get(job_id, with_result=True)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] != 'done':
+        return jsonify({'error': job.get('error') or 'Job is %s' % job['status'], 'status': job['status']}), 409
+    return jsonify(job['result'])
+
+@views.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    if not job_queue().cancel(job_id):
+        job = job_queue().get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify({'error': 'Job has already finished', 'status': job['status']}), 409
+    return jsonify(job_queue().get(job_id))
+
+@views.route('/metrics')
+def metrics():
+    if not instrumentation.enabled(current_app):
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    cache = outcome_cache.get_cache().stats()
+    body = instrumentation.metrics.render(extra=(
+        ('army_calculator_outcome_cache_hits_total', 'counter', 'Outcomes answered from the cache.', cache['hits']),
+        ('army_calculator_outcome_cache_misses_total', 'counter', 'Outcomes resolved and added to the cache.', cache['misses']),
+        ('army_calculator_outcome_cache_entries', 'gauge', 'Outcomes currently cached.', cache['entries']),
+        ('army_calculator_startup_seconds', 'gauge', 'Time taken to create the application.', '%.6f' % current_app.extensions['startup_seconds'])
+    ))
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+@views.route('/forces')
 def forces():
-    forces = Force.query.filter(Force.force_id != 0).all()
-    return render_template('forces.html', forces=forces)
+    with database.read_only_session(db) as session:
+        forces = session.query(Force).filter(Force.force_id != 0).all()
+        return render_template('forces.html', forces=forces)
 
-@app.route('/qualities')
+@views.route('/qualities')
 def qualities():
-    qualities = Quality.query.filter(Quality.quality_id != 0).all()
-    return render_template('qualities.html', qualities=qualities)
+    with database.read_only_session(db) as session:
+        qualities = session.query(Quality).filter(Quality.quality_id != 0).all()
+        return render_template('qualities.html', qualities=qualities)
 
-@app.route('/orders')
+@views.route('/orders')
 def orders():
-    orders = Order.query.filter(Order.order_id != 0).all()
-    return render_template('orders.html', orders=orders)
+    with database.read_only_session(db) as session:
+        orders = session.query(Order).filter(Order.order_id != 0).all()
+        return render_template('orders.html', orders=orders)
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
 
     
\ No newline at end of file
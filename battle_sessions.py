@@ -0,0 +1,130 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import catalog
+from engine import Battle, IncrementalSide, force_from_dict, fortification_from_dict, settle_battle
+
+# Planning sessions that resolve a battle again after each edit. A session keeps
+# every side's forces, order counts and per-combatant contributions from the last
+# resolution, so an edit to one force or fortification only recalculates that
+# entry and the side's totals. Forces whose contribution depends on how many
+# others share a stacking order are all recalculated when that count changes.
+# Sessions live in the memory of one process and expire after a TTL.
+
+DEFAULT_MAX_SESSIONS = 1024
+DEFAULT_TTL = 1800
+MAX_CHANGES = 100
+SIDES = ('imperial', 'barbarian')
+class BattleSession:
+    def __init__(self, battle):
+        self.sides = {
+            'imperial': IncrementalSide(battle.imperial_forces, battle.imperial_fortifications),
+            'barbarian': IncrementalSide(battle.barbarian_forces, battle.barbarian_fortifications)
+        }
+        self.lock = threading.Lock()
+
+    def battle(self):
+        imperial, barbarian = self.sides['imperial'], self.sides['barbarian']
+        return Battle(tuple(imperial.forces.values()), tuple(imperial.fortifications.values()),
+                      tuple(barbarian.forces.values()), tuple(barbarian.fortifications.values()))
+
+    def parse_changes(self, changes, reference):
+        # Every change is checked before any is applied, so a bad one leaves the session as it was.
+        # A change is {"side", "force" or "fortification": position, and any of "strength", "order", "ritual", "besieged"}
+        if not isinstance(changes, list) or not 0 < len(changes) <= MAX_CHANGES:
+            raise ValueError('Expected between 1 and %d changes' % MAX_CHANGES)
+        pending = {}
+        for change in changes:
+            side = self.sides[change['side']]
+            if 'force' in change:
+                key = (change['side'], 'force', int(change['force']))
+                current = pending.get(key) or side.forces[key[2]]
+                pending[key] = force_from_dict({
+                    'force': current.force.force_id,
+                    'strength': change.get('strength', current.strength),
+                    'order': change.get('order', current.order.order_id),
+                    'ritual': change.get('ritual', current.ritual.force_ritual_id)
+                }, reference)
+            else:
+                key = (change['side'], 'fortification', int(change['fortification']))
+                current = pending.get(key) or side.fortifications[key[2]]
+                pending[key] = fortification_from_dict({
+                    'fortification': current.fortification.fortification_id,
+                    'strength': change.get('strength', current.strength),
+                    'ritual': change.get('ritual', current.ritual.fortification_ritual_id),
+                    'besieged': change.get('besieged', current.besieged)
+                }, reference)
+        return pending
+
+    def apply(self, pending):
+        changed = {side: [] for side in SIDES}
+        recalculate_all = set()
+        for (side_name, kind, index), entry in pending.items():
+            side = self.sides[side_name]
+            if kind == 'fortification':
+                side.set_fortification(index, entry)
+            elif side.set_force(index, entry):
+                recalculate_all.add(side_name)
+            else:
+                changed[side_name].append(index)
+        for side_name, side in self.sides.items():
+            side.update_forces(changed[side_name], side_name in recalculate_all)
+
+    def resolve(self):
+        imperial, barbarian = self.sides['imperial'], self.sides['barbarian']
+        return settle_battle(self.battle(), imperial.aggregates, barbarian.aggregates, tuple(imperial.totals), tuple(barbarian.totals))
+
+
+class SessionStore:
+    def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS, ttl=DEFAULT_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, battle):
+        session_id = uuid.uuid4().hex
+        session = BattleSession(battle)
+        with self._lock:
+            self._sessions[session_id] = (time.monotonic() + self.ttl, session)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session_id, session
+
+    def get(self, session_id):
+        # Each use extends the session's lifetime
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._sessions[session_id]
+                return None
+            self._sessions[session_id] = (time.monotonic() + self.ttl, entry[1])
+            self._sessions.move_to_end(session_id)
+            return entry[1]
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+
+_store = SessionStore()
+
+def configure(max_sessions=DEFAULT_MAX_SESSIONS, ttl=DEFAULT_TTL):
+    global _store
+    _store = SessionStore(max_sessions, ttl)
+    return _store
+
+def get_store():
+    return _store
+
+@catalog.on_reload
+def _flush(reference):
+    # Sessions hold entries from the old catalog
+    _store.clear()
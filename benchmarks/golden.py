@@ -0,0 +1,267 @@
+import argparse
+import gzip
+import importlib
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+
+# A recorded corpus of battle -> result pairs, and a differential runner that
+# replays it through an engine. The results are recorded from the app as it was
+# before engine.py existed (see legacy.py), so the reference engine is checked
+# against the original /calculate_outcome view rather than against itself; cases
+# where the current reference engine disagreed at recording time are printed and
+# annotated in the corpus. Battles that cannot be resolved are kept, with the
+# exception raised, so an engine must fail on exactly the same ones. Run from the
+# repository root, next to configuration.ini:
+#
+#     python -m benchmarks.golden check                      every built-in engine
+#     python -m benchmarks.golden check --engine vectorized
+#     python -m benchmarks.golden check --engine mypackage.module:resolve
+#     python -m benchmarks.golden record                     rewrite the corpus
+#
+# A custom engine is a callable taking (scenarios, reference) and returning one
+# result per scenario: the result_to_dict() shape, {'error': ...} for a battle it
+# could not resolve, or None to skip a battle it does not support.
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden_corpus.jsonl.gz')
+CORPUS_SIZES = {
+    'skirmish': 600, 'pitched_battle': 100, 'siege': 400, 'aura_heavy': 400,
+    'final_stand': 600, 'barbarian_victory': 500, 'defensive': 600, 'one_sided_imperial': 600, 'form_defaults': 500
+}
+
+
+def _final_stand_pair():
+    # Two Final Stand forces drain the victory points one after the other, so swapping their rows swaps their casualties
+    def battle(first, second):
+        final_stand = lambda force_id: {'force': force_id, 'strength': '3000', 'order': '25', 'ritual': ''}
+        return {
+            'imperial_forces': [final_stand(first), final_stand(second), {'force': '1', 'strength': '15000', 'order': '1', 'ritual': ''}],
+            'imperial_fortifications': [],
+            'barbarian_forces': [{'force': '28', 'strength': '1000', 'order': '', 'ritual': ''}],
+            'barbarian_fortifications': []
+        }
+    return [battle('4', '13'), battle('13', '4')]
+
+# Hand-written battles recorded after the generated ones, for behaviour the generators rarely reach
+PINNED_SUITES = {
+    'final_stand_rows': _final_stand_pair
+}
+
+
+def reference_engine(scenarios, reference):
+    import engine
+    results = []
+    for scenario in scenarios:
+        try:
+            results.append(engine.result_to_dict(engine.resolve_battle(engine.battle_from_dict(scenario, reference))))
+        except Exception as error:
+            results.append({'error': type(error).__name__})
+    return results
+
+def _shuffled(rows, rng, reference):
+    # Final Stand rows keep their order among themselves, as they do in the cache's fingerprint
+    final_stand = lambda row: 'order' in row and reference.order(row['order']).order_name == 'Final Stand'
+    in_order = iter([row for row in rows if final_stand(row)])
+    return [next(in_order) if final_stand(row) else row for row in rng.sample(rows, len(rows))]
+
+def cached_engine(scenarios, reference):
+    # Each battle is resolved into a fresh cache, then asked for again with its rows shuffled. Battles
+    # that repeat a combatant depend on row order and bypass the cache, so those are asked for unshuffled.
+    import engine
+    import outcome_cache
+    outcome_cache.configure()
+    resolve = lambda battle: engine.result_to_dict(engine.resolve_battle(battle))
+    rng = random.Random(0)
+    results = []
+    for scenario in scenarios:
+        try:
+            battle = engine.battle_from_dict(scenario, reference)
+            outcome_cache.resolve_cached(battle, reference, resolve)
+            if outcome_cache.scenario_fingerprint(battle) is not None:
+                battle = engine.battle_from_dict({side: _shuffled(rows, rng, reference) for side, rows in scenario.items()}, reference)
+            results.append(outcome_cache.resolve_cached(battle, reference, resolve))
+        except Exception as error:
+            results.append({'error': type(error).__name__})
+    return results
+
+def parallel_engine(scenarios, reference):
+    import execution
+    backend = execution.configure(workers=max(2, os.cpu_count() or 1))
+    try:
+        return list(execution.resolve_scenarios(scenarios, reference))
+    finally:
+        backend.shutdown()
+        execution.configure()
+
+def vectorized_engine(scenarios, reference):
+    # One sample per battle through the NumPy resolver; it only takes battles with unique combatants
+    import numpy as np
+    import engine
+    import simulation
+    results = []
+    for scenario in scenarios:
+        try:
+            battle = engine.battle_from_dict(scenario, reference)
+        except Exception as error:
+            results.append({'error': type(error).__name__})
+            continue
+        try:
+            simulation.require_unique_combatants(battle)
+        except ValueError:
+            results.append(None)
+            continue
+        groups = (battle.imperial_forces, battle.imperial_fortifications, battle.barbarian_forces, battle.barbarian_fortifications)
+        try:
+            sampled = simulation.resolve_samples(battle, *(np.array([[entry.strength for entry in group]], dtype=np.int64) for group in groups))
+        except Exception as error:
+            results.append({'error': type(error).__name__})
+            continue
+        if sampled.unresolved[0]:
+            results.append({'error': 'unresolved'})
+            continue
+        forces = battle.imperial_forces + battle.barbarian_forces
+        fortifications = battle.imperial_fortifications + battle.barbarian_fortifications
+        results.append(engine.result_to_dict(engine.BattleResult(
+            outcome=simulation.OUTCOMES[sampled.outcome[0]],
+            total_victory_points=int(sampled.total_victory_points[0]),
+            offensive_victory_points=int(sampled.offensive_victory_points[0]),
+            defensive_victory_points=int(sampled.defensive_victory_points[0]),
+            forces=tuple(engine.ForceResult(force.force, force.strength, int(casualties), int(remaining))
+                         for force, casualties, remaining in zip(forces, sampled.force_casualties[0], sampled.force_remaining[0])),
+            fortifications=tuple(engine.FortificationResult(fortification.fortification, fortification.strength, int(casualties), int(remaining))
+                                 for fortification, casualties, remaining in zip(fortifications, sampled.fortification_casualties[0],
+                                                                                 sampled.fortification_remaining[0]))
+        )))
+    return results
+
+ENGINES = {
+    'reference': reference_engine,
+    'cached': cached_engine,
+    'parallel': parallel_engine,
+    'vectorized': vectorized_engine
+}
+
+
+def load_engine(name):
+    if name in ENGINES:
+        return ENGINES[name]
+    module_name, _, function_name = name.partition(':')
+    if not function_name:
+        raise SystemExit('Unknown engine %r, expected one of %s or module:function' % (name, ', '.join(sorted(ENGINES))))
+    return getattr(importlib.import_module(module_name), function_name)
+
+def first_difference(expected, actual, path=''):
+    # The first field, in sorted key order, where two results disagree, or None when they match
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        for key in sorted(set(expected) | set(actual)):
+            child = '%s.%s' % (path, key) if path else key
+            if key not in actual:
+                return child, expected[key], '<missing>'
+            if key not in expected:
+                return child, '<missing>', actual[key]
+            difference = first_difference(expected[key], actual[key], child)
+            if difference:
+                return difference
+        return None
+    if expected != actual or type(expected) is not type(actual):
+        return path or '<result>', expected, actual
+    return None
+
+def compare_outcome(expected, actual):
+    # Any failure matches a recorded failure: engines report errors in their own words
+    if 'error' in expected:
+        return None if 'error' in actual else ('<result>', 'error %s' % expected['error'], 'resolved')
+    if 'error' in actual:
+        return ('<result>', 'resolved', 'error %s' % actual['error'])
+    return first_difference(expected, actual)
+
+
+def read_corpus(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        header = json.loads(file.readline())
+        return header, [json.loads(line) for line in file]
+
+def record(reference, path, seed, revision=None):
+    from benchmarks import legacy, scenarios as scenario_generators
+    cases = []
+    for suite, count in sorted(CORPUS_SIZES.items()):
+        for scenario in scenario_generators.generate(reference, suite, count, seed, resolvable_only=False):
+            cases.append({'id': '%s-%d' % (suite, len(cases)), 'suite': suite, 'scenario': scenario})
+    for suite, pinned in sorted(PINNED_SUITES.items()):
+        for scenario in pinned():
+            cases.append({'id': '%s-%d' % (suite, len(cases)), 'suite': suite, 'scenario': scenario})
+    revision = revision or legacy.baseline_revision()
+    scenarios = [case['scenario'] for case in cases]
+    differences = 0
+    for case, expected, current in zip(cases, legacy.resolve(scenarios, revision), reference_engine(scenarios, reference)):
+        case['expected'] = expected
+        difference = compare_outcome(expected, current)
+        if difference is not None:
+            # Kept as recorded from the old app; check reports these until the engine agrees
+            case['reference_engine_differs'] = list(difference)
+            differences += 1
+            print('%s (%s): the reference engine differs at %s: recorded %r, got %r' % ((case['id'], case['suite']) + difference))
+    with gzip.open(path, 'wt', encoding='utf-8') as file:
+        file.write(json.dumps({'catalog_version': reference.version, 'python': platform.python_version(), 'seed': seed,
+                               'recorded_from': revision, 'cases': len(cases)}, sort_keys=True) + '\n')
+        for case in cases:
+            file.write(json.dumps(case, sort_keys=True, separators=(',', ':')) + '\n')
+    failures = sum('error' in case['expected'] for case in cases)
+    print('Recorded %d battles (%d that cannot be resolved) from %s to %s, the reference engine differs on %d' % (
+        len(cases), failures, revision[:12], path, differences))
+
+def check(reference, path, engine_names, show_all):
+    header, cases = read_corpus(path)
+    if header['catalog_version'] != reference.version:
+        print('The corpus was recorded against catalog %s but JSON/ loads as %s, record it again' % (
+            header['catalog_version'], reference.version))
+        return 1
+    scenarios = [case['scenario'] for case in cases]
+    status = 0
+    for name in engine_names:
+        results = list(load_engine(name)(scenarios, reference))
+        skipped = diverged = 0
+        for case, actual in zip(cases, results):
+            if actual is None:
+                skipped += 1
+                continue
+            difference = compare_outcome(case['expected'], actual)
+            if difference is None:
+                continue
+            diverged += 1
+            if diverged == 1 or show_all:
+                field, expected, got = difference
+                known = ' (known when recorded)' if 'reference_engine_differs' in case else ''
+                print('%s: %s (%s) diverges at %s: expected %r, got %r%s' % (name, case['id'], case['suite'], field, expected, got, known))
+        print('%-10s %d battles, %d diverged, %d skipped' % (name, len(cases), diverged, skipped))
+        if diverged or len(results) != len(cases):
+            status = 1
+    return status
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Record the golden battle corpus or check an engine against it.')
+    parser.add_argument('command', choices=('check', 'record'))
+    parser.add_argument('--engine', action='append', help='built-in engine (%s) or module:function, may be repeated (default: all built-ins)'
+                                                          % ', '.join(sorted(ENGINES)))
+    parser.add_argument('--corpus', default=CORPUS_PATH)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--revision', help='git revision of the app to record from, one from before engine.py (default: the first commit)')
+    parser.add_argument('--all', action='store_true', help='report every diverging battle, not just the first')
+    args = parser.parse_args(argv)
+
+    from benchmarks.run import load_app
+    with tempfile.TemporaryDirectory() as scratch:
+        load_app(os.path.join(scratch, 'golden.db'))
+        import catalog
+        reference = catalog.reload_catalog()
+        if args.command == 'record':
+            record(reference, args.corpus, args.seed, args.revision)
+            return 0
+        return check(reference, args.corpus, args.engine or sorted(ENGINES), args.all)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+import io
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+# The app as it was before battle resolution moved into engine.py, checked out
+# from git history and run in a separate interpreter, so its results can be
+# recorded as the golden corpus or compared with the current engine. It loads
+# its own database with its own create_data.py and posts every battle to its
+# /calculate_outcome view.
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DRIVER = '''
+import contextlib, json, sys
+with contextlib.redirect_stdout(sys.stderr):
+    import create_data
+    create_data.populate_db()
+    create_data.establish_quality_order_relationships()
+from army_calculator import app, calculate_outcome
+results = []
+for scenario in json.load(sys.stdin):
+    with app.test_request_context('/calculate_outcome', method='POST', json=scenario):
+        try:
+            results.append(calculate_outcome().get_json())
+        except Exception as error:
+            results.append({'error': type(error).__name__})
+json.dump(results, sys.stdout)
+'''
+
+
+def baseline_revision():
+    # The first commit, the app before any of the engine work
+    output = subprocess.run(['git', 'rev-list', '--max-parents=0', 'HEAD'], cwd=REPOSITORY, check=True, capture_output=True, text=True).stdout
+    return output.split()[-1]
+
+def checkout(revision, directory):
+    archive = subprocess.run(['git', 'archive', '--format=tar', revision], cwd=REPOSITORY, check=True, capture_output=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(directory, filter='data')
+    with open(os.path.join(directory, 'configuration.ini'), 'w') as file:
+        file.write('[FLASK]\nSECRET_KEY = legacy\n')
+
+def normalize(result):
+    # The old view echoed strengths as they were posted; the engine reports numbers, blank being 0
+    for key in ('forces_data', 'fortifications_data'):
+        for entry in result.get(key, {}).values():
+            for field in ('strength', 'remaining_strength'):
+                if isinstance(entry[field], str):
+                    entry[field] = int(entry[field]) if entry[field] else 0
+    return result
+
+def resolve(scenarios, revision=None):
+    # One result per scenario in the result_to_dict() shape, or {'error': exception name}
+    with tempfile.TemporaryDirectory() as directory:
+        checkout(revision or baseline_revision(), directory)
+        environment = dict(os.environ, DATABASE_URI='sqlite:///' + os.path.join(directory, 'legacy.db'))
+        completed = subprocess.run([sys.executable, '-W', 'ignore', '-c', DRIVER], cwd=directory, env=environment,
+                                   input=json.dumps(scenarios), capture_output=True, text=True)
+        if completed.returncode:
+            raise RuntimeError('The legacy app failed:\n' + completed.stderr)
+    return [normalize(result) for result in json.loads(completed.stdout)]
+
+def legacy_engine(scenarios, reference):
+    return resolve(scenarios)
@@ -0,0 +1,189 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+# Benchmarks battle resolution on synthetic battles built from JSON/*.json.
+# Run from the repository root, next to configuration.ini:
+#
+#     python -m benchmarks.run                    compare against benchmarks/baseline.json
+#     python -m benchmarks.run --update-baseline  record a new baseline
+#
+# Each suite reports the engine's own time per battle, the time per
+# /calculate_outcome request, /calculate_outcomes throughput and the database
+# queries issued per request. The run fails when a suite is slower than the
+# baseline by more than the tolerance, or issues more queries.
+
+DEFAULT_SCENARIOS = {'skirmish': 200, 'pitched_battle': 40, 'siege': 100, 'aura_heavy': 100}
+DEFAULT_REPEAT = 5
+DEFAULT_TOLERANCE = 0.3
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Latencies where a larger value is a regression. The p95 figures are reported but
+# too noisy to gate on.
+LATENCY_METRICS = ('engine_median_ms', 'request_median_ms')
+THROUGHPUT_METRIC = 'batch_per_second'
+QUERY_METRIC = 'queries_per_request'
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def calibrate(repeat=DEFAULT_REPEAT):
+    # A fixed pure-Python workload, timed so results from a busier or slower machine can be scaled
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        totals = {}
+        for value in range(200000):
+            totals[value % 97] = totals.get(value % 97, 0) + value * 0.1
+        sorted(totals.values())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000, 4)
+
+def load_app(database_path):
+    # An app on a scratch database loaded from the JSON data
+    import army_calculator
+    import create_data
+    app = army_calculator.create_app(database_uri='sqlite:///' + database_path)
+    app.config['WTF_CSRF_ENABLED'] = False
+    create_data.load_reference_data(app)
+    return app
+
+def count_queries(app):
+    from sqlalchemy import event
+    import database
+    from models import db
+    counter = {'queries': 0}
+
+    def before_cursor_execute(*args):
+        counter['queries'] += 1
+
+    for engine in database.engines(app, db):
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    return counter
+
+def run_suite(client, counter, reference, scenarios, repeat):
+    import engine
+    from army_calculator import MAX_BATCH_SCENARIOS
+    battles = [engine.battle_from_dict(scenario, reference) for scenario in scenarios]
+    engine_times = []
+    for battle in battles:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            engine.resolve_battle(battle)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        engine_times.append(best * 1000)
+
+    request_times = []
+    queries_before = counter['queries']
+    for scenario in scenarios:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.post('/calculate_outcome', json=scenario)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+            if response.status_code != 200:
+                raise RuntimeError('Benchmark scenario failed: %s' % response.get_json())
+        request_times.append(best * 1000)
+    queries = (counter['queries'] - queries_before) / (len(scenarios) * repeat)
+
+    batch_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        client.post('/calculate_outcomes', json={'scenarios': scenarios[:MAX_BATCH_SCENARIOS]})
+        batch_times.append(time.perf_counter() - start)
+
+    return {
+        'scenarios': len(scenarios),
+        'engine_median_ms': round(statistics.median(engine_times), 4),
+        'engine_p95_ms': round(percentile(engine_times, 0.95), 4),
+        'request_median_ms': round(statistics.median(request_times), 4),
+        'request_p95_ms': round(percentile(request_times, 0.95), 4),
+        THROUGHPUT_METRIC: round(min(len(scenarios), MAX_BATCH_SCENARIOS) / min(batch_times), 1),
+        QUERY_METRIC: round(queries, 2)
+    }
+
+def compare(results, baseline, tolerance):
+    # Baseline figures are scaled by how much slower the calibration workload ran next to each suite
+    regressions = []
+    for suite, metrics in results.items():
+        expected = baseline.get('suites', {}).get(suite)
+        if expected is None:
+            continue
+        scale = metrics['calibration_ms'] / expected['calibration_ms'] if expected.get('calibration_ms') else 1.0
+        for metric in LATENCY_METRICS:
+            if metric in expected and metrics[metric] > expected[metric] * scale * (1 + tolerance):
+                regressions.append('%s %s %.4f > baseline %.4f' % (suite, metric, metrics[metric], expected[metric] * scale))
+        if THROUGHPUT_METRIC in expected and metrics[THROUGHPUT_METRIC] < expected[THROUGHPUT_METRIC] / scale / (1 + tolerance):
+            regressions.append('%s %s %.1f < baseline %.1f' % (suite, THROUGHPUT_METRIC, metrics[THROUGHPUT_METRIC],
+                                                               expected[THROUGHPUT_METRIC] / scale))
+        if QUERY_METRIC in expected and metrics[QUERY_METRIC] > expected[QUERY_METRIC]:
+            regressions.append('%s %s %.2f > baseline %.2f' % (suite, QUERY_METRIC, metrics[QUERY_METRIC], expected[QUERY_METRIC]))
+    return regressions
+
+def main(argv=None):
+    from benchmarks import scenarios as scenario_generators
+
+    parser = argparse.ArgumentParser(description='Benchmark battle resolution against a stored baseline.')
+    parser.add_argument('--suite', action='append', choices=sorted(scenario_generators.SUITES), help='suite to run, may be repeated (default: all)')
+    parser.add_argument('--scenarios', type=int, help='battles per suite (default: per-suite sizes)')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='timing repetitions (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='allowed slowdown as a fraction (default: %(default)s)')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true', help='write the results as the new baseline')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        app = load_app(os.path.join(scratch, 'benchmark.db'))
+        import catalog
+        import outcome_cache
+        outcome_cache.configure(max_entries=0)
+        reference = catalog.reload_catalog()
+        counter = count_queries(app)
+        client = app.test_client()
+
+        results = {}
+        for suite in args.suite or sorted(scenario_generators.SUITES):
+            count = args.scenarios or DEFAULT_SCENARIOS[suite]
+            scenarios = scenario_generators.generate(reference, suite, count, args.seed)
+            client.post('/calculate_outcome', json=scenarios[0])
+            calibration_ms = calibrate(args.repeat)
+            metrics = run_suite(client, counter, reference, scenarios, args.repeat)
+            metrics['calibration_ms'] = round((calibration_ms + calibrate(args.repeat)) / 2, 4)
+            results[suite] = metrics
+            print('%-15s engine %8.3f ms (p95 %8.3f)  request %8.3f ms (p95 %8.3f)  batch %9.1f/s  queries %.2f  calibration %.1f ms' % (
+                suite, metrics['engine_median_ms'], metrics['engine_p95_ms'], metrics['request_median_ms'],
+                metrics['request_p95_ms'], metrics[THROUGHPUT_METRIC], metrics[QUERY_METRIC], metrics['calibration_ms']))
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'seed': args.seed,
+                       'suites': results}, file, indent=4, sort_keys=True)
+            file.write('\n')
+        print('Baseline written to %s' % args.baseline)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('No baseline at %s, run with --update-baseline to record one' % args.baseline)
+        return 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print('REGRESSION %s' % regression)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
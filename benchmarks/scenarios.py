@@ -0,0 +1,155 @@
+import random
+import engine
+
+# Synthetic battles in the JSON shape calculations.js posts, drawn from the loaded
+# reference catalog. Every generator takes a seeded Random, so a suite is the same
+# set of battles on every run.
+
+AURA_ORDER_NAMES = ('Tend the Fallen', 'Whatever it Takes', 'Merciless Onslaught')
+
+def named(*order_names):
+    return lambda order: order.order_name in order_names
+
+def is_defensive(order):
+    return not order.offensive_order
+
+def is_offensive(order):
+    return order.offensive_order
+
+
+class ScenarioFactory:
+    def __init__(self, reference):
+        self.reference = reference
+        playable = [force for _, force in sorted(reference.forces.items()) if reference.effective_orders.get((force.force_id, 0))]
+        self.imperial_forces = [force for force in playable if reference.faction(force) == 'The Empire']
+        self.barbarian_forces = [force for force in playable if reference.faction(force) != 'The Empire']
+        self.army_rituals = [ritual for _, ritual in sorted(reference.force_rituals.items()) if ritual.army_ritual]
+        fortifications = [fortification for _, fortification in sorted(reference.fortifications.items())]
+        self.imperial_fortifications = [fortification for fortification in fortifications if 6 <= fortification.fortification_id < 34]
+        self.barbarian_fortifications = [fortification for fortification in fortifications if 0 < fortification.fortification_id < 6]
+        self.fortification_rituals = [ritual for _, ritual in sorted(reference.fortification_rituals.items())]
+
+    def force(self, rng, force, prefer=None, weaken=False):
+        # A legal order for the force, one that prefer accepts (with a ritual granting it if need be) when possible
+        no_ritual = self.reference.force_rituals[0]
+        ritual = rng.choice(self.army_rituals) if rng.random() < 0.3 else no_ritual
+        order = rng.choice(self.reference.orders_for_force(force, ritual))
+        if prefer:
+            preferred = self.preferred_orders(force, prefer)
+            if preferred:
+                ritual, order = rng.choice(preferred)
+        maximum = 7500 if force.large else 5000
+        return {
+            'force': str(force.force_id),
+            'strength': str(rng.randint(maximum // 5, maximum // 2 if weaken else maximum)),
+            'order': str(order.order_id),
+            'ritual': str(ritual.force_ritual_id) if ritual.force_ritual_id else ''
+        }
+
+    def preferred_orders(self, force, prefer):
+        return [
+            (ritual, order)
+            for ritual in [self.reference.force_rituals[0]] + self.army_rituals
+            for order in self.reference.orders_for_force(force, ritual) if prefer(order)
+        ]
+
+    def fortification(self, rng, fortification, besieged=None):
+        ritual = rng.choice(self.fortification_rituals)
+        return {
+            'fortification': str(fortification.fortification_id),
+            'strength': str(rng.randint(1000, fortification.fortification_maximum_strength or 1000)),
+            'besieged': rng.random() < 0.6 if besieged is None else besieged,
+            'ritual': str(ritual.fortification_ritual_id) if ritual.fortification_ritual_id else ''
+        }
+
+    def pick(self, rng, pool, count):
+        # Unique combatants the way the form enforces them, with repeats once the pool runs out
+        if count <= len(pool):
+            return rng.sample(pool, count)
+        return rng.choices(pool, k=count)
+
+    def battle(self, rng, imperial_forces, barbarian_forces, imperial_fortifications=0, barbarian_fortifications=0,
+               prefer=None, besieged=None, weaken_imperial=False, imperial_prefer=None, weaken_barbarian=False):
+        imperial_prefer = imperial_prefer or prefer
+        imperial_pool, barbarian_pool = self.imperial_forces, self.barbarian_forces
+        if imperial_prefer:
+            imperial_pool = [force for force in imperial_pool if self.preferred_orders(force, imperial_prefer)] or imperial_pool
+        if prefer:
+            barbarian_pool = [force for force in barbarian_pool if self.preferred_orders(force, prefer)] or barbarian_pool
+        return {
+            'imperial_forces': [self.force(rng, force, imperial_prefer, weaken_imperial)
+                                for force in self.pick(rng, imperial_pool, imperial_forces)],
+            'imperial_fortifications': [self.fortification(rng, fortification, besieged)
+                                        for fortification in self.pick(rng, self.imperial_fortifications, imperial_fortifications)],
+            'barbarian_forces': [self.force(rng, force, prefer, weaken_barbarian) for force in self.pick(rng, barbarian_pool, barbarian_forces)],
+            'barbarian_fortifications': [self.fortification(rng, fortification, besieged)
+                                         for fortification in self.pick(rng, self.barbarian_fortifications, barbarian_fortifications)]
+        }
+
+    def skirmish(self, rng):
+        return self.battle(rng, rng.randint(1, 3), rng.randint(1, 3))
+
+    def pitched_battle(self, rng):
+        return self.battle(rng, 50, 50)
+
+    def siege(self, rng):
+        return self.battle(rng, rng.randint(3, 8), rng.randint(3, 8), rng.randint(4, 10), rng.randint(2, 5), besieged=True)
+
+    def aura_heavy(self, rng):
+        return self.battle(rng, rng.randint(10, 20), rng.randint(10, 20), prefer=named(*AURA_ORDER_NAMES))
+
+    def final_stand(self, rng):
+        return self.battle(rng, rng.randint(1, 5), rng.randint(1, 6), rng.choice([0, 0, 1]), prefer=named('Final Stand'),
+                           weaken_imperial=True)
+
+    def barbarian_victory(self, rng):
+        return self.battle(rng, rng.randint(1, 2), rng.randint(4, 8), rng.choice([0, 1]), weaken_imperial=True)
+
+    def defensive(self, rng):
+        return self.battle(rng, rng.randint(1, 6), rng.randint(0, 6), rng.choice([0, 0, 1, 2]), rng.choice([0, 0, 1]),
+                           prefer=is_defensive)
+
+    def one_sided_imperial(self, rng):
+        # Imperial victories won entirely on offence or entirely on defence, where the VP split has no fallback
+        imperial_prefer = rng.choice([is_offensive, is_defensive, named('Strategic Defence')])
+        return self.battle(rng, rng.randint(1, 6), rng.randint(1, 4), rng.choice([0, 1, 2]), prefer=is_offensive,
+                           imperial_prefer=imperial_prefer, weaken_barbarian=True)
+
+    def form_defaults(self, rng):
+        # Blank orders, rituals and strengths, the way an unfinished form row posts them
+        scenario = self.battle(rng, rng.randint(1, 6), rng.randint(0, 6), rng.choice([0, 0, 1, 2]), rng.choice([0, 0, 1]))
+        for force in scenario['imperial_forces'] + scenario['barbarian_forces']:
+            if rng.random() < 0.3:
+                force['order'] = ''
+                force['ritual'] = ''
+            if rng.random() < 0.2:
+                force['strength'] = ''
+        return scenario
+
+
+SUITES = {
+    'skirmish': ScenarioFactory.skirmish,
+    'pitched_battle': ScenarioFactory.pitched_battle,
+    'siege': ScenarioFactory.siege,
+    'aura_heavy': ScenarioFactory.aura_heavy
+}
+
+# The benchmark suites plus battles aimed at the engine's edge cases
+CORPUS_SUITES = dict(SUITES, **{
+    'final_stand': ScenarioFactory.final_stand,
+    'barbarian_victory': ScenarioFactory.barbarian_victory,
+    'defensive': ScenarioFactory.defensive,
+    'one_sided_imperial': ScenarioFactory.one_sided_imperial,
+    'form_defaults': ScenarioFactory.form_defaults
+})
+
+def generate(reference, suite, count, seed=0, resolvable_only=True):
+    # Unless resolvable_only is off, battles the engine cannot resolve (see calculate_victory_points) are drawn again
+    factory = ScenarioFactory(reference)
+    rng = random.Random('%s-%d' % (suite, seed))
+    scenarios = []
+    while len(scenarios) < count:
+        scenario = CORPUS_SUITES[suite](factory, rng)
+        if not resolvable_only or 'error' not in engine.resolve_scenario(scenario, reference):
+            scenarios.append(scenario)
+    return scenarios
@@ -0,0 +1,54 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+# Times a cold start in fresh interpreters: importing the engine, importing the
+# app module, creating the app and answering its first request, which loads the
+# reference catalog. Run from the repository root, next to configuration.ini:
+#
+#     python -m benchmarks.startup
+
+DEFAULT_REPEAT = 5
+STAGES = (
+    ('import engine', 'import engine'),
+    ('import army_calculator', 'import army_calculator'),
+    ('create_app', 'import army_calculator\narmy_calculator.create_app(database_uri=%(uri)r)'),
+    ('first request', 'import army_calculator\narmy_calculator.create_app(database_uri=%(uri)r).test_client().get("/bootstrap")')
+)
+
+TIMER = '''import sys, time
+sys.path.insert(0, %(root)r)
+started = time.perf_counter()
+%(statement)s
+print(time.perf_counter() - started)
+'''
+
+def time_statement(statement, root, repeat):
+    best = None
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', TIMER % {'root': root, 'statement': statement}],
+                                check=True, capture_output=True, text=True).stdout
+        elapsed = float(output.split()[-1])
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time a cold start of the engine and the app.')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='fresh interpreters per stage (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    from benchmarks.run import load_app
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as scratch:
+        database_path = os.path.join(scratch, 'startup.db')
+        load_app(database_path)
+        for name, statement in STAGES:
+            elapsed = time_statement(statement % {'uri': 'sqlite:///' + database_path}, root, args.repeat)
+            print('%-24s %8.1f ms' % (name, elapsed * 1000))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+from dataclasses import replace
+from battle_sessions import BattleSession
+from engine import battle_from_dict, result_to_dict
+
+# Finds the smallest strength of one force or fortification that meets a target:
+# winning, reaching a number of victory points, or coming out of the battle
+# unbroken. The search bisects between 0 and an upper bound, so it resolves the
+# battle O(log n) times instead of trying every strength. It assumes a target,
+# once met, stays met as strength grows; where the rules are not monotonic (break
+# thresholds, Final Stand) the answer is a strength at which the target flips from
+# unmet to met, with the strength below it unmet.
+
+TARGETS = ('win', 'total_vp', 'offensive_vp', 'defensive_vp', 'not_broken')
+DEFAULT_MAX_STRENGTH = 100000
+MAX_STRENGTH = 1000000
+VICTORIES = {'imperial': 'Imperial Victory', 'barbarian': 'Barbarian Victory'}
+
+
+def target_met(result, target, side, entry, at_least=0):
+    # entry is the combatant's own ForceResult or FortificationResult
+    if target == 'not_broken':
+        return entry.remaining_strength > 0
+    if result.outcome != VICTORIES[side]:
+        return False
+    if target == 'win':
+        return True
+    return getattr(result, target.replace('_vp', '_victory_points')) >= at_least
+
+
+class BreakpointSearch:
+    def __init__(self, battle, side, kind, index, target, at_least=0):
+        if side not in VICTORIES:
+            raise ValueError('Side must be imperial or barbarian')
+        if target not in TARGETS:
+            raise ValueError('Unknown target')
+        self.session = BattleSession(battle)
+        self.side = side
+        self.kind = kind
+        self.index = index
+        self.target = target
+        self.at_least = at_least
+        entries = self.session.sides[side].forces if kind == 'force' else self.session.sides[side].fortifications
+        self.combatant = entries[index]
+        # Where the combatant sits in the engine's results: imperial entries come first
+        if side == 'barbarian':
+            offset = len(battle.imperial_forces) if kind == 'force' else len(battle.imperial_fortifications)
+        else:
+            offset = 0
+        self.result_index = offset + index
+        self.evaluations = {}
+
+    def evaluate(self, strength):
+        # (whether the target is met, the battle result) with the combatant at this strength
+        if strength not in self.evaluations:
+            self.session.apply({(self.side, self.kind, self.index): replace(self.combatant, strength=strength)})
+            try:
+                result = self.session.resolve()
+            except Exception:
+                result = None
+            if result is None:
+                met = False
+            else:
+                entries = result.forces if self.kind == 'force' else result.fortifications
+                met = target_met(result, self.target, self.side, entries[self.result_index], self.at_least)
+            self.evaluations[strength] = (met, result)
+        return self.evaluations[strength]
+
+    def search(self, max_strength):
+        # Smallest strength in [0, max_strength] meeting the target, or None when even max_strength does not
+        if not self.evaluate(max_strength)[0]:
+            return None
+        low, high = -1, max_strength
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self.evaluate(middle)[0]:
+                high = middle
+            else:
+                low = middle
+        return high
+
+
+def _solve(battle, side, kind, index, target, at_least, max_strength):
+    search = BreakpointSearch(battle, side, kind, index, target, at_least)
+    current = search.combatant.strength
+    current_met, _ = search.evaluate(current)
+    minimum = search.search(max_strength)
+    return {
+        'current_strength': current,
+        'current_met': current_met,
+        'minimum_strength': minimum,
+        'additional_strength': None if minimum is None else minimum - current,
+        'evaluations': len(search.evaluations),
+        'result': None if minimum is None or search.evaluations[minimum][1] is None else result_to_dict(search.evaluations[minimum][1])
+    }
+
+def _candidate_rituals(combatant, kind, reference):
+    # Rituals the combatant could be given instead, keeping its order legal
+    if kind == 'fortification':
+        return [ritual for _, ritual in sorted(reference.fortification_rituals.items())]
+    rituals = [ritual for ritual_id, ritual in sorted(reference.force_rituals.items()) if ritual_id == 0 or ritual.army_ritual]
+    return [ritual for ritual in rituals if reference.is_legal_order(combatant.force, ritual, combatant.order)]
+
+def find_breakpoint(battle, side, combatant, target, reference, at_least=0, max_strength=DEFAULT_MAX_STRENGTH, compare_rituals=False):
+    # combatant is ('force' or 'fortification', position in that side's list)
+    kind, index = combatant
+    if kind not in ('force', 'fortification'):
+        raise ValueError('Expected a force or a fortification')
+    if not 0 < max_strength <= MAX_STRENGTH:
+        raise ValueError('max_strength must be between 1 and %d' % MAX_STRENGTH)
+    entries = getattr(battle, '%s_%ss' % (side, kind), None)
+    if entries is None or not 0 <= index < len(entries):
+        raise ValueError('No such %s' % kind)
+    if kind == 'fortification':
+        max_strength = min(max_strength, entries[index].fortification.fortification_maximum_strength)
+
+    summary = {'side': side, kind: index, 'target': target, 'at_least': at_least, 'max_strength': max_strength}
+    summary.update(_solve(battle, side, kind, index, target, at_least, max_strength))
+    if compare_rituals:
+        options = []
+        for ritual in _candidate_rituals(entries[index], kind, reference):
+            variant = replace(entries[index], ritual=ritual)
+            variant_battle = replace(battle, **{'%s_%ss' % (side, kind): entries[:index] + (variant,) + entries[index + 1:]})
+            solved = _solve(variant_battle, side, kind, index, target, at_least, max_strength)
+            solved.pop('result')
+            solved['ritual_id'] = ritual.force_ritual_id if kind == 'force' else ritual.fortification_ritual_id
+            solved['ritual_name'] = ritual.force_ritual_name if kind == 'force' else ritual.fortification_ritual_name
+            options.append(solved)
+        # Rituals that reach the target at all, cheapest first
+        options.sort(key=lambda option: (option['minimum_strength'] is None, option['minimum_strength'] or 0))
+        summary['rituals'] = options
+    return summary
+
+def breakpoint_from_dict(data, reference):
+    battle = battle_from_dict(data, reference)
+    if 'force' in data:
+        combatant = ('force', int(data['force']))
+    else:
+        combatant = ('fortification', int(data['fortification']))
+    return find_breakpoint(
+        battle, data.get('side', 'imperial'), combatant, data.get('target', 'win'), reference,
+        at_least=int(data.get('at_least', 0)),
+        max_strength=int(data.get('max_strength', DEFAULT_MAX_STRENGTH)),
+        compare_rituals=bool(data.get('compare_rituals', False))
+    )
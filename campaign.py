@@ -0,0 +1,172 @@
+from dataclasses import replace
+from engine import Battle, IllegalOrderError, IncrementalSide, battle_from_dict, settle_battle
+
+# Campaigns fought over several downtimes. Each round resolves the battle that is
+# left after the last one: forces and besieged fortifications carry their remaining
+# strength forward, broken ones drop out, and orders can change between rounds.
+# Every side is kept as an engine.IncrementalSide, as planning sessions keep theirs, with
+# its aggregates and every combatant's contribution carried from round to round, so
+# a round only recalculates the contributions of forces whose strength or order
+# changed. Casualties are still shared out over every force each round, and most
+# forces take some, so the saving is mostly in quiet rounds and order changes.
+
+SIDES = ('imperial', 'barbarian')
+DEFAULT_ROUNDS = 3
+MAX_ROUNDS = 20
+
+
+class Campaign:
+    def __init__(self, battle):
+        self.sides = {
+            'imperial': IncrementalSide(battle.imperial_forces, battle.imperial_fortifications),
+            'barbarian': IncrementalSide(battle.barbarian_forces, battle.barbarian_fortifications)
+        }
+        self.victory_points = {side: {'total': 0, 'offensive': 0, 'defensive': 0} for side in SIDES}
+        self._last = None
+
+    def battle(self):
+        imperial, barbarian = self.sides['imperial'], self.sides['barbarian']
+        return Battle(tuple(imperial.forces.values()), tuple(imperial.fortifications.values()),
+                      tuple(barbarian.forces.values()), tuple(barbarian.fortifications.values()))
+
+    def change_orders(self, side_name, orders):
+        # Orders for forces that have already broken are ignored
+        side = self.sides[side_name]
+        changed = []
+        recalculate_all = False
+        for index, order in orders.items():
+            force = side.forces.get(index)
+            if force is not None and force.order != order:
+                recalculate_all |= side.set_force(index, replace(force, order=order))
+                changed.append(index)
+        side.update_forces(changed, recalculate_all)
+
+    def play_round(self):
+        battle = self.battle()
+        # A round that changed nothing, with no casualties and no new orders, ends the same way again
+        if self._last is not None and self._last[0] == battle:
+            result = self._last[1]
+        else:
+            imperial, barbarian = self.sides['imperial'], self.sides['barbarian']
+            result = settle_battle(battle, imperial.aggregates, barbarian.aggregates, tuple(imperial.totals), tuple(barbarian.totals))
+            self._last = (battle, result)
+
+        winner = {'Imperial Victory': 'imperial', 'Barbarian Victory': 'barbarian'}.get(result.outcome)
+        if winner:
+            tally = self.victory_points[winner]
+            tally['total'] += result.total_victory_points
+            tally['offensive'] += result.offensive_victory_points
+            tally['defensive'] += result.defensive_victory_points
+
+        summary = {
+            'outcome': result.outcome,
+            'total_victory_points': result.total_victory_points,
+            'offensive_victory_points': result.offensive_victory_points,
+            'defensive_victory_points': result.defensive_victory_points
+        }
+        force_results = iter(result.forces)
+        fortification_results = iter(result.fortifications)
+        for side_name in SIDES:
+            side = self.sides[side_name]
+            changed = []
+            recalculate_all = False
+            forces = []
+            for index, force in list(side.forces.items()):
+                force_result = next(force_results)
+                forces.append({
+                    'index': index,
+                    'force_name': force.force.force_name,
+                    'order_name': force.order.order_name,
+                    'strength': force_result.strength,
+                    'casualties_taken': force_result.casualties_taken,
+                    'remaining_strength': force_result.remaining_strength
+                })
+                if force_result.remaining_strength <= 0:
+                    recalculate_all |= side.remove_force(index)
+                elif force_result.remaining_strength != force.strength:
+                    recalculate_all |= side.set_force(index, replace(force, strength=force_result.remaining_strength))
+                    changed.append(index)
+            side.update_forces(changed, recalculate_all)
+            fortifications = []
+            for index, fortification in list(side.fortifications.items()):
+                fort_result = next(fortification_results)
+                fortifications.append({
+                    'index': index,
+                    'fortification_name': fortification.fortification.fortification_name,
+                    'strength': fort_result.strength,
+                    'casualties_taken': fort_result.casualties_taken,
+                    'remaining_strength': fort_result.remaining_strength
+                })
+                if fort_result.remaining_strength <= 0:
+                    side.remove_fortification(index)
+                elif fort_result.remaining_strength != fortification.strength:
+                    side.set_fortification(index, replace(fortification, strength=fort_result.remaining_strength))
+            summary[side_name + '_forces'] = forces
+            summary[side_name + '_fortifications'] = fortifications
+        return summary
+
+    def defeated(self):
+        return any(not side.forces and not side.fortifications for side in self.sides.values())
+
+    def survivors(self):
+        survivors = {}
+        for side_name, side in self.sides.items():
+            survivors[side_name + '_forces'] = [
+                {'index': index, 'force_name': force.force.force_name, 'strength': force.strength} for index, force in side.forces.items()
+            ]
+            survivors[side_name + '_fortifications'] = [
+                {'index': index, 'fortification_name': fortification.fortification.fortification_name, 'strength': fortification.strength}
+                for index, fortification in side.fortifications.items()
+            ]
+        return survivors
+
+
+def rounds_from_dict(data, battle, reference):
+    # Either a number of rounds with no changes, or one entry per round with
+    # {"imperial_orders": {"<position>": order_id}, "barbarian_orders": {...}}
+    rounds = data.get('rounds', DEFAULT_ROUNDS)
+    if isinstance(rounds, int) and not isinstance(rounds, bool):
+        rounds = [{}] * rounds
+    if not isinstance(rounds, list) or not 0 < len(rounds) <= MAX_ROUNDS:
+        raise ValueError('A campaign lasts between 1 and %d rounds' % MAX_ROUNDS)
+    forces = {'imperial': battle.imperial_forces, 'barbarian': battle.barbarian_forces}
+    parsed = []
+    for round_data in rounds:
+        if not isinstance(round_data, dict):
+            raise ValueError('Each round must be an object')
+        changes = {}
+        for side_name in SIDES:
+            orders = {}
+            submitted = round_data.get(side_name + '_orders') or {}
+            if not isinstance(submitted, dict):
+                raise ValueError('Orders are given as {position: order_id}')
+            for index, order_id in submitted.items():
+                index = int(index)
+                if not 0 <= index < len(forces[side_name]):
+                    raise ValueError('No %s force at position %d' % (side_name, index))
+                force = forces[side_name][index]
+                order = reference.order(order_id)
+                if not reference.is_legal_order(force.force, force.ritual, order):
+                    raise IllegalOrderError('%s cannot be given the order %s' % (force.force.force_name, order.order_name))
+                orders[index] = order
+            changes[side_name] = orders
+        parsed.append(changes)
+    return parsed
+
+def simulate_campaign(data, reference):
+    battle = battle_from_dict(data, reference)
+    rounds = rounds_from_dict(data, battle, reference)
+    campaign = Campaign(battle)
+    played = []
+    for changes in rounds:
+        for side_name, orders in changes.items():
+            campaign.change_orders(side_name, orders)
+        played.append(campaign.play_round())
+        if campaign.defeated():
+            break
+    return {
+        'rounds_played': len(played),
+        'rounds': played,
+        'victory_points': campaign.victory_points,
+        'survivors': campaign.survivors()
+    }
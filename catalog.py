@@ -0,0 +1,242 @@
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass, astuple
+from types import MappingProxyType
+
+# The reference tables only change when create_data.py loads them again, so they
+# are read once into immutable, id-indexed structures and shared by every
+# calculation. Each process notices newly loaded data from its version stamp,
+# reloads the catalog and tells its listeners to flush what they derived from it.
+
+@dataclass(frozen=True, slots=True)
+class NationEntry:
+    nation_id: int
+    nation_name: str
+    nation_faction: str
+
+@dataclass(frozen=True, slots=True)
+class QualityEntry:
+    quality_id: int
+    quality_name: str
+    order_ids: tuple
+
+@dataclass(frozen=True, slots=True)
+class OrderEntry:
+    order_id: int
+    order_name: str
+    offensive_order: bool
+    casualties_inflicted_modifier: float
+    casualties_suffered_modifier: float
+    territory_claimed_modifier: float
+    territory_defence_modifier: float
+
+@dataclass(frozen=True, slots=True)
+class ForceEntry:
+    force_id: int
+    force_name: str
+    force_is_army: bool
+    nation_id: int
+    quality_id: int
+    large: bool
+
+@dataclass(frozen=True, slots=True)
+class FortificationEntry:
+    fortification_id: int
+    fortification_name: str
+    fortification_level: int
+    fortification_maximum_strength: int
+
+@dataclass(frozen=True, slots=True)
+class ForceRitualEntry:
+    force_ritual_id: int
+    force_ritual_name: str
+    army_ritual: bool
+    force_ritual_quality_id: int
+    force_effective_strength_modifier: int
+
+@dataclass(frozen=True, slots=True)
+class FortificationRitualEntry:
+    fortification_ritual_id: int
+    fortification_ritual_name: str
+    fortification_effective_strength_modifier: int
+
+
+def _index(entries, key):
+    return MappingProxyType({getattr(entry, key): entry for entry in entries})
+
+
+class ReferenceCatalog:
+    __slots__ = ('nations', 'qualities', 'orders', 'forces', 'fortifications', 'force_rituals',
+                 'fortification_rituals', 'orders_by_name', 'quality_orders', 'legal_order_index',
+                 'effective_orders', 'effective_order_ids', 'version')
+
+    def __init__(self, nations, qualities, orders, forces, fortifications, force_rituals, fortification_rituals):
+        self.nations = _index(nations, 'nation_id')
+        self.qualities = _index(qualities, 'quality_id')
+        self.orders = _index(orders, 'order_id')
+        self.forces = _index(forces, 'force_id')
+        self.fortifications = _index(fortifications, 'fortification_id')
+        self.force_rituals = _index(force_rituals, 'force_ritual_id')
+        self.fortification_rituals = _index(fortification_rituals, 'fortification_ritual_id')
+        self.orders_by_name = _index(orders, 'order_name')
+        self.quality_orders = MappingProxyType({
+            quality.quality_id: tuple(self.orders[order_id] for order_id in quality.order_ids)
+            for quality in qualities
+        })
+        self._index_legal_orders()
+        self.version = self._fingerprint()
+
+    def __reduce__(self):
+        # Rebuilt from its entries, so the catalog can be handed to worker processes
+        return (ReferenceCatalog, (tuple(self.nations.values()), tuple(self.qualities.values()), tuple(self.orders.values()),
+                                   tuple(self.forces.values()), tuple(self.fortifications.values()),
+                                   tuple(self.force_rituals.values()), tuple(self.fortification_rituals.values())))
+
+    def _fingerprint(self):
+        tables = (self.nations, self.qualities, self.orders, self.forces, self.fortifications,
+                  self.force_rituals, self.fortification_rituals)
+        content = [[astuple(entry) for _, entry in sorted(table.items())] for table in tables]
+        return hashlib.sha1(json.dumps(content).encode('utf-8')).hexdigest()
+
+    def order(self, order_id):
+        if order_id == '' or order_id is None:
+            order_id = 6
+        return self.orders[int(order_id)]
+
+    def force_ritual(self, ritual_id):
+        if ritual_id == '' or ritual_id is None:
+            ritual_id = 0
+        return self.force_rituals[int(ritual_id)]
+
+    def fortification_ritual(self, ritual_id):
+        if ritual_id == '' or ritual_id is None:
+            ritual_id = 0
+        return self.fortification_rituals[int(ritual_id)]
+
+    def force(self, force_id):
+        return self.forces[int(force_id)]
+
+    def fortification(self, fortification_id):
+        return self.fortifications[int(fortification_id)]
+
+    def faction(self, force):
+        return self.nations[force.nation_id].nation_faction
+
+    def _index_legal_orders(self):
+        # Legal orders for every force under its own quality and under each quality a
+        # ritual can grant it. A force's effective orders combine its own quality's
+        # orders with those of the quality granted by its ritual (0 when none).
+        granted_qualities = {ritual.force_ritual_quality_id for ritual in self.force_rituals.values()} - {0, '', None}
+        legal_order_index = {}
+        effective_orders = {}
+        for force in self.forces.values():
+            if force.nation_id not in self.nations or force.quality_id not in self.qualities:
+                continue
+            for quality_id in granted_qualities | {force.quality_id}:
+                if quality_id in self.qualities:
+                    legal_order_index[(force.force_id, quality_id)] = self._build_legal_orders(force, quality_id)
+            own_orders = legal_order_index[(force.force_id, force.quality_id)]
+            effective_orders[(force.force_id, 0)] = own_orders
+            for quality_id in granted_qualities:
+                combined = {order.order_id: order for order in own_orders + legal_order_index.get((force.force_id, quality_id), ())}
+                effective_orders[(force.force_id, quality_id)] = self._sort_orders(combined.values())
+        self.legal_order_index = MappingProxyType(legal_order_index)
+        self.effective_orders = MappingProxyType(effective_orders)
+        self.effective_order_ids = MappingProxyType({
+            key: frozenset(order.order_id for order in orders) for key, orders in effective_orders.items()
+        })
+
+    @staticmethod
+    def _sort_orders(orders):
+        return tuple(sorted(orders, key=lambda order: (not order.offensive_order, order.order_id)))
+
+    def legal_orders(self, force_id, quality_id):
+        orders = self.legal_order_index.get((int(force_id), int(quality_id)))
+        if orders is None:
+            orders = self._build_legal_orders(self.force(force_id), int(quality_id))
+        return orders
+
+    def orders_for_force(self, force, ritual):
+        # Orders a force may be given: its own quality's plus any granted by its ritual
+        return self.effective_orders.get((force.force_id, ritual.force_ritual_quality_id or 0), ())
+
+    def is_legal_order(self, force, ritual, order):
+        return order.order_id in self.effective_order_ids.get((force.force_id, ritual.force_ritual_quality_id or 0), ())
+
+    def _build_legal_orders(self, force, quality_id):
+        # The rules /get_orders_by_force has always used: basic orders, national orders, then quality orders
+        order_list = [order for order in self.orders.values() if 1 <= order.order_id <= 8]
+        if force.nation_id == 7:
+            if 40 in self.orders:
+                order_list.append(self.orders[40])
+            order_list = [order for order in order_list if order.order_id != 5]
+        if self.faction(force) != "The Empire":
+            order_list = [order for order in order_list if order.order_id != 4]
+        order_list.extend(self.quality_orders.get(quality_id, ()))
+        return self._sort_orders(order_list)
+
+
+DEFAULT_CHECK_INTERVAL = 5
+
+_loader = None
+_probe = None
+_check_interval = DEFAULT_CHECK_INTERVAL
+_catalog = None
+_stamp = None
+_next_check = 0
+_reload_listeners = []
+_lock = threading.RLock()
+
+def set_loader(loader, probe=None, check_interval=DEFAULT_CHECK_INTERVAL):
+    # probe() returns a stamp of the data the catalog was loaded from. Every process checks it
+    # at most once per check_interval seconds and reloads when another process has changed the data.
+    global _loader, _probe, _check_interval, _catalog
+    with _lock:
+        _loader = loader
+        _probe = probe
+        _check_interval = check_interval
+        _catalog = None
+
+def set_catalog(catalog):
+    # A catalog handed over by another process is kept as it is, never reloaded here
+    global _catalog, _probe
+    with _lock:
+        _catalog = catalog
+        _probe = None
+
+def _load():
+    global _catalog, _stamp, _next_check
+    if _loader is None:
+        raise RuntimeError('No reference catalog loader has been registered')
+    # Stamped before loading, so data that changes while it loads is picked up by the next check
+    _stamp = _probe() if _probe is not None else None
+    _catalog = _loader()
+    _next_check = time.monotonic() + _check_interval
+    return _catalog
+
+def get_catalog():
+    global _next_check
+    reference = _catalog
+    if reference is not None and (_probe is None or time.monotonic() < _next_check):
+        return reference
+    with _lock:
+        if _catalog is None:
+            return _load()
+        if _probe is not None and time.monotonic() >= _next_check:
+            _next_check = time.monotonic() + _check_interval
+            if _probe() != _stamp:
+                return reload_catalog()
+        return _catalog
+
+def on_reload(listener):
+    _reload_listeners.append(listener)
+    return listener
+
+def reload_catalog():
+    with _lock:
+        catalog = _load()
+        for listener in _reload_listeners:
+            listener(catalog)
+        return catalog
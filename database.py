@@ -0,0 +1,88 @@
+import os
+import re
+from functools import partial
+from flask import current_app
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+# SQLite settings for the app's database, from the [DATABASE] section of
+# configuration.ini. A profile supplies the PRAGMAs and any of them can be set
+# on its own to override it. Read-only pages and the reference catalog query an
+# SQLite file through a second engine opened with mode=ro, which never takes a
+# write lock.
+
+PROFILES = {
+    'default': {},
+    'production': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'mmap_size': 268435456, 'cache_size': -65536, 'busy_timeout': 5000}
+}
+PRAGMAS = ('journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'busy_timeout')
+DEFAULT_POOL_SIZE = 5
+DEFAULT_MAX_OVERFLOW = 10
+READ_ONLY_ENGINE = 'read_only_engine'
+
+_pragma_value = re.compile(r'^-?\w+$')
+
+def settings(config):
+    section = config['DATABASE'] if config.has_section('DATABASE') else {}
+    profile = section.get('PROFILE', 'default')
+    if profile not in PROFILES:
+        raise ValueError('Unknown database profile %r, expected one of %s' % (profile, ', '.join(sorted(PROFILES))))
+    pragmas = dict(PROFILES[profile])
+    for name in PRAGMAS:
+        if name in section:
+            pragmas[name] = section[name]
+    for name, value in pragmas.items():
+        if not _pragma_value.match(str(value)):
+            raise ValueError('Invalid value %r for %s' % (value, name))
+    return {
+        'pragmas': pragmas,
+        'pool_size': int(section.get('POOL_SIZE', DEFAULT_POOL_SIZE)),
+        'max_overflow': int(section.get('MAX_OVERFLOW', DEFAULT_MAX_OVERFLOW))
+    }
+
+def read_only_url(url):
+    # None for anything but an SQLite file
+    url = make_url(url)
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:') or url.database.startswith('file:'):
+        return None
+    return url.set(database='file:' + os.path.abspath(url.database), query={'mode': 'ro', 'uri': 'true'})
+
+def configure(app, config):
+    # Called before SQLAlchemy(app), which reads the engine options when it creates the engine
+    database = settings(config)
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    # In-memory SQLite keeps its single connection pool
+    if url.get_backend_name() != 'sqlite' or url.database not in (None, '', ':memory:'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': database['pool_size'], 'max_overflow': database['max_overflow']}
+    return database
+
+def _apply_pragmas(pragmas, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute('PRAGMA %s = %s' % (name, value))
+    cursor.close()
+
+def install(app, db, database):
+    # The read-only engine opens the file Flask-SQLAlchemy resolved for the read-write one
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            return
+        event.listen(db.engine, 'connect', partial(_apply_pragmas, database['pragmas']))
+        url = read_only_url(db.engine.url)
+        if url is None:
+            return
+        read_only = create_engine(url, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        # The journal mode is stored in the file, so only the read-write engine sets it
+        pragmas = {name: value for name, value in database['pragmas'].items() if name != 'journal_mode'}
+        pragmas['query_only'] = 'ON'
+        event.listen(read_only, 'connect', partial(_apply_pragmas, pragmas))
+        app.extensions[READ_ONLY_ENGINE] = read_only
+
+def engines(app, db):
+    with app.app_context():
+        return [db.engine] + ([app.extensions[READ_ONLY_ENGINE]] if READ_ONLY_ENGINE in app.extensions else [])
+
+def read_only_session(db):
+    # A session for queries that never write, closed by its with block
+    return Session(current_app.extensions.get(READ_ONLY_ENGINE) or db.engine)
@@ -0,0 +1,572 @@
+import itertools
+from collections import Counter
+from dataclasses import dataclass, field
+import instrumentation
+from catalog import ForceEntry, OrderEntry, ForceRitualEntry, FortificationEntry, FortificationRitualEntry
+
+# Battle resolution without Flask, WTForms or SQLAlchemy. Inputs carry the
+# catalog entries they refer to, so resolving a battle needs no lookups at all.
+
+EXEMPT_ORDER_ID = 42
+# Orders whose count on a side changes the strength of every other force on it
+STACKING_ORDERS = frozenset({"Whatever it Takes", "Fire in the Blood"})
+
+@dataclass(frozen=True, slots=True)
+class ForceInput:
+    force: ForceEntry
+    strength: int
+    order: OrderEntry
+    ritual: ForceRitualEntry
+    _hash: int = field(default=None, init=False, repr=False, compare=False)
+
+    def __hash__(self):
+        # Forces are looked up in sets and counters many times per battle, so the hash is worked out once
+        if self._hash is None:
+            object.__setattr__(self, '_hash', hash((self.force, self.strength, self.order, self.ritual)))
+        return self._hash
+
+    def __reduce__(self):
+        # Pickled by its fields, so a hash cached in one process is never used in another
+        return (ForceInput, (self.force, self.strength, self.order, self.ritual))
+
+@dataclass(frozen=True, slots=True)
+class FortificationInput:
+    fortification: FortificationEntry
+    strength: int
+    ritual: FortificationRitualEntry
+    besieged: bool
+
+@dataclass(frozen=True, slots=True)
+class Battle:
+    imperial_forces: tuple = ()
+    imperial_fortifications: tuple = ()
+    barbarian_forces: tuple = ()
+    barbarian_fortifications: tuple = ()
+
+@dataclass(frozen=True, slots=True)
+class SideAggregates:
+    forces: frozenset
+    multiplicity: Counter
+    offensive_orders: Counter
+    defensive_orders: Counter
+
+    def order_count(self, order_name):
+        return self.offensive_orders[order_name] + self.defensive_orders[order_name]
+
+    def others_with_order(self, force, order_name):
+        # Forces equal to this one never count towards its own auras
+        count = self.order_count(order_name)
+        if force.order.order_name == order_name:
+            count -= self.multiplicity[force]
+        return count
+
+@dataclass(frozen=True, slots=True)
+class ForceResult:
+    force: ForceEntry
+    strength: int
+    casualties_taken: int
+    remaining_strength: int
+    # On the exempt order, so it took no share of the casualties
+    exempt: bool = False
+
+@dataclass(frozen=True, slots=True)
+class FortificationResult:
+    fortification: FortificationEntry
+    strength: int
+    casualties_taken: int
+    remaining_strength: int
+    # Not besieged, so it took no share of the casualties
+    exempt: bool = False
+
+@dataclass(frozen=True, slots=True)
+class BattleResult:
+    outcome: str
+    total_victory_points: int
+    offensive_victory_points: int
+    defensive_victory_points: int
+    forces: tuple
+    fortifications: tuple
+
+
+def aggregate_side(forces):
+    # One pass over a side's forces, so per-force auras are read instead of rescanned
+    return SideAggregates(
+        forces=frozenset(forces),
+        multiplicity=Counter(forces),
+        offensive_orders=Counter(force.order.order_name for force in forces if force.order.offensive_order),
+        defensive_orders=Counter(force.order.order_name for force in forces if not force.order.offensive_order)
+    )
+
+_stacked_tenths = [0]
+
+def stacked_tenths(count):
+    # The sum of count repeated += 0.1 steps, matching the float error of adding them one at a time
+    while len(_stacked_tenths) <= count:
+        _stacked_tenths.append(_stacked_tenths[-1] + 0.1)
+    return _stacked_tenths[count]
+
+def side_contributions(forces, fortifications, side):
+    # (casualties inflicted, offensive victory contribution, defensive victory contribution) for one side
+    total_casualties_inflicted = 0
+    offensive_contribution = 0
+    defensive_contribution = 0
+
+    for force in forces:
+        casualties_inflicted, offensive_victory_contribution, defensive_victory_contribution = calculate_force_strength(force, side)
+        total_casualties_inflicted += int(casualties_inflicted)
+        offensive_contribution += int(offensive_victory_contribution)
+        defensive_contribution += int(defensive_victory_contribution)
+
+    for fortification in fortifications:
+        casualties_inflicted, victory_contribution = calculate_fortification_strength(fortification)
+        defensive_contribution += int(victory_contribution)
+        total_casualties_inflicted += int(casualties_inflicted)
+
+    return total_casualties_inflicted, offensive_contribution, defensive_contribution
+
+def force_contribution(force, side):
+    casualties_inflicted, offensive, defensive = calculate_force_strength(force, side)
+    return int(casualties_inflicted), int(offensive), int(defensive)
+
+def fortification_contribution(fortification):
+    casualties_inflicted, victory_contribution = calculate_fortification_strength(fortification)
+    return int(casualties_inflicted), 0, int(victory_contribution)
+
+class IncrementalSide:
+    # One side of a battle that is resolved again after edits: planning sessions and campaign
+    # rounds. It keeps the counters aggregate_side builds and every combatant's contribution
+    # to side_contributions, so an edit only recalculates the entries it touched.
+    def __init__(self, forces, fortifications):
+        # Positions in the submitted lists: combatants as they stand now, kept in battle order
+        self.forces = dict(enumerate(forces))
+        self.fortifications = dict(enumerate(fortifications))
+        counted = aggregate_side(forces)
+        self.multiplicity = counted.multiplicity
+        self.offensive_orders = counted.offensive_orders
+        self.defensive_orders = counted.defensive_orders
+        # Reads the live counters, so it never needs rebuilding; membership tests work on the keys view
+        self.aggregates = SideAggregates(self.multiplicity.keys(), self.multiplicity, self.offensive_orders, self.defensive_orders)
+        self.force_contributions = {}
+        self.fortification_contributions = {index: fortification_contribution(fortification) for index, fortification in self.fortifications.items()}
+        self.recalculate_forces()
+
+    def recalculate_forces(self):
+        self.force_contributions = {index: force_contribution(force, self.aggregates) for index, force in self.forces.items()}
+        self.totals = [0, 0, 0]
+        for contribution in itertools.chain(self.force_contributions.values(), self.fortification_contributions.values()):
+            self._add(contribution, 1)
+
+    def _add(self, contribution, step):
+        for position, value in enumerate(contribution):
+            self.totals[position] += step * value
+
+    def _count(self, force, step):
+        orders = self.offensive_orders if force.order.offensive_order else self.defensive_orders
+        for counter, key in ((self.multiplicity, force), (orders, force.order.order_name)):
+            counter[key] += step
+            if not counter[key]:
+                del counter[key]
+
+    def set_force(self, index, force):
+        # Returns whether every force on the side now needs recalculating
+        previous = self.forces[index]
+        self._count(previous, -1)
+        self._count(force, 1)
+        self.forces[index] = force
+        return previous.order.order_name in STACKING_ORDERS or force.order.order_name in STACKING_ORDERS
+
+    def remove_force(self, index):
+        # Returns whether every force left on the side now needs recalculating
+        force = self.forces.pop(index)
+        self._count(force, -1)
+        self._add(self.force_contributions.pop(index), -1)
+        return force.order.order_name in STACKING_ORDERS
+
+    def recalculate_force(self, index):
+        self._add(self.force_contributions[index], -1)
+        self.force_contributions[index] = force_contribution(self.forces[index], self.aggregates)
+        self._add(self.force_contributions[index], 1)
+
+    def update_forces(self, changed, recalculate_all):
+        # After a batch of set_force and remove_force calls: changed are the positions set.
+        # When most forces changed, one pass over the side is cheaper than updating each in turn
+        if recalculate_all or 2 * len(changed) > len(self.forces):
+            self.recalculate_forces()
+        else:
+            for index in changed:
+                self.recalculate_force(index)
+
+    def set_fortification(self, index, fortification):
+        self.fortifications[index] = fortification
+        self._add(self.fortification_contributions[index], -1)
+        self.fortification_contributions[index] = fortification_contribution(fortification)
+        self._add(self.fortification_contributions[index], 1)
+
+    def remove_fortification(self, index):
+        del self.fortifications[index]
+        self._add(self.fortification_contributions.pop(index), -1)
+
+
+def resolve_battle(battle, imperial=None, barbarian=None):
+    # Callers that keep a side's aggregates up to date themselves can pass them in
+    with instrumentation.phase('strength'):
+        if imperial is None:
+            imperial = aggregate_side(battle.imperial_forces)
+        if barbarian is None:
+            barbarian = aggregate_side(battle.barbarian_forces)
+        imperial_totals = side_contributions(battle.imperial_forces, battle.imperial_fortifications, imperial)
+        barbarian_totals = side_contributions(battle.barbarian_forces, battle.barbarian_fortifications, barbarian)
+    return settle_battle(battle, imperial, barbarian, imperial_totals, barbarian_totals)
+
+def settle_battle(battle, imperial, barbarian, imperial_totals, barbarian_totals):
+    # Victory points and casualties from each side's side_contributions totals
+    total_imperial_casualties_inflicted, imperial_offensive_victory_contribution, imperial_defensive_victory_contribution = imperial_totals
+    total_barbarian_casualties_inflicted, barbarian_offensive_victory_contribution, barbarian_defensive_victory_contribution = barbarian_totals
+
+    total_imperial_victory_contribution = imperial_offensive_victory_contribution + imperial_defensive_victory_contribution
+    total_barbarian_victory_contribution = barbarian_offensive_victory_contribution + barbarian_defensive_victory_contribution
+
+    with instrumentation.phase('victory_points'):
+        total_victory_points, offensive_victory_points, defensive_victory_points, outcome = calculate_victory_points(
+            total_imperial_victory_contribution, imperial_offensive_victory_contribution, imperial_defensive_victory_contribution,
+            total_barbarian_victory_contribution, barbarian_offensive_victory_contribution, barbarian_defensive_victory_contribution,
+            imperial, barbarian
+        )
+
+    # Distribute casualties and calculate remaining strengths
+    with instrumentation.phase('casualties'):
+        imperial_force_casualties, offensive_victory_points = distribute_force_casualties(
+            total_barbarian_casualties_inflicted, battle, outcome, offensive_victory_points, defensive_victory_points, imperial, barbarian, is_barbarian=False
+        )
+        barbarian_force_casualties, offensive_victory_points = distribute_force_casualties(
+            total_imperial_casualties_inflicted, battle, outcome, offensive_victory_points, defensive_victory_points, imperial, barbarian, is_barbarian=True
+        )
+        imperial_fort_casualties = distribute_fortification_casualties(
+            total_barbarian_casualties_inflicted, battle, outcome, defensive_victory_points, imperial, is_barbarian=False
+        )
+        barbarian_fort_casualties = distribute_fortification_casualties(
+            total_imperial_casualties_inflicted, battle, outcome, defensive_victory_points, imperial, is_barbarian=True
+        )
+    if total_victory_points - defensive_victory_points != offensive_victory_points:
+        total_victory_points = defensive_victory_points + offensive_victory_points
+
+    forces = []
+    for casualties, side in ((imperial_force_casualties, battle.imperial_forces), (barbarian_force_casualties, battle.barbarian_forces)):
+        for index, force in enumerate(side):
+            taken = casualties.get(index)
+            if taken is None:
+                forces.append(ForceResult(force.force, force.strength, 0, force.strength, True))
+            else:
+                forces.append(ForceResult(force.force, force.strength, taken[0], taken[1]))
+    fortifications = []
+    for casualties, side in ((imperial_fort_casualties, battle.imperial_fortifications), (barbarian_fort_casualties, battle.barbarian_fortifications)):
+        for index, fortification in enumerate(side):
+            taken = casualties.get(index)
+            if taken is None:
+                fortifications.append(FortificationResult(fortification.fortification, fortification.strength, 0, fortification.strength, True))
+            else:
+                fortifications.append(FortificationResult(fortification.fortification, fortification.strength, taken[0], taken[1]))
+
+    return BattleResult(outcome, total_victory_points, offensive_victory_points, defensive_victory_points, tuple(forces), tuple(fortifications))
+
+def calculate_force_strength(force, side):
+    victory_modifier = 0
+    order = force.order
+    force_strength = force.strength + force.ritual.force_effective_strength_modifier
+
+    stacked_orders = side.others_with_order(force, "Whatever it Takes")
+    if order.offensive_order:
+        stacked_orders += side.others_with_order(force, "Fire in the Blood")
+    additional_casualties_inflicted_modifier = stacked_tenths(stacked_orders)
+
+    casualties_inflicted = int(((force_strength * (1 + order.casualties_inflicted_modifier + additional_casualties_inflicted_modifier))/10))
+    if force.ritual.force_ritual_id == 2:
+        victory_modifier = 2000
+    if order.offensive_order:
+        offensive_victory_contribution = force_strength * (1 + order.territory_claimed_modifier) + victory_modifier
+        defensive_victory_contribution = 0
+    else:
+        defensive_victory_contribution = force_strength * (1 + order.territory_defence_modifier) + victory_modifier
+        offensive_victory_contribution = 0
+    return casualties_inflicted, offensive_victory_contribution, defensive_victory_contribution
+
+def calculate_fortification_strength(fortification):
+    fort_casualties_inflicted = 0
+    fort_strength = fortification.strength + fortification.ritual.fortification_effective_strength_modifier
+    if fortification.besieged:
+        fort_victory_contribution = fort_strength * 2
+        fort_casualties_inflicted = fort_strength/10
+    else:
+        fort_victory_contribution = fort_strength
+
+    return fort_casualties_inflicted, fort_victory_contribution
+
+def calculate_victory_points(total_imperial_victory_contribution, imperial_offensive_victory_contribution,
+                             imperial_defensive_victory_contribution, total_barbarian_victory_contribution,
+                             barbarian_offensive_victory_contribution, barbarian_defensive_victory_contribution,
+                             imperial, barbarian):
+
+    offensive_victory_points = 0
+    defensive_victory_points = 0
+
+    disciplined_vp = 0
+    if imperial.defensive_orders['Strategic Defence']:
+        disciplined_vp = barbarian.offensive_orders.total()
+        if disciplined_vp > 5:
+            disciplined_vp = 5
+
+    skirmishing_vp = 0
+    if imperial.offensive_orders['Outmanouvere']:
+        skirmishing_vp = barbarian.defensive_orders.total()
+        if skirmishing_vp > 5:
+            skirmishing_vp = 5
+
+    if total_imperial_victory_contribution > total_barbarian_victory_contribution:
+        outcome = 'Imperial Victory'
+        total_victory_points = int((total_imperial_victory_contribution - total_barbarian_victory_contribution) / 1000)
+
+        if imperial_offensive_victory_contribution == 0:
+            offensive_victory_points = 0
+            defensive_victory_points = int((imperial_defensive_victory_contribution - total_barbarian_victory_contribution) / 1000)
+            defensive_victory_points += disciplined_vp
+        elif imperial_defensive_victory_contribution == 0:
+            offensive_victory_points = int((imperial_offensive_victory_contribution - total_barbarian_victory_contribution) / 1000)
+            offensive_victory_points += skirmishing_vp
+            defensive_victory_points = 0
+        else:
+            difference = total_imperial_victory_contribution - total_barbarian_victory_contribution
+            offensive_split = imperial_offensive_victory_contribution / total_imperial_victory_contribution
+            defensive_split = imperial_defensive_victory_contribution / total_imperial_victory_contribution
+
+            # Calculate victory points without rounding to integers
+            offensive_victory_points = int(difference * offensive_split / 1000)
+            offensive_victory_points += skirmishing_vp
+            defensive_victory_points = int(difference * defensive_split / 1000)
+            defensive_victory_points += disciplined_vp
+
+        # Adjust the split to ensure the total victory points remain consistent
+        remaining_points = total_victory_points - (int(offensive_victory_points) + int(defensive_victory_points))
+        if remaining_points != 0:
+            if offensive_split > defensive_split:
+                offensive_victory_points += remaining_points
+            else:
+                defensive_victory_points += remaining_points
+
+    elif total_imperial_victory_contribution == total_barbarian_victory_contribution:
+        outcome = 'Draw'
+        total_victory_points = 0
+
+    else:
+        outcome = 'Barbarian Victory'
+        total_victory_points = int((total_barbarian_victory_contribution - total_imperial_victory_contribution) / 1000)
+        if barbarian_offensive_victory_contribution == 0:
+            offensive_victory_points = 0
+            defensive_victory_points = int((barbarian_defensive_victory_contribution - total_imperial_victory_contribution) / 1000)
+        elif barbarian_defensive_victory_contribution == 0:
+            offensive_victory_points = int((barbarian_offensive_victory_contribution - total_imperial_victory_contribution) / 1000)
+            defensive_victory_points = 0
+        else:
+            difference = total_barbarian_victory_contribution - total_imperial_victory_contribution
+            offensive_split = barbarian_offensive_victory_contribution / total_barbarian_victory_contribution
+            defensive_split = barbarian_defensive_victory_contribution / total_barbarian_victory_contribution
+            offensive_victory_points = int((difference * offensive_split) / 1000 + 0.5)
+            defensive_victory_points = int((difference * defensive_split) / 1000 + 0.5)
+
+    return total_victory_points, offensive_victory_points, defensive_victory_points, outcome
+
+def distribute_force_casualties(total_casualties_inflicted, battle, outcome, offensive_victory_points, defensive_victory_points, imperial, barbarian, is_barbarian):
+    # Returns {index in side: (casualties taken, remaining strength)} for every force that takes casualties
+    casualties = {}
+    force_break = 1000
+    large_force_break = 1250
+
+    if is_barbarian:
+        forces = battle.barbarian_forces
+        fortifications = battle.barbarian_fortifications
+        side = barbarian
+    else:
+        forces = battle.imperial_forces
+        fortifications = battle.imperial_fortifications
+        side = imperial
+
+    exempt_fortifications = [fortification for fortification in fortifications if not fortification.besieged]
+    exempt_forces = [force for force in forces if force.order.order_id == EXEMPT_ORDER_ID]
+    share_count = len(forces) + len(fortifications) - len(exempt_fortifications) - len(exempt_forces)
+
+    # Check for global effects from imperial orders
+    if any(force in barbarian.forces for force in forces):
+        if imperial.order_count("Merciless Onslaught"):
+            force_break = 1500
+            large_force_break = 2250
+
+    for index, force in enumerate(forces):
+        if force.order.order_id == EXEMPT_ORDER_ID:
+            continue
+        order = force.order
+        modifier = 1
+        modifier += order.casualties_suffered_modifier
+
+        additional_casualty_reduction_modifier = 0
+        if side.others_with_order(force, "Tend the Fallen"):
+            additional_casualty_reduction_modifier = -0.1
+        modifier += additional_casualty_reduction_modifier
+
+        if (outcome == 'Imperial Victory' and force in imperial.forces) or (outcome == 'Barbarian Victory' and force in barbarian.forces):
+            modifier -= (defensive_victory_points / 100)
+
+        casualties_taken = int(total_casualties_inflicted / share_count * modifier)
+        if order.order_name == 'Lay Low':
+            casualties_taken = 0
+        new_strength = force.strength - casualties_taken
+
+        if not force.force.large and new_strength < force_break:
+            new_strength = 0
+        elif force.force.large and new_strength < large_force_break:
+            new_strength = 0
+        if order.order_name == 'Final Stand':
+            new_strength, additional_casualties, offensive_victory_points = calculate_final_stand_casualties(force, offensive_victory_points)
+            casualties_taken += additional_casualties
+
+        casualties[index] = (casualties_taken, new_strength)
+
+    return casualties, offensive_victory_points
+
+def distribute_fortification_casualties(total_casualties_inflicted, battle, outcome, defensive_victory_points, imperial, is_barbarian):
+    # Returns {index in side: (casualties taken, remaining strength)} for every besieged fortification
+    casualties = {}
+    fortification_break = 1000
+    extra_fortification_casualties = 0
+
+    if is_barbarian:
+        forces = battle.barbarian_forces
+        fortifications = battle.barbarian_fortifications
+    else:
+        forces = battle.imperial_forces
+        fortifications = battle.imperial_fortifications
+
+    exempt_forces = [force for force in forces if force.order.order_id == EXEMPT_ORDER_ID]
+    exempt_fortifications = [fortification for fortification in fortifications if not fortification.besieged]
+    share_count = len(forces) + len(fortifications) - len(exempt_forces) - len(exempt_fortifications)
+
+    # Only apply Storm the Walls logic if processing barbarian fortifications
+    if is_barbarian and imperial.order_count("Storm the Walls"):
+        extra_fortification_casualties = 0.3
+
+    imperial_fortifications = frozenset(battle.imperial_fortifications)
+    barbarian_fortifications = frozenset(battle.barbarian_fortifications)
+    for index, fortification in enumerate(fortifications):
+        if not fortification.besieged:
+            continue
+        modifier = 1
+        modifier += extra_fortification_casualties
+
+        if (outcome == 'Imperial Victory' and fortification in imperial_fortifications) or (outcome == 'Barbarian Victory' and fortification in barbarian_fortifications):
+            modifier -= (defensive_victory_points / 100)
+
+        casualties_taken = int(total_casualties_inflicted / share_count * modifier)
+        new_strength = fortification.strength - casualties_taken
+
+        if new_strength < fortification_break:
+            new_strength = 0
+
+        casualties[index] = (casualties_taken, new_strength)
+
+    return casualties
+
+def calculate_final_stand_casualties(force, offensive_vp):
+    vp = offensive_vp
+    additional_casualties = 0
+    strength = force.strength
+    if force.force.large:
+        break_limit = 1500
+    else:
+        break_limit = 1000
+    while strength > break_limit and vp > 0:
+        strength -= 100
+        additional_casualties += 100
+        vp -= 1
+    if strength < break_limit:
+        strength = 0
+    return strength, additional_casualties, vp
+
+
+class IllegalOrderError(ValueError):
+    pass
+
+
+def force_from_dict(force_data, reference):
+    strength = force_data['strength']
+    order = reference.order(force_data['order'])
+    if strength == '' and order.order_name == 'Final Stand':
+        # Final Stand drains victory points from the force's strength, and there is none to drain
+        raise ValueError('A force on Final Stand needs a strength')
+    force = ForceInput(
+        force=reference.force(force_data['force']),
+        strength=int(strength) if strength != '' else 0,
+        order=order,
+        ritual=reference.force_ritual(force_data['ritual'])
+    )
+    if not reference.is_legal_order(force.force, force.ritual, force.order):
+        raise IllegalOrderError('%s cannot be given the order %s' % (force.force.force_name, force.order.order_name))
+    return force
+
+def fortification_from_dict(fort_data, reference):
+    strength = str(fort_data['strength'])
+    if not strength.isdigit():
+        raise ValueError('Fortification strength must be a whole number')
+    return FortificationInput(
+        fortification=reference.fortification(fort_data['fortification']),
+        strength=int(strength),
+        ritual=reference.fortification_ritual(fort_data['ritual']),
+        besieged=bool(fort_data['besieged'])
+    )
+
+def battle_from_dict(data, reference):
+    # Converts the JSON sent by calculations.js into a Battle
+    return Battle(
+        imperial_forces=tuple(force_from_dict(force_data, reference) for force_data in data['imperial_forces']),
+        imperial_fortifications=tuple(fortification_from_dict(fort_data, reference) for fort_data in data['imperial_fortifications']),
+        barbarian_forces=tuple(force_from_dict(force_data, reference) for force_data in data['barbarian_forces']),
+        barbarian_fortifications=tuple(fortification_from_dict(fort_data, reference) for fort_data in data['barbarian_fortifications'])
+    )
+
+def _results_by_id(results, id_of, name_field, name_of):
+    # Keyed by id: a combatant listed twice is reported once, with the strength of its last
+    # row and the casualties of its last row that took a share of them
+    entries = {}
+    for entry in results:
+        entries[str(id_of(entry))] = {
+            name_field: name_of(entry),
+            'strength': entry.strength,
+            'casualties_taken': 0,
+            'remaining_strength': entry.strength
+        }
+    for entry in results:
+        if not entry.exempt:
+            entries[str(id_of(entry))].update(casualties_taken=entry.casualties_taken, remaining_strength=entry.remaining_strength)
+    return entries
+
+def result_to_dict(result):
+    # Summarize the outcome in the shape showSummary() expects
+    return {
+        'total_victory_points': str(result.total_victory_points),
+        'offensive_victory_points': str(result.offensive_victory_points),
+        'defensive_victory_points': str(result.defensive_victory_points),
+        'outcome': result.outcome,
+        'forces_data': _results_by_id(result.forces, lambda entry: entry.force.force_id, 'force_name', lambda entry: entry.force.force_name),
+        'fortifications_data': _results_by_id(result.fortifications, lambda entry: entry.fortification.fortification_id,
+                                              'fortification_name', lambda entry: entry.fortification.fortification_name)
+    }
+
+def resolve_scenario(data, reference):
+    # Resolves one calculations.js payload, reporting a failure instead of raising it
+    try:
+        battle = battle_from_dict(data, reference)
+    except IllegalOrderError as error:
+        return {'error': str(error)}
+    except (KeyError, TypeError, ValueError):
+        return {'error': 'Invalid battle data'}
+    try:
+        return result_to_dict(resolve_battle(battle))
+    except Exception:
+        return {'error': 'Battle could not be resolved'}
@@ -0,0 +1,95 @@
+import itertools
+from collections import deque
+import catalog
+import engine
+
+# Fans CPU-bound battle resolution out to worker processes. Each worker receives the
+# reference catalog once when it starts, work is sent in chunks to keep pickling
+# overhead down, and results come back in submission order. With no workers
+# configured everything runs in-process, which gives the reference results.
+
+DEFAULT_CHUNK_SIZE = 25
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+def _init_worker(reference):
+    catalog.set_catalog(reference)
+
+def resolve_chunk(scenarios):
+    reference = catalog.get_catalog()
+    return [engine.resolve_scenario(scenario, reference) for scenario in scenarios]
+
+
+class ExecutionBackend:
+    def __init__(self, workers=0, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.workers = workers
+        self.chunk_size = max(1, chunk_size)
+        self._pool = None
+        self._pool_version = None
+
+    @property
+    def parallel(self):
+        return self.workers > 0
+
+    def _get_pool(self, reference):
+        # Workers hold a copy of the catalog, so a reloaded catalog needs fresh workers
+        if self._pool is None or self._pool_version != reference.version:
+            # Imported here so processes that never start workers skip multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            self.shutdown()
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(reference,))
+            self._pool_version = reference.version
+        return self._pool
+
+    def chunks(self, items):
+        iterator = iter(items)
+        while True:
+            chunk = list(itertools.islice(iterator, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def map(self, function, items, reference):
+        # function takes a list of items and returns a list of results; yields results one at a time, in order.
+        # items are read lazily and only a few chunks per worker are in flight, so a long stream stays flat in memory.
+        chunks = self.chunks(items)
+        first, second = next(chunks, None), next(chunks, None)
+        chunks = itertools.chain([chunk for chunk in (first, second) if chunk is not None], chunks)
+        if not self.parallel or second is None:
+            for chunk in chunks:
+                yield from function(chunk)
+            return
+        pool = self._get_pool(reference)
+        pending = deque()
+        try:
+            for chunk in chunks:
+                pending.append(pool.submit(function, chunk))
+                if len(pending) >= self.workers * CHUNKS_IN_FLIGHT_PER_WORKER:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            # A reader that stops early, such as a dropped stream, leaves nothing queued behind it
+            for future in pending:
+                future.cancel()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+            self._pool_version = None
+
+
+_backend = ExecutionBackend()
+
+def configure(workers=0, chunk_size=DEFAULT_CHUNK_SIZE):
+    global _backend
+    _backend.shutdown()
+    _backend = ExecutionBackend(workers, chunk_size)
+    return _backend
+
+def get_backend():
+    return _backend
+
+def resolve_scenarios(scenarios, reference=None):
+    reference = reference or catalog.get_catalog()
+    return _backend.map(resolve_chunk, scenarios, reference)
@@ -0,0 +1,179 @@
+import contextvars
+import threading
+import time
+from contextlib import nullcontext
+
+# Opt-in request instrumentation. While a request is being recorded, the engine's
+# phases and every SQL statement add their time to that request's timings, which
+# are returned in a Server-Timing header and folded into process-wide metrics for
+# /metrics in the Prometheus text format. Outside a recorded request phase() hands
+# back a shared no-op context manager, so the engine pays one lookup per phase.
+
+PHASES = ('strength', 'victory_points', 'casualties', 'serialization')
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_current = contextvars.ContextVar('request_timings', default=None)
+_no_op = nullcontext()
+
+
+class RequestTimings:
+    __slots__ = ('started', 'phases', 'sql_statements', 'sql_seconds')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+
+    def add_phase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def server_timing(self, total_seconds):
+        entries = ['total;dur=%.3f' % (total_seconds * 1000),
+                   'sql;dur=%.3f;desc="%d statements"' % (self.sql_seconds * 1000, self.sql_statements)]
+        entries.extend('%s;dur=%.3f' % (name, self.phases[name] * 1000) for name in PHASES if name in self.phases)
+        return ', '.join(entries)
+
+
+class _Phase:
+    __slots__ = ('name', 'timings', 'started')
+
+    def __init__(self, name, timings):
+        self.name = name
+        self.timings = timings
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.timings.add_phase(self.name, time.perf_counter() - self.started)
+
+
+def phase(name):
+    timings = _current.get()
+    if timings is None:
+        return _no_op
+    return _Phase(name, timings)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels):
+    return '{%s}' % ','.join('%s="%s"' % (key, _escape(value)) for key, value in sorted(labels.items()))
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.request_seconds = {}
+        self.request_buckets = {}
+        self.sql_statements = {}
+        self.sql_seconds = {}
+        self.phase_seconds = {}
+        self.phase_requests = {}
+
+    def observe(self, endpoint, method, status, seconds, timings):
+        with self._lock:
+            key = (endpoint, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.request_seconds[endpoint] = self.request_seconds.get(endpoint, 0.0) + seconds
+            buckets = self.request_buckets.setdefault(endpoint, [0] * len(DURATION_BUCKETS))
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    buckets[index] += 1
+            self.sql_statements[endpoint] = self.sql_statements.get(endpoint, 0) + timings.sql_statements
+            self.sql_seconds[endpoint] = self.sql_seconds.get(endpoint, 0.0) + timings.sql_seconds
+            for name, phase_seconds in timings.phases.items():
+                self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + phase_seconds
+                self.phase_requests[name] = self.phase_requests.get(name, 0) + 1
+
+    def render(self, extra=()):
+        # extra holds (name, type, help, value) samples read at scrape time, such as the outcome cache counters
+        with self._lock:
+            lines = ['# HELP army_calculator_requests_total Requests handled.',
+                     '# TYPE army_calculator_requests_total counter']
+            lines.extend('army_calculator_requests_total%s %d' % (_labels(endpoint=endpoint, method=method, status=status), count)
+                         for (endpoint, method, status), count in sorted(self.requests.items()))
+
+            lines += ['# HELP army_calculator_request_duration_seconds Wall time per request.',
+                      '# TYPE army_calculator_request_duration_seconds histogram']
+            for endpoint, buckets in sorted(self.request_buckets.items()):
+                count = sum(count for (name, _, _), count in self.requests.items() if name == endpoint)
+                for bound, bucket_count in zip(DURATION_BUCKETS, buckets):
+                    lines.append('army_calculator_request_duration_seconds_bucket%s %d' % (_labels(endpoint=endpoint, le=bound), bucket_count))
+                lines.append('army_calculator_request_duration_seconds_bucket%s %d' % (_labels(endpoint=endpoint, le='+Inf'), count))
+                lines.append('army_calculator_request_duration_seconds_sum%s %.6f' % (_labels(endpoint=endpoint), self.request_seconds[endpoint]))
+                lines.append('army_calculator_request_duration_seconds_count%s %d' % (_labels(endpoint=endpoint), count))
+
+            lines += ['# HELP army_calculator_sql_statements_total SQL statements executed while handling requests.',
+                      '# TYPE army_calculator_sql_statements_total counter']
+            lines.extend('army_calculator_sql_statements_total%s %d' % (_labels(endpoint=endpoint), count)
+                         for endpoint, count in sorted(self.sql_statements.items()))
+            lines += ['# HELP army_calculator_sql_seconds_total Time spent executing SQL while handling requests.',
+                      '# TYPE army_calculator_sql_seconds_total counter']
+            lines.extend('army_calculator_sql_seconds_total%s %.6f' % (_labels(endpoint=endpoint), seconds)
+                         for endpoint, seconds in sorted(self.sql_seconds.items()))
+
+            lines += ['# HELP army_calculator_phase_seconds Time spent in each phase of battle resolution.',
+                      '# TYPE army_calculator_phase_seconds summary']
+            for name in sorted(self.phase_seconds):
+                lines.append('army_calculator_phase_seconds_sum%s %.6f' % (_labels(phase=name), self.phase_seconds[name]))
+                lines.append('army_calculator_phase_seconds_count%s %d' % (_labels(phase=name), self.phase_requests[name]))
+
+        for name, metric_type, help_text, value in extra:
+            lines += ['# HELP %s %s' % (name, help_text), '# TYPE %s %s' % (name, metric_type), '%s %s' % (name, value)]
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's own context, so a statement that fails leaves nothing behind on the connection
+    context.instrumentation_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'instrumentation_started', None)
+    timings = _current.get()
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        if timings is not None:
+            timings.sql_statements += 1
+            timings.sql_seconds += elapsed
+
+def enabled(app):
+    return 'instrumentation' in app.extensions
+
+def init_app(app, engines, server_timing=True):
+    # Records every request to app and every statement the engines execute
+    from flask import g, request
+    from sqlalchemy import event
+
+    app.extensions['instrumentation'] = metrics
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_recording():
+        g.instrumentation_token = _current.set(RequestTimings())
+
+    @app.after_request
+    def finish_recording(response):
+        timings = _current.get()
+        if timings is None:
+            return response
+        elapsed = time.perf_counter() - timings.started
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe(endpoint, request.method, response.status_code, elapsed, timings)
+        if server_timing:
+            response.headers['Server-Timing'] = timings.server_timing(elapsed)
+        return response
+
+    @app.teardown_request
+    def stop_recording(exception):
+        token = g.pop('instrumentation_token', None)
+        if token is not None:
+            _current.reset(token)
@@ -0,0 +1,264 @@
+import argparse
+import configparser
+import json
+import signal
+import sqlite3
+import sys
+import time
+import uuid
+from contextlib import closing
+import campaign
+import catalog
+import engine
+import optimizer
+
+# Background jobs for work too slow for a request: Monte Carlo simulations,
+# order optimization and large batches. Jobs are queued in a SQLite file shared
+# by the web processes, which submit and report on them, and the worker
+# processes started by `python jobs.py`, which claim and run them one at a time.
+# Finished jobs are deleted once their results expire.
+
+DEFAULT_DATABASE = 'jobs.sqlite'
+DEFAULT_RESULT_TTL = 3600
+DEFAULT_MAX_ACTIVE_PER_CLIENT = 4
+DEFAULT_WORKERS = 1
+MAX_WAIT = 30
+POLL_INTERVAL = 0.25
+# A running job not finished in this many seconds is assumed lost with its worker
+JOB_TIMEOUT = 900
+MAX_BATCH_SCENARIOS = 10000
+
+ACTIVE = ('queued', 'running')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    client TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+CREATE INDEX IF NOT EXISTS jobs_client ON jobs (client, status);
+'''
+
+
+class JobLimitError(Exception):
+    pass
+
+class JobCancelled(Exception):
+    pass
+
+
+def run_simulation(data, reference, cancelled):
+    import simulation
+    battle, strength_specs = simulation.simulation_from_dict(data, reference)
+    return simulation.simulate(battle, strength_specs, int(data.get('samples', simulation.DEFAULT_SAMPLES)), data.get('seed'))
+
+def run_optimization(data, reference, cancelled):
+    battle = engine.battle_from_dict(data, reference)
+    return optimizer.optimize_orders(
+        battle, data.get('side', 'imperial'), data.get('objective', 'total_vp'), reference,
+        top_k=int(data.get('top_k', optimizer.DEFAULT_TOP_K)),
+        time_budget=float(data.get('time_budget', optimizer.DEFAULT_TIME_BUDGET))
+    )
+
+def run_batch(data, reference, cancelled, check_every=25):
+    # The one kind of job that can stop part way, between scenarios
+    scenarios = data.get('scenarios') if isinstance(data, dict) else data
+    if not isinstance(scenarios, list) or len(scenarios) > MAX_BATCH_SCENARIOS:
+        raise ValueError('Expected a list of at most %d scenarios' % MAX_BATCH_SCENARIOS)
+    results = []
+    for index, scenario in enumerate(scenarios):
+        if index % check_every == 0 and cancelled():
+            raise JobCancelled()
+        results.append(engine.resolve_scenario(scenario, reference))
+    return {'results': results}
+
+def run_campaign(data, reference, cancelled):
+    return campaign.simulate_campaign(data, reference)
+
+# kind: (handler, message for a payload it cannot use)
+JOB_TYPES = {
+    'simulate': (run_simulation, 'Invalid simulation data'),
+    'optimize': (run_optimization, 'Invalid optimization request'),
+    'batch': (run_batch, 'Invalid batch data'),
+    'campaign': (run_campaign, 'Invalid campaign data')
+}
+
+
+class JobQueue:
+    def __init__(self, path=DEFAULT_DATABASE, result_ttl=DEFAULT_RESULT_TTL, max_active_per_client=DEFAULT_MAX_ACTIVE_PER_CLIENT):
+        self.path = path
+        self.result_ttl = result_ttl
+        self.max_active_per_client = max_active_per_client
+        self._created = False
+
+    def _connect(self):
+        # Autocommit, with explicit BEGIN IMMEDIATE where a read decides a write. The file is created on first use.
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        if not self._created:
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.executescript(SCHEMA)
+            self._created = True
+        return connection
+
+    def submit(self, kind, payload, client):
+        if kind not in JOB_TYPES:
+            raise ValueError('Unknown job type %r' % kind)
+        job_id = uuid.uuid4().hex
+        with closing(self._connect()) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                active = connection.execute('SELECT COUNT(*) FROM jobs WHERE client = ? AND status IN (?, ?)', (client, *ACTIVE)).fetchone()[0]
+                if active >= self.max_active_per_client:
+                    raise JobLimitError('Too many jobs in progress, the limit is %d' % self.max_active_per_client)
+                connection.execute('INSERT INTO jobs (job_id, kind, client, status, payload, created) VALUES (?, ?, ?, ?, ?, ?)',
+                                   (job_id, kind, client, 'queued', json.dumps(payload), time.time()))
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        return job_id
+
+    def get(self, job_id, with_result=False):
+        # The job's status, and its result if asked for, or None for an unknown or expired job
+        with closing(self._connect()) as connection:
+            row = connection.execute('SELECT * FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        if row is None or (row['finished'] is not None and row['finished'] + self.result_ttl < time.time()):
+            return None
+        job = {'job_id': row['job_id'], 'type': row['kind'], 'status': row['status'], 'created': row['created'],
+               'started': row['started'], 'finished': row['finished']}
+        if row['error'] is not None:
+            job['error'] = row['error']
+        if with_result and row['result'] is not None:
+            job['result'] = json.loads(row['result'])
+        return job
+
+    def wait(self, job_id, timeout):
+        # Long polling: returns as soon as the job finishes, or after timeout seconds
+        deadline = time.monotonic() + min(timeout, MAX_WAIT)
+        job = self.get(job_id)
+        while job is not None and job['status'] in ACTIVE and time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            job = self.get(job_id)
+        return job
+
+    def cancel(self, job_id):
+        # A queued job never starts; a running one has its result discarded, and a batch stops early
+        with closing(self._connect()) as connection:
+            cursor = connection.execute('UPDATE jobs SET status = ?, payload = NULL, finished = ? WHERE job_id = ? AND status IN (?, ?)',
+                                        ('cancelled', time.time(), job_id, *ACTIVE))
+            return cursor.rowcount > 0
+
+    def is_cancelled(self, job_id):
+        with closing(self._connect()) as connection:
+            row = connection.execute('SELECT status FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return row is None or row['status'] == 'cancelled'
+
+    def claim(self):
+        # The oldest queued job, marked running, or None when the queue is empty
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                'UPDATE jobs SET status = ?, started = ? WHERE job_id = '
+                '(SELECT job_id FROM jobs WHERE status = ? ORDER BY created LIMIT 1) AND status = ? RETURNING job_id, kind, payload',
+                ('running', time.time(), 'queued', 'queued')
+            ).fetchall()
+        return (rows[0]['job_id'], rows[0]['kind'], json.loads(rows[0]['payload'])) if rows else None
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with closing(self._connect()) as connection:
+            connection.execute('UPDATE jobs SET status = ?, result = ?, error = ?, payload = NULL, finished = ? WHERE job_id = ? AND status = ?',
+                               (status, result, error, time.time(), job_id, 'running'))
+
+    def complete(self, job_id, result):
+        self._finish(job_id, 'done', result=json.dumps(result, sort_keys=True, separators=(',', ':')))
+
+    def fail(self, job_id, error):
+        self._finish(job_id, 'failed', error=error)
+
+    def expire(self):
+        now = time.time()
+        with closing(self._connect()) as connection:
+            connection.execute('UPDATE jobs SET status = ?, error = ?, payload = NULL, finished = ? WHERE status = ? AND started < ?',
+                               ('failed', 'The worker running this job stopped', now, 'running', now - JOB_TIMEOUT))
+            connection.execute('DELETE FROM jobs WHERE finished < ?', (now - self.result_ttl,))
+
+
+def queue_from_config(config):
+    return JobQueue(
+        config.get('JOBS', 'DATABASE', fallback=DEFAULT_DATABASE),
+        result_ttl=config.getint('JOBS', 'RESULT_TTL', fallback=DEFAULT_RESULT_TTL),
+        max_active_per_client=config.getint('JOBS', 'MAX_ACTIVE_PER_CLIENT', fallback=DEFAULT_MAX_ACTIVE_PER_CLIENT)
+    )
+
+def run_job(queue, job_id, kind, payload, reference):
+    handler, invalid = JOB_TYPES[kind]
+    try:
+        result = handler(payload, reference, lambda: queue.is_cancelled(job_id))
+    except JobCancelled:
+        return
+    except engine.IllegalOrderError as error:
+        queue.fail(job_id, str(error))
+    except (KeyError, TypeError, ValueError):
+        queue.fail(job_id, invalid)
+    except Exception:
+        queue.fail(job_id, 'The job could not be completed')
+    else:
+        queue.complete(job_id, result)
+
+def work(config_file, expire_interval=60):
+    # One worker process: takes the catalog from the app's database and runs jobs until stopped
+    from army_calculator import create_app
+    stopping = []
+    # Either signal lets the job in hand finish first
+    signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *args: stopping.append(True))
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    create_app(config_file)
+    queue = queue_from_config(config)
+    expired = 0
+    while not stopping:
+        if time.monotonic() - expired > expire_interval:
+            queue.expire()
+            expired = time.monotonic()
+        job = queue.claim()
+        if job is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+        run_job(queue, *job, catalog.get_catalog())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run background job workers.')
+    parser.add_argument('--config', default='configuration.ini')
+    parser.add_argument('--workers', type=int, help='worker processes (default: [JOBS] WORKERS, or %d)' % DEFAULT_WORKERS)
+    args = parser.parse_args(argv)
+
+    config = configparser.ConfigParser()
+    config.read(args.config)
+    workers = args.workers or config.getint('JOBS', 'WORKERS', fallback=DEFAULT_WORKERS)
+    # Imported here so the app, which imports this module for its job views, never loads multiprocessing
+    import multiprocessing
+    processes = [multiprocessing.Process(target=work, args=(args.config,)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    print('Started %d job worker%s.' % (workers, '' if workers == 1 else 's'))
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+            process.join()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,204 @@
+import itertools
+import math
+import time
+from dataclasses import replace
+from battle_sessions import BattleSession
+from engine import EXEMPT_ORDER_ID, result_to_dict
+
+# Searches the legal orders of every friendly force for the assignments that score
+# best on an objective. Orders with identical effects are searched once, every
+# assignment is resolved at most once, and the search stops at its time budget.
+# Assignments are resolved in one planning session, so moving from one to the next
+# only recalculates the forces whose orders differ; the other side and the
+# unchanged forces keep their contributions and aggregates.
+
+OBJECTIVES = ('offensive_vp', 'defensive_vp', 'total_vp', 'casualties')
+DEFAULT_TOP_K = 5
+MAX_TOP_K = 50
+DEFAULT_TIME_BUDGET = 2.0
+MAX_TIME_BUDGET = 10.0
+EXHAUSTIVE_LIMIT = 5000
+BEAM_WIDTH = 8
+
+# Orders the engine treats by name, so they can never stand in for one another
+SPECIAL_ORDER_NAMES = frozenset({
+    "Whatever it Takes", "Fire in the Blood", "Tend the Fallen", "Merciless Onslaught", "Storm the Walls",
+    "Strategic Defence", "Outmanouvere", "Lay Low", "Final Stand"
+})
+
+
+def _effect_key(order):
+    special = order.order_name in SPECIAL_ORDER_NAMES or order.order_id == EXEMPT_ORDER_ID
+    return (order.offensive_order, order.casualties_inflicted_modifier, order.casualties_suffered_modifier,
+            order.territory_claimed_modifier, order.territory_defence_modifier, order.order_name if special else None)
+
+def candidate_orders(force, reference):
+    # Legal orders for the force's own quality and any quality its ritual grants,
+    # grouped so that orders with identical effects are only tried once
+    orders = reference.orders_for_force(force.force, force.ritual)
+    groups = {}
+    for order in sorted(orders, key=lambda order: order.order_id):
+        groups.setdefault(_effect_key(order), []).append(order)
+    return [(group[0], tuple(group[1:])) for group in groups.values()]
+
+def score_result(result, side, objective, force_slice, fortification_slice):
+    # Scores compare as tuples: the objective first, then the signed VP margin to break ties
+    friendly_outcome = 'Imperial Victory' if side == 'imperial' else 'Barbarian Victory'
+    if result.outcome == friendly_outcome:
+        signed_total = result.total_victory_points
+    elif result.outcome == 'Draw':
+        signed_total = 0
+    else:
+        signed_total = -result.total_victory_points
+
+    if objective == 'casualties':
+        casualties = sum(entry.casualties_taken for entry in result.forces[force_slice] + result.fortifications[fortification_slice])
+        return (-casualties, signed_total)
+    if result.outcome != friendly_outcome:
+        return (signed_total, signed_total)
+    if objective == 'offensive_vp':
+        return (result.offensive_victory_points, signed_total)
+    if objective == 'defensive_vp':
+        return (result.defensive_victory_points, signed_total)
+    return (signed_total, signed_total)
+
+
+class OrderSearch:
+    def __init__(self, battle, side, objective, reference, time_budget=DEFAULT_TIME_BUDGET):
+        if side not in ('imperial', 'barbarian'):
+            raise ValueError('Side must be imperial or barbarian')
+        if objective not in OBJECTIVES:
+            raise ValueError('Unknown objective')
+        if not 0 < time_budget <= MAX_TIME_BUDGET:
+            raise ValueError('Time budget must be between 0 and %s seconds' % MAX_TIME_BUDGET)
+        self.battle = battle
+        self.side = side
+        self.objective = objective
+        if side == 'imperial':
+            self.friendly_forces = battle.imperial_forces
+            self.force_slice = slice(0, len(battle.imperial_forces))
+            self.fortification_slice = slice(0, len(battle.imperial_fortifications))
+        else:
+            self.friendly_forces = battle.barbarian_forces
+            self.force_slice = slice(len(battle.imperial_forces), None)
+            self.fortification_slice = slice(len(battle.imperial_fortifications), None)
+        self.candidates = [candidate_orders(force, reference) for force in self.friendly_forces]
+        self.search_space = math.prod(len(candidates) for candidates in self.candidates)
+        self.deadline = time.perf_counter() + time_budget
+        self.timed_out = False
+        self.evaluations = {}
+        self._variants = {}
+        self.session = BattleSession(battle)
+        self._applied = list(self.friendly_forces)
+
+    def _force_with_order(self, index, order):
+        key = (index, order.order_id)
+        if key not in self._variants:
+            self._variants[key] = replace(self.friendly_forces[index], order=order)
+        return self._variants[key]
+
+    def evaluate(self, assignment):
+        # assignment holds one candidate index per friendly force
+        if assignment in self.evaluations:
+            return self.evaluations[assignment]
+        if time.perf_counter() > self.deadline:
+            self.timed_out = True
+            return None
+        changes = {}
+        for index, choice in enumerate(assignment):
+            force = self._force_with_order(index, self.candidates[index][choice][0])
+            if force is not self._applied[index]:
+                changes[(self.side, 'force', index)] = force
+                self._applied[index] = force
+        self.session.apply(changes)
+        try:
+            result = self.session.resolve()
+            score = score_result(result, self.side, self.objective, self.force_slice, self.fortification_slice)
+        except Exception:
+            result, score = None, None
+        self.evaluations[assignment] = (score, result)
+        return self.evaluations[assignment]
+
+    def _score(self, assignment):
+        evaluation = self.evaluate(assignment)
+        return evaluation[0] if evaluation and evaluation[0] is not None else None
+
+    def initial_assignment(self):
+        # Start from the submitted orders where they are legal
+        assignment = []
+        for force, candidates in zip(self.friendly_forces, self.candidates):
+            choice = 0
+            for index, (order, equivalents) in enumerate(candidates):
+                if force.order.order_id == order.order_id or force.order.order_id in (equivalent.order_id for equivalent in equivalents):
+                    choice = index
+            assignment.append(choice)
+        return tuple(assignment)
+
+    def run(self):
+        if self.search_space <= EXHAUSTIVE_LIMIT:
+            self.exhaustive = True
+            for assignment in itertools.product(*(range(len(candidates)) for candidates in self.candidates)):
+                self.evaluate(assignment)
+                if self.timed_out:
+                    break
+            return
+
+        self.exhaustive = False
+        beam = [self.initial_assignment()]
+        self.evaluate(beam[0])
+        # Assign the strongest forces first, they move the outcome the most
+        force_order = sorted(range(len(self.friendly_forces)), key=lambda index: -self.friendly_forces[index].strength)
+        for index in force_order:
+            expanded = {state[:index] + (choice,) + state[index + 1:] for state in beam for choice in range(len(self.candidates[index]))}
+            scored = [(self._score(state), state) for state in expanded]
+            if self.timed_out:
+                break
+            scored = [(score, state) for score, state in scored if score is not None]
+            scored.sort(key=lambda item: item[0], reverse=True)
+            beam = [state for _, state in scored[:BEAM_WIDTH]] or beam
+
+        # Improve the best assignment one force at a time until nothing helps
+        best = max(beam, key=lambda state: self._score(state) or (-math.inf,))
+        improved = True
+        while improved and not self.timed_out:
+            improved = False
+            for index in force_order:
+                for choice in range(len(self.candidates[index])):
+                    state = best[:index] + (choice,) + best[index + 1:]
+                    score = self._score(state)
+                    if score is not None and score > (self._score(best) or (-math.inf,)):
+                        best, improved = state, True
+                if self.timed_out:
+                    break
+
+    def top(self, top_k):
+        ranked = [(score, assignment, result) for assignment, (score, result) in self.evaluations.items() if score is not None]
+        ranked.sort(key=lambda item: item[0], reverse=True)
+        assignments = []
+        for score, assignment, result in ranked[:top_k]:
+            orders = {}
+            for force, candidates, choice in zip(self.friendly_forces, self.candidates, assignment):
+                order, equivalents = candidates[choice]
+                orders[str(force.force.force_id)] = {
+                    'order_id': order.order_id,
+                    'order_name': order.order_name,
+                    'equivalent_order_ids': [equivalent.order_id for equivalent in equivalents]
+                }
+            assignments.append({'score': score[0], 'orders': orders, 'result': result_to_dict(result)})
+        return assignments
+
+
+def optimize_orders(battle, side, objective, reference, top_k=DEFAULT_TOP_K, time_budget=DEFAULT_TIME_BUDGET):
+    if not 0 < top_k <= MAX_TOP_K:
+        raise ValueError('top_k must be between 1 and %d' % MAX_TOP_K)
+    search = OrderSearch(battle, side, objective, reference, time_budget)
+    search.run()
+    return {
+        'side': side,
+        'objective': objective,
+        'search_space': search.search_space,
+        'evaluated': len(search.evaluations),
+        'exhaustive': search.exhaustive and not search.timed_out,
+        'timed_out': search.timed_out,
+        'assignments': search.top(top_k)
+    }
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+import catalog
+
+# Remembers /calculate_outcome results for recently seen battles. Battles are
+# reduced to a canonical form first (ids and strengths as ints, blank orders and
+# rituals already resolved, combatants sorted within each side) so the same battle
+# entered in a different row order is still a hit. Final Stand forces are the
+# exception: they drain victory points one after another in row order, so they
+# keep their order. Entries are keyed by that fingerprint and the catalog
+# version, expire after a TTL and are evicted least recently used first.
+
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_TTL = 3600
+
+def canonical_battle(battle):
+    # None when a side lists the same combatant twice: those results depend on row order
+    def forces(side):
+        key = lambda force: (force.force.force_id, force.strength, force.order.order_id, force.ritual.force_ritual_id)
+        rows = sorted(key(force) for force in side if force.order.order_name != 'Final Stand')
+        rows += [key(force) for force in side if force.order.order_name == 'Final Stand']
+        return rows if len({row[0] for row in rows}) == len(rows) else None
+
+    def fortifications(side):
+        rows = sorted((fortification.fortification.fortification_id, fortification.strength,
+                       fortification.ritual.fortification_ritual_id, fortification.besieged) for fortification in side)
+        return rows if len({row[0] for row in rows}) == len(rows) else None
+
+    canonical = (forces(battle.imperial_forces), fortifications(battle.imperial_fortifications),
+                 forces(battle.barbarian_forces), fortifications(battle.barbarian_fortifications))
+    return None if None in canonical else canonical
+
+def scenario_fingerprint(battle):
+    canonical = canonical_battle(battle)
+    if canonical is None:
+        return None
+    return hashlib.sha1(json.dumps(canonical, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+class OutcomeCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries, 'ttl': self.ttl,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+_cache = OutcomeCache()
+
+def configure(max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+    global _cache
+    _cache = OutcomeCache(max_entries, ttl)
+    return _cache
+
+def get_cache():
+    return _cache
+
+def resolve_cached(battle, reference, resolve):
+    # resolve(battle) produces the result to cache; battles without a fingerprint bypass the cache
+    fingerprint = scenario_fingerprint(battle) if _cache.enabled else None
+    if fingerprint is None:
+        return resolve(battle)
+    key = (fingerprint, reference.version)
+    result = _cache.get(key)
+    if result is None:
+        result = resolve(battle)
+        _cache.put(key, result)
+    return result
+
+@catalog.on_reload
+def _flush(reference):
+    _cache.clear()
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import catalog
+
+# Serialized JSON for the form dropdown endpoints. Payloads are built once per
+# catalog version, each with a strong ETag, and are thrown away when the catalog
+# is reloaded.
+
+MAX_FILTERED_PAYLOADS = 256
+
+class Payload:
+    __slots__ = ('body', 'etag')
+
+    def __init__(self, data):
+        # Matches jsonify's key order and escaping
+        self.body = json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        self.etag = hashlib.sha1(self.body).hexdigest()
+
+
+def _parse_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ReferencePayloads:
+    def __init__(self, reference):
+        self.version = reference.version
+        self._reference = reference
+        self._filtered_forces = {}
+        forces = [reference.forces[force_id] for force_id in sorted(reference.forces)]
+        fortifications = [reference.fortifications[fortification_id] for fortification_id in sorted(reference.fortifications)]
+
+        self.imperial_force_options = Payload({'forces': [
+            (force.force_id, force.force_name) for force in forces
+            if force.nation_id in reference.nations and reference.faction(force) == 'The Empire'
+        ]})
+        self.force_rituals = Payload({'rituals': [
+            (ritual.force_ritual_id, ritual.force_ritual_name)
+            for _, ritual in sorted(reference.force_rituals.items()) if ritual.army_ritual
+        ]})
+        self.fortification_options = {
+            'imperial': Payload({'fortifications': [
+                (fortification.fortification_id, fortification.fortification_name)
+                for fortification in fortifications if 6 <= fortification.fortification_id < 34
+            ]}),
+            'barbarian': Payload({'fortifications': [
+                (fortification.fortification_id, fortification.fortification_name)
+                for fortification in fortifications if 0 < fortification.fortification_id < 6
+            ]})
+        }
+        self.no_fortification_options = Payload({'fortifications': []})
+        self.fortification_rituals = Payload({'rituals': [
+            (ritual.fortification_ritual_id, ritual.fortification_ritual_name)
+            for _, ritual in sorted(reference.fortification_rituals.items()) if ritual.fortification_ritual_id > 0
+        ]})
+        self.force_info = {
+            force.force_id: Payload({'quality': force.quality_id, 'large': force.large}) for force in forces
+        }
+        self.fortification_info = {
+            fortification.fortification_id: Payload({'strength': fortification.fortification_maximum_strength})
+            for fortification in fortifications
+        }
+        self.force_ritual_effects = {
+            ritual.force_ritual_id: Payload({
+                'force_effective_strength_modifier': ritual.force_effective_strength_modifier,
+                'force_ritual_quality_id': ritual.force_ritual_quality_id
+            }) for ritual in reference.force_rituals.values()
+        }
+        self.fortification_ritual_effects = {
+            ritual.fortification_ritual_id: Payload({
+                'fortification_effective_strength_modifier': ritual.fortification_effective_strength_modifier
+            }) for ritual in reference.fortification_rituals.values()
+        }
+        self.bootstrap = Payload(self._bootstrap_data(reference, forces, fortifications))
+
+    def _bootstrap_data(self, reference, forces, fortifications):
+        # Everything the battle form needs, so the client can fill every row locally.
+        # Forces are [id, name, quality, large, imperial, legal order ids, legal order ids
+        # keyed by the quality a ritual grants, where that widens the force's own list].
+        return {
+            'version': reference.version,
+            'orders': [(order.order_id, order.order_name) for _, order in sorted(reference.orders.items())],
+            'forces': [
+                (force.force_id, force.force_name, force.quality_id, force.large, reference.faction(force) == 'The Empire',
+                 [order.order_id for order in reference.effective_orders.get((force.force_id, 0), ())],
+                 self._granted_order_ids(reference, force))
+                for force in forces if force.nation_id in reference.nations
+            ],
+            'force_rituals': [
+                (ritual.force_ritual_id, ritual.force_ritual_name, ritual.force_effective_strength_modifier, ritual.force_ritual_quality_id)
+                for _, ritual in sorted(reference.force_rituals.items()) if ritual.army_ritual
+            ],
+            'fortifications': {
+                'imperial': [
+                    (fortification.fortification_id, fortification.fortification_name, fortification.fortification_maximum_strength)
+                    for fortification in fortifications if 6 <= fortification.fortification_id < 34
+                ],
+                'barbarian': [
+                    (fortification.fortification_id, fortification.fortification_name, fortification.fortification_maximum_strength)
+                    for fortification in fortifications if 0 < fortification.fortification_id < 6
+                ]
+            },
+            'fortification_rituals': [
+                (ritual.fortification_ritual_id, ritual.fortification_ritual_name, ritual.fortification_effective_strength_modifier)
+                for _, ritual in sorted(reference.fortification_rituals.items()) if ritual.fortification_ritual_id > 0
+            ]
+        }
+
+    @staticmethod
+    def _granted_order_ids(reference, force):
+        own_orders = reference.effective_orders.get((force.force_id, 0), ())
+        return {
+            str(quality_id): [order.order_id for order in orders]
+            for (force_id, quality_id), orders in reference.effective_orders.items()
+            if force_id == force.force_id and quality_id != 0 and orders != own_orders
+        }
+
+    def barbarian_force_options(self, selected_barbarian):
+        # Same matching as the LIKE '%name%' filter it replaces: case-insensitive substring
+        key = selected_barbarian.lower()
+        payload = self._filtered_forces.get(key)
+        if payload is None:
+            payload = Payload({'forces': [
+                (force.force_id, force.force_name)
+                for _, force in sorted(self._reference.forces.items()) if key in force.force_name.lower()
+            ]})
+            if len(self._filtered_forces) < MAX_FILTERED_PAYLOADS:
+                self._filtered_forces[key] = payload
+        return payload
+
+    def force_options(self, is_barbarian, selected_barbarian=''):
+        if is_barbarian:
+            return self.barbarian_force_options(selected_barbarian)
+        return self.imperial_force_options
+
+    def fortification_options_for(self, role):
+        return self.fortification_options.get(role, self.no_fortification_options)
+
+    def force_info_for(self, force_id):
+        return self.force_info.get(_parse_id(force_id))
+
+    def fortification_info_for(self, fortification_id):
+        return self.fortification_info.get(_parse_id(fortification_id))
+
+    def force_ritual_effect_for(self, ritual_id):
+        return self.force_ritual_effects.get(_parse_id(ritual_id))
+
+    def fortification_ritual_effect_for(self, ritual_id):
+        return self.fortification_ritual_effects.get(_parse_id(ritual_id))
+
+
+_payloads = None
+
+def get_payloads():
+    global _payloads
+    reference = catalog.get_catalog()
+    if _payloads is None or _payloads.version != reference.version:
+        _payloads = ReferencePayloads(reference)
+    return _payloads
+
+@catalog.on_reload
+def _invalidate(reference):
+    global _payloads
+    _payloads = None
@@ -0,0 +1,197 @@
+import heapq
+import itertools
+import re
+from collections import Counter
+from dataclasses import dataclass
+import catalog
+
+# Typeahead search over forces, orders and qualities. Every word of a document's
+# name, effects, descriptors and description is indexed under each of its
+# prefixes, weighted by the field it came from, and names are also indexed by
+# trigram so a fragment from the middle of a word still finds them. A query reads
+# one posting list per word instead of scanning every row, and only ranks the
+# documents in it. The index is built from the database once per catalog version.
+
+TYPES = ('force', 'order', 'quality')
+FACETS = ('type', 'faction', 'offensive', 'quality')
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+MAX_PREFIX = 20
+# Shorter prefixes only look at names, so the first keystrokes do not match half the effects text
+MIN_TEXT_PREFIX = 3
+# Field weights for a word that matches in full; a prefix match scores half
+FIELD_WEIGHTS = {'name': 10, 'descriptors': 4, 'related': 3, 'effects': 2, 'description': 1}
+TRIGRAM_WEIGHT = 2
+
+_words = re.compile(r'\w+')
+
+
+@dataclass(frozen=True, slots=True)
+class SearchDocument:
+    type: str
+    id: int
+    name: str
+    faction: str = None
+    nation: str = None
+    offensive: bool = None
+    # Quality ids: a force's own quality, or the qualities that grant an order
+    qualities: tuple = ()
+
+    def to_dict(self, score):
+        result = {'type': self.type, 'id': self.id, 'name': self.name, 'score': score}
+        if self.type == 'force':
+            result.update(faction=self.faction, nation=self.nation, quality_id=self.qualities[0] if self.qualities else None)
+        elif self.type == 'order':
+            result.update(offensive=self.offensive, quality_ids=list(self.qualities))
+        return result
+
+
+def _facet_keys(document):
+    keys = [('type', document.type)]
+    if document.faction is not None:
+        keys.append(('faction', document.faction))
+    if document.offensive is not None:
+        keys.append(('offensive', 'offensive' if document.offensive else 'defensive'))
+    keys.extend(('quality', str(quality_id)) for quality_id in document.qualities)
+    return tuple(keys)
+
+def words(text):
+    return _words.findall((text or '').lower())
+
+def trigrams(word):
+    return {word[index:index + 3] for index in range(len(word) - 2)}
+
+
+class SearchIndex:
+    def __init__(self, version, documents):
+        # documents is a list of (SearchDocument, {field: text})
+        self.version = version
+        self.documents = []
+        self._postings = {}
+        self._trigrams = {}
+        for document, fields in documents:
+            number = len(self.documents)
+            self.documents.append(document)
+            for field, text in fields.items():
+                weight = FIELD_WEIGHTS[field]
+                shortest = 1 if field == 'name' else MIN_TEXT_PREFIX
+                for word in set(words(text)):
+                    for length in range(shortest, min(len(word), MAX_PREFIX) + 1):
+                        score = weight if length == len(word) else weight / 2
+                        postings = self._postings.setdefault(word[:length], {})
+                        if postings.get(number, 0) < score:
+                            postings[number] = score
+            for word in words(document.name):
+                for trigram in trigrams(word):
+                    self._trigrams.setdefault(trigram, set()).add(number)
+        self._rank = [(len(document.name), document.name) for document in self.documents]
+        self._facet_keys = [_facet_keys(document) for document in self.documents]
+
+    def _match_word(self, word):
+        # {document number: score} for one query word
+        postings = self._postings.get(word[:MAX_PREFIX])
+        if postings is not None:
+            return postings
+        if len(word) < 3:
+            return {}
+        # Not the start of any word: fall back to names containing it
+        candidates = None
+        for trigram in trigrams(word):
+            matches = self._trigrams.get(trigram, set())
+            candidates = matches if candidates is None else candidates & matches
+            if not candidates:
+                return {}
+        return {number: TRIGRAM_WEIGHT for number in candidates if word in self.documents[number].name.lower()}
+
+    def search(self, query, types=None, faction=None, offensive=None, quality=None, limit=DEFAULT_LIMIT):
+        scores = None
+        for word in words(query):
+            matches = self._match_word(word)
+            if scores is None:
+                scores = dict(matches)
+            else:
+                scores = {number: score + matches[number] for number, score in scores.items() if number in matches}
+            if not scores:
+                break
+
+        matched = list(scores or ())
+        if types or faction is not None or offensive is not None or quality is not None:
+            matched = [number for number in matched if self._wanted(self.documents[number], types, faction, offensive, quality)]
+        facets = {name: {} for name in FACETS}
+        for (name, value), count in Counter(itertools.chain.from_iterable(self._facet_keys[number] for number in matched)).items():
+            facets[name][value] = count
+
+        # Best score first, then shorter names, which are closer to what was typed
+        top = heapq.nsmallest(limit, matched, key=lambda number: (-scores[number], self._rank[number]))
+        return {
+            'query': query,
+            'total': len(matched),
+            'results': [self.documents[number].to_dict(scores[number]) for number in top],
+            'facets': facets
+        }
+
+    @staticmethod
+    def _wanted(document, types, faction, offensive, quality):
+        return ((not types or document.type in types) and (faction is None or document.faction == faction) and
+                (offensive is None or document.offensive == offensive) and (quality is None or quality in document.qualities))
+
+
+def build_index(reference, order_text, quality_text):
+    # order_text maps order ids to (effects, description), quality_text quality ids to (effects, descriptors, description)
+    granted_by = {}
+    for quality_id, orders in reference.quality_orders.items():
+        for order in orders:
+            granted_by.setdefault(order.order_id, []).append(quality_id)
+
+    documents = []
+    for force_id, force in sorted(reference.forces.items()):
+        if not force_id:
+            continue
+        nation = reference.nations.get(force.nation_id)
+        quality = reference.qualities.get(force.quality_id)
+        documents.append((
+            SearchDocument('force', force_id, force.force_name, faction=nation and nation.nation_faction,
+                           nation=nation and nation.nation_name, qualities=(force.quality_id,) if force.quality_id else ()),
+            {'name': force.force_name, 'related': ' '.join(filter(None, (nation and nation.nation_name, quality and quality.quality_name)))}
+        ))
+    for order_id, order in sorted(reference.orders.items()):
+        if not order_id:
+            continue
+        effects, description = order_text.get(order_id, ('', ''))
+        documents.append((
+            SearchDocument('order', order_id, order.order_name, offensive=order.offensive_order, qualities=tuple(sorted(granted_by.get(order_id, ())))),
+            {'name': order.order_name, 'effects': effects, 'description': description}
+        ))
+    for quality_id, quality in sorted(reference.qualities.items()):
+        if not quality_id:
+            continue
+        effects, descriptors, description = quality_text.get(quality_id, ('', '', ''))
+        documents.append((
+            SearchDocument('quality', quality_id, quality.quality_name, qualities=(quality_id,)),
+            {'name': quality.quality_name, 'effects': effects, 'descriptors': descriptors, 'description': description}
+        ))
+    return SearchIndex(reference.version, documents)
+
+
+_loader = None
+_index = None
+
+def set_loader(loader):
+    # loader(reference) returns the SearchIndex for that catalog
+    global _loader, _index
+    _loader = loader
+    _index = None
+
+def get_index():
+    global _index
+    reference = catalog.get_catalog()
+    if _index is None or _index.version != reference.version:
+        if _loader is None:
+            raise RuntimeError('No search index loader has been registered')
+        _index = _loader(reference)
+    return _index
+
+@catalog.on_reload
+def _invalidate(reference):
+    global _index
+    _index = None
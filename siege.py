@@ -0,0 +1,87 @@
+from dataclasses import replace
+import numpy as np
+from engine import FortificationInput, battle_from_dict
+from simulation import OUTCOMES, resolve_samples
+
+# Siege planning: one besieging army against every fortification in the catalog,
+# at every fortification ritual, in a single vectorized pass. Each pairing is a
+# sample row in which the defenders hold only that fortification, besieged, along
+# with any defending forces that were submitted.
+
+FORTIFICATION_BREAK = 1000
+SIDES = ('imperial', 'barbarian')
+
+
+def siege_candidates(reference, fortification_ids=None, ritual_ids=None):
+    # (fortification, ritual) pairs, skipping the blank fortification with no strength
+    fortifications = [fortification for _, fortification in sorted(reference.fortifications.items())
+                      if fortification.fortification_maximum_strength > 0]
+    rituals = [ritual for _, ritual in sorted(reference.fortification_rituals.items())]
+    if fortification_ids is not None:
+        fortifications = [reference.fortification(fortification_id) for fortification_id in fortification_ids]
+    if ritual_ids is not None:
+        rituals = [reference.fortification_ritual(ritual_id) for ritual_id in ritual_ids]
+    return [(fortification, ritual) for fortification in fortifications for ritual in rituals]
+
+def plan_siege(battle, side, candidates, strength_fraction=1.0):
+    # side is the besieging side; any fortifications the defenders were given are replaced by each candidate in turn
+    if side not in SIDES:
+        raise ValueError('Side must be imperial or barbarian')
+    if not 0 < strength_fraction <= 1:
+        raise ValueError('strength_fraction must be more than 0 and at most 1')
+    if not candidates:
+        raise ValueError('No fortifications to besiege')
+    defender = 'barbarian' if side == 'imperial' else 'imperial'
+    fortification, ritual = candidates[0]
+    battle = replace(battle, **{defender + '_fortifications': (FortificationInput(fortification, 0, ritual, True),)})
+
+    rows = len(candidates)
+    strengths = np.array([int(round(fortification.fortification_maximum_strength * strength_fraction)) for fortification, _ in candidates], dtype=np.int64)
+    ritual_strengths = np.array([ritual.fortification_effective_strength_modifier for _, ritual in candidates], dtype=np.int64)
+    groups = [np.tile(np.array([entry.strength for entry in group], dtype=np.int64), (rows, 1))
+              for group in (battle.imperial_forces, battle.imperial_fortifications, battle.barbarian_forces, battle.barbarian_fortifications)]
+    defended = 1 if defender == 'imperial' else 3
+    groups[defended] = strengths[:, None]
+    fortification_rituals = (ritual_strengths[:, None], None) if defender == 'imperial' else (None, ritual_strengths[:, None])
+    result = resolve_samples(battle, *groups, fortification_ritual_strengths=fortification_rituals, fixed_forces=True)
+
+    fortification_column = 0 if defender == 'imperial' else len(battle.imperial_fortifications)
+    casualties = result.fortification_casualties[:, fortification_column]
+    remaining = result.fortification_remaining[:, fortification_column]
+    imperial_forces = len(battle.imperial_forces)
+    besieger_columns = slice(0, imperial_forces) if side == 'imperial' else slice(imperial_forces, None)
+    besieger_casualties = result.force_casualties[:, besieger_columns].sum(axis=1)
+
+    plans = []
+    for row, (fortification, ritual) in enumerate(candidates):
+        unresolved = bool(result.unresolved[row])
+        plans.append({
+            'fortification_id': fortification.fortification_id,
+            'fortification_name': fortification.fortification_name,
+            'fortification_level': fortification.fortification_level,
+            'ritual_id': ritual.fortification_ritual_id,
+            'ritual_name': ritual.fortification_ritual_name,
+            'strength': int(strengths[row]),
+            'falls': bool(remaining[row] == 0),
+            'casualties_taken': int(casualties[row]),
+            'remaining_strength': int(remaining[row]),
+            # Strength left above the break threshold; negative when the fortification falls
+            'margin': int(strengths[row] - casualties[row] - FORTIFICATION_BREAK),
+            'outcome': None if unresolved else OUTCOMES[result.outcome[row]],
+            'total_victory_points': None if unresolved else int(result.total_victory_points[row]),
+            'besieger_casualties': int(besieger_casualties[row]),
+            'unresolved': unresolved
+        })
+    return {
+        'side': side,
+        'strength_fraction': strength_fraction,
+        'evaluated': rows,
+        'falls': sum(plan['falls'] for plan in plans),
+        'fortifications': plans
+    }
+
+def siege_from_dict(data, reference):
+    # The usual battle JSON, where the defending side's fortifications may be left empty
+    battle = battle_from_dict(data, reference)
+    candidates = siege_candidates(reference, data.get('fortifications'), data.get('rituals'))
+    return plan_siege(battle, data.get('side', 'imperial'), candidates, float(data.get('strength_fraction', 1.0)))
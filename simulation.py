@@ -0,0 +1,403 @@
+from dataclasses import dataclass
+import numpy as np
+from engine import EXEMPT_ORDER_ID, aggregate_side, stacked_tenths, force_from_dict, fortification_from_dict, Battle
+
+# Vectorized battle resolution: one battle layout (forces, orders, rituals) resolved
+# for many strength samples at once. Every step mirrors engine.resolve_battle so a
+# sample row gives exactly the numbers the scalar engine would.
+
+OUTCOMES = ('Imperial Victory', 'Draw', 'Barbarian Victory')
+IMPERIAL_VICTORY, DRAW, BARBARIAN_VICTORY = range(3)
+DEFAULT_SAMPLES = 5000
+MAX_SAMPLES = 100000
+PERCENTILES = (5, 25, 50, 75, 95)
+DEFAULT_GRID_STEPS = 50
+MAX_GRID_STEPS = 400
+
+@dataclass(slots=True)
+class SampledResult:
+    outcome: np.ndarray
+    total_victory_points: np.ndarray
+    offensive_victory_points: np.ndarray
+    defensive_victory_points: np.ndarray
+    force_casualties: np.ndarray
+    force_remaining: np.ndarray
+    fortification_casualties: np.ndarray
+    fortification_remaining: np.ndarray
+    # Samples where engine.calculate_victory_points raises instead of returning a split
+    unresolved: np.ndarray
+
+
+def _truncate(values):
+    # int() on a float truncates towards zero
+    return np.trunc(values).astype(np.int64)
+
+def _force_columns(forces, side):
+    ritual_strength = np.array([force.ritual.force_effective_strength_modifier for force in forces], dtype=np.int64)
+    inflicted_factor = np.array([
+        1 + force.order.casualties_inflicted_modifier + stacked_tenths(
+            side.others_with_order(force, "Whatever it Takes") +
+            (side.others_with_order(force, "Fire in the Blood") if force.order.offensive_order else 0))
+        for force in forces], dtype=np.float64)
+    victory_factor = np.array([
+        1 + (force.order.territory_claimed_modifier if force.order.offensive_order else force.order.territory_defence_modifier)
+        for force in forces], dtype=np.float64)
+    victory_modifier = np.array([2000 if force.ritual.force_ritual_id == 2 else 0 for force in forces], dtype=np.int64)
+    offensive = np.array([force.order.offensive_order for force in forces], dtype=bool)
+    return ritual_strength, inflicted_factor, victory_factor, victory_modifier, offensive
+
+def _side_contributions(forces, fortifications, side, force_strengths, fortification_strengths, fort_ritual_strength=None):
+    ritual_strength, inflicted_factor, victory_factor, victory_modifier, offensive = _force_columns(forces, side)
+    strength = force_strengths + ritual_strength
+    casualties_inflicted = _truncate(strength * inflicted_factor / 10).sum(axis=1)
+    contribution = _truncate(strength * victory_factor + victory_modifier)
+    offensive_contribution = np.where(offensive, contribution, 0).sum(axis=1)
+    defensive_contribution = np.where(offensive, 0, contribution).sum(axis=1)
+
+    if fort_ritual_strength is None:
+        fort_ritual_strength = np.array([fortification.ritual.fortification_effective_strength_modifier for fortification in fortifications], dtype=np.int64)
+    besieged = np.array([fortification.besieged for fortification in fortifications], dtype=bool)
+    fort_strength = fortification_strengths + fort_ritual_strength
+    defensive_contribution = defensive_contribution + np.where(besieged, fort_strength * 2, fort_strength).sum(axis=1)
+    casualties_inflicted = casualties_inflicted + np.where(besieged, _truncate(fort_strength / 10), 0).sum(axis=1)
+    return casualties_inflicted, offensive_contribution, defensive_contribution
+
+def _victory_points(imperial, barbarian, imperial_offensive, imperial_defensive, barbarian_offensive, barbarian_defensive):
+    imperial_total = imperial_offensive + imperial_defensive
+    barbarian_total = barbarian_offensive + barbarian_defensive
+
+    disciplined_vp = min(barbarian.offensive_orders.total(), 5) if imperial.defensive_orders['Strategic Defence'] else 0
+    skirmishing_vp = min(barbarian.defensive_orders.total(), 5) if imperial.offensive_orders['Outmanouvere'] else 0
+
+    imperial_win = imperial_total > barbarian_total
+    barbarian_win = imperial_total < barbarian_total
+    outcome = np.where(imperial_win, IMPERIAL_VICTORY, np.where(barbarian_win, BARBARIAN_VICTORY, DRAW))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Imperial victory
+        difference = imperial_total - barbarian_total
+        total_imperial = _truncate(difference / 1000)
+        offensive_split = imperial_offensive / imperial_total
+        defensive_split = imperial_defensive / imperial_total
+        no_offence = imperial_offensive == 0
+        no_defence = ~no_offence & (imperial_defensive == 0)
+        mixed = ~no_offence & ~no_defence
+        offensive_imperial = np.select(
+            [no_offence, no_defence],
+            [0, _truncate((imperial_offensive - barbarian_total) / 1000) + skirmishing_vp],
+            _truncate(difference * offensive_split / 1000) + skirmishing_vp)
+        defensive_imperial = np.select(
+            [no_offence, no_defence],
+            [_truncate((imperial_defensive - barbarian_total) / 1000) + disciplined_vp, 0],
+            _truncate(difference * defensive_split / 1000) + disciplined_vp)
+        remaining_points = total_imperial - (offensive_imperial + defensive_imperial)
+        to_offence = mixed & (offensive_split > defensive_split)
+        offensive_imperial = offensive_imperial + np.where(to_offence, remaining_points, 0)
+        defensive_imperial = defensive_imperial + np.where(mixed & ~to_offence, remaining_points, 0)
+        unresolved = imperial_win & ~mixed & (remaining_points != 0)
+
+        # Barbarian victory
+        difference = barbarian_total - imperial_total
+        total_barbarian = _truncate(difference / 1000)
+        offensive_split = barbarian_offensive / barbarian_total
+        defensive_split = barbarian_defensive / barbarian_total
+        no_offence = barbarian_offensive == 0
+        no_defence = ~no_offence & (barbarian_defensive == 0)
+        offensive_barbarian = np.select(
+            [no_offence, no_defence],
+            [0, _truncate((barbarian_offensive - imperial_total) / 1000)],
+            _truncate((difference * offensive_split) / 1000 + 0.5))
+        defensive_barbarian = np.select(
+            [no_offence, no_defence],
+            [_truncate((barbarian_defensive - imperial_total) / 1000), 0],
+            _truncate((difference * defensive_split) / 1000 + 0.5))
+
+    total_victory_points = np.where(imperial_win, total_imperial, np.where(barbarian_win, total_barbarian, 0))
+    offensive_victory_points = np.where(imperial_win, offensive_imperial, np.where(barbarian_win, offensive_barbarian, 0))
+    defensive_victory_points = np.where(imperial_win, defensive_imperial, np.where(barbarian_win, defensive_barbarian, 0))
+    return outcome, total_victory_points, offensive_victory_points, defensive_victory_points, unresolved
+
+def _force_casualties(forces, fortifications, strengths, total_casualties_inflicted, outcome, defensive_victory_points,
+                      imperial, barbarian, is_barbarian):
+    side = barbarian if is_barbarian else imperial
+    force_break, large_force_break = 1000, 1250
+    if any(force in barbarian.forces for force in forces) and imperial.order_count("Merciless Onslaught"):
+        force_break, large_force_break = 1500, 2250
+
+    exempt = np.array([force.order.order_id == EXEMPT_ORDER_ID for force in forces], dtype=bool)
+    share_count = len(forces) + len(fortifications) - int(exempt.sum()) - sum(not fortification.besieged for fortification in fortifications)
+    base_modifier = np.array([
+        1 + force.order.casualties_suffered_modifier + (-0.1 if side.others_with_order(force, "Tend the Fallen") else 0)
+        for force in forces], dtype=np.float64)
+    in_imperial = np.array([force in imperial.forces for force in forces], dtype=bool)
+    in_barbarian = np.array([force in barbarian.forces for force in forces], dtype=bool)
+    lay_low = np.array([force.order.order_name == 'Lay Low' for force in forces], dtype=bool)
+    large = np.array([force.force.large for force in forces], dtype=bool)
+
+    winning = ((outcome == IMPERIAL_VICTORY)[:, None] & in_imperial) | ((outcome == BARBARIAN_VICTORY)[:, None] & in_barbarian)
+    modifier = np.where(winning, base_modifier - (defensive_victory_points / 100)[:, None], base_modifier)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        casualties = _truncate(total_casualties_inflicted[:, None] / max(share_count, 1) * modifier)
+    casualties = np.where(lay_low | exempt, 0, casualties)
+    remaining = strengths - casualties
+    remaining = np.where(np.where(large, remaining < large_force_break, remaining < force_break) & ~exempt, 0, remaining)
+    return casualties, remaining
+
+def _final_stand(forces, strengths, casualties, remaining, offensive_victory_points):
+    for index, force in enumerate(forces):
+        if force.order.order_name != 'Final Stand':
+            continue
+        break_limit = 1500 if force.force.large else 1000
+        strength = strengths[:, index]
+        steps = np.where(strength > break_limit, (strength - break_limit + 99) // 100, 0)
+        steps = np.minimum(steps, np.maximum(offensive_victory_points, 0))
+        strength = strength - steps * 100
+        remaining[:, index] = np.where(strength < break_limit, 0, strength)
+        casualties[:, index] += steps * 100
+        offensive_victory_points = offensive_victory_points - steps
+    return offensive_victory_points
+
+def _fortification_casualties(forces, fortifications, strengths, total_casualties_inflicted, outcome, defensive_victory_points,
+                              imperial_storms, in_imperial, in_barbarian):
+    besieged = np.array([fortification.besieged for fortification in fortifications], dtype=bool)
+    share_count = len(forces) + len(fortifications) - sum(force.order.order_id == EXEMPT_ORDER_ID for force in forces) - int((~besieged).sum())
+    base_modifier = 1 + (0.3 if imperial_storms else 0)
+    winning = ((outcome == IMPERIAL_VICTORY)[:, None] & in_imperial) | ((outcome == BARBARIAN_VICTORY)[:, None] & in_barbarian)
+    modifier = np.where(winning, base_modifier - (defensive_victory_points / 100)[:, None], base_modifier)
+    casualties = _truncate(total_casualties_inflicted[:, None] / max(share_count, 1) * modifier)
+    casualties = np.where(besieged, casualties, 0)
+    remaining = strengths - casualties
+    remaining = np.where(besieged & (remaining < 1000), 0, remaining)
+    return casualties, remaining
+
+def require_unique_combatants(battle):
+    # Duplicate combatants only compare equal when their strengths match, which varies from sample to sample
+    forces = [force.force.force_id for force in battle.imperial_forces + battle.barbarian_forces]
+    fortifications = [fortification.fortification.fortification_id for fortification in battle.imperial_fortifications + battle.barbarian_fortifications]
+    if len(set(forces)) != len(forces) or len(set(fortifications)) != len(fortifications):
+        raise ValueError('Each combatant must be unique')
+
+def resolve_samples(battle, imperial_force_strengths, imperial_fortification_strengths, barbarian_force_strengths, barbarian_fortification_strengths,
+                    fortification_ritual_strengths=(None, None), fixed_forces=False):
+    # Each strengths array has one row per sample and one column per combatant of that group. Fortification ritual
+    # strengths, imperial then barbarian, can be given the same way to vary the ritual from sample to sample.
+    # fixed_forces says every force keeps its strength in the battle in every sample, so identical forces are counted right
+    if not fixed_forces:
+        require_unique_combatants(battle)
+    imperial = aggregate_side(battle.imperial_forces)
+    barbarian = aggregate_side(battle.barbarian_forces)
+
+    imperial_casualties_inflicted, imperial_offensive, imperial_defensive = _side_contributions(
+        battle.imperial_forces, battle.imperial_fortifications, imperial, imperial_force_strengths, imperial_fortification_strengths,
+        fortification_ritual_strengths[0])
+    barbarian_casualties_inflicted, barbarian_offensive, barbarian_defensive = _side_contributions(
+        battle.barbarian_forces, battle.barbarian_fortifications, barbarian, barbarian_force_strengths, barbarian_fortification_strengths,
+        fortification_ritual_strengths[1])
+
+    outcome, total_victory_points, offensive_victory_points, defensive_victory_points, unresolved = _victory_points(
+        imperial, barbarian, imperial_offensive, imperial_defensive, barbarian_offensive, barbarian_defensive)
+
+    imperial_casualties, imperial_remaining = _force_casualties(
+        battle.imperial_forces, battle.imperial_fortifications, imperial_force_strengths, barbarian_casualties_inflicted,
+        outcome, defensive_victory_points, imperial, barbarian, is_barbarian=False)
+    barbarian_casualties, barbarian_remaining = _force_casualties(
+        battle.barbarian_forces, battle.barbarian_fortifications, barbarian_force_strengths, imperial_casualties_inflicted,
+        outcome, defensive_victory_points, imperial, barbarian, is_barbarian=True)
+    offensive_victory_points = _final_stand(battle.imperial_forces, imperial_force_strengths, imperial_casualties, imperial_remaining, offensive_victory_points)
+    offensive_victory_points = _final_stand(battle.barbarian_forces, barbarian_force_strengths, barbarian_casualties, barbarian_remaining, offensive_victory_points)
+
+    imperial_fortifications = frozenset(battle.imperial_fortifications)
+    barbarian_fortifications = frozenset(battle.barbarian_fortifications)
+    imperial_fort_casualties, imperial_fort_remaining = _fortification_casualties(
+        battle.imperial_forces, battle.imperial_fortifications, imperial_fortification_strengths, barbarian_casualties_inflicted,
+        outcome, defensive_victory_points, False,
+        np.ones(len(battle.imperial_fortifications), dtype=bool),
+        np.array([fortification in barbarian_fortifications for fortification in battle.imperial_fortifications], dtype=bool))
+    barbarian_fort_casualties, barbarian_fort_remaining = _fortification_casualties(
+        battle.barbarian_forces, battle.barbarian_fortifications, barbarian_fortification_strengths, imperial_casualties_inflicted,
+        outcome, defensive_victory_points, imperial.order_count("Storm the Walls") > 0,
+        np.array([fortification in imperial_fortifications for fortification in battle.barbarian_fortifications], dtype=bool),
+        np.ones(len(battle.barbarian_fortifications), dtype=bool))
+
+    total_victory_points = np.where(total_victory_points - defensive_victory_points != offensive_victory_points,
+                                    defensive_victory_points + offensive_victory_points, total_victory_points)
+
+    return SampledResult(
+        outcome=outcome,
+        total_victory_points=total_victory_points,
+        offensive_victory_points=offensive_victory_points,
+        defensive_victory_points=defensive_victory_points,
+        force_casualties=np.hstack([imperial_casualties, barbarian_casualties]),
+        force_remaining=np.hstack([imperial_remaining, barbarian_remaining]),
+        fortification_casualties=np.hstack([imperial_fort_casualties, barbarian_fort_casualties]),
+        fortification_remaining=np.hstack([imperial_fort_remaining, barbarian_fort_remaining]),
+        unresolved=unresolved
+    )
+
+
+def sample_strengths(spec, samples, rng):
+    # A strength is a fixed number, {'min', 'max'} for a uniform range, or {'mean', 'sd'} for a normal distribution
+    if isinstance(spec, dict):
+        if 'mean' in spec:
+            values = rng.normal(float(spec['mean']), float(spec.get('sd', 0)), samples)
+            values = np.clip(values, float(spec.get('min', 0)), float(spec.get('max', np.inf)))
+            return np.rint(values).astype(np.int64)
+        minimum, maximum = int(spec['min']), int(spec['max'])
+        if minimum > maximum or minimum < 0:
+            raise ValueError('Invalid strength range')
+        return rng.integers(minimum, maximum, samples, endpoint=True, dtype=np.int64)
+    return np.full(samples, int(spec) if spec != '' else 0, dtype=np.int64)
+
+def _sample_group(specs, samples, rng):
+    if not specs:
+        return np.zeros((samples, 0), dtype=np.int64)
+    return np.column_stack([sample_strengths(spec, samples, rng) for spec in specs])
+
+def simulation_from_dict(data, reference):
+    # Splits a calculations.js payload whose strengths may be ranges into a Battle and strength specs
+    def placeholder(entry):
+        return {**entry, 'strength': '0'}
+    battle = Battle(
+        imperial_forces=tuple(force_from_dict(placeholder(entry), reference) for entry in data['imperial_forces']),
+        imperial_fortifications=tuple(fortification_from_dict(placeholder(entry), reference) for entry in data['imperial_fortifications']),
+        barbarian_forces=tuple(force_from_dict(placeholder(entry), reference) for entry in data['barbarian_forces']),
+        barbarian_fortifications=tuple(fortification_from_dict(placeholder(entry), reference) for entry in data['barbarian_fortifications'])
+    )
+    specs = tuple([entry['strength'] for entry in data[group]]
+                  for group in ('imperial_forces', 'imperial_fortifications', 'barbarian_forces', 'barbarian_fortifications'))
+    return battle, specs
+
+def _distribution(values):
+    values = values.astype(np.int64)
+    if values.size == 0:
+        return {'mean': None, 'percentiles': {}, 'histogram': {}}
+    points, counts = np.unique(values, return_counts=True)
+    return {
+        'mean': float(values.mean()),
+        'percentiles': {str(p): int(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES, method='nearest'))},
+        'histogram': {str(int(point)): float(count / values.size) for point, count in zip(points, counts)}
+    }
+
+def simulate(battle, specs, samples=DEFAULT_SAMPLES, seed=None):
+    if not 0 < samples <= MAX_SAMPLES:
+        raise ValueError('Samples must be between 1 and %d' % MAX_SAMPLES)
+    rng = np.random.default_rng(seed)
+    strengths = [_sample_group(group, samples, rng) for group in specs]
+    result = resolve_samples(battle, *strengths)
+
+    resolved = ~result.unresolved
+    resolved_count = int(resolved.sum())
+    outcome = result.outcome[resolved]
+    force_entries = battle.imperial_forces + battle.barbarian_forces
+    fortification_entries = battle.imperial_fortifications + battle.barbarian_fortifications
+    force_strengths = np.hstack([strengths[0], strengths[2]])[resolved]
+    fortification_strengths = np.hstack([strengths[1], strengths[3]])[resolved]
+    force_casualties, force_remaining = result.force_casualties[resolved], result.force_remaining[resolved]
+    fortification_casualties, fortification_remaining = result.fortification_casualties[resolved], result.fortification_remaining[resolved]
+
+    def combatant_summary(name_key, name, strengths, casualties, remaining):
+        return {
+            name_key: name,
+            'break_probability': float((remaining == 0).mean()) if resolved_count else None,
+            'mean_strength': float(strengths.mean()) if resolved_count else None,
+            'mean_casualties_taken': float(casualties.mean()) if resolved_count else None,
+            'mean_remaining_strength': float(remaining.mean()) if resolved_count else None
+        }
+
+    return {
+        'samples': samples,
+        'unresolved_probability': float(result.unresolved.mean()),
+        'outcome_probabilities': {name: float((outcome == code).mean()) if resolved_count else None for code, name in enumerate(OUTCOMES)},
+        'victory_points': {
+            'total': _distribution(result.total_victory_points[resolved]),
+            'offensive': _distribution(result.offensive_victory_points[resolved]),
+            'defensive': _distribution(result.defensive_victory_points[resolved])
+        },
+        'forces_data': {
+            str(force.force.force_id): combatant_summary('force_name', force.force.force_name, force_strengths[:, index],
+                                                         force_casualties[:, index], force_remaining[:, index])
+            for index, force in enumerate(force_entries)
+        },
+        'fortifications_data': {
+            str(fortification.fortification.fortification_id): combatant_summary(
+                'fortification_name', fortification.fortification.fortification_name, fortification_strengths[:, index],
+                fortification_casualties[:, index], fortification_remaining[:, index])
+            for index, fortification in enumerate(fortification_entries)
+        }
+    }
+
+
+def axis_values(axis):
+    steps = int(axis.get('steps', DEFAULT_GRID_STEPS))
+    minimum, maximum = int(axis['min']), int(axis['max'])
+    if not 1 < steps <= MAX_GRID_STEPS or minimum < 0 or minimum > maximum:
+        raise ValueError('An axis runs from min to max in 2 to %d steps' % MAX_GRID_STEPS)
+    return np.rint(np.linspace(minimum, maximum, steps)).astype(np.int64)
+
+def _apply_axis(strengths, axis, values):
+    # strengths holds one (cells, combatants) array per group; values holds the axis value for every cell
+    side = axis['side']
+    if side not in ('imperial', 'barbarian'):
+        raise ValueError('Side must be imperial or barbarian')
+    forces = strengths[0 if side == 'imperial' else 2]
+    if 'fortification' in axis:
+        group = strengths[1 if side == 'imperial' else 3]
+        index = int(axis['fortification'])
+        if not 0 <= index < group.shape[1]:
+            raise ValueError('No such fortification')
+        group[:, index] = values
+    elif 'force' in axis:
+        index = int(axis['force'])
+        if not 0 <= index < forces.shape[1]:
+            raise ValueError('No such force')
+        forces[:, index] = values
+    else:
+        # The side's total force strength, shared out in proportion to the submitted strengths
+        if not forces.shape[1]:
+            raise ValueError('The %s side has no forces' % side)
+        base = forces[0].astype(np.float64)
+        shares = base / base.sum() if base.sum() else np.full(base.shape, 1 / base.size)
+        scaled = np.floor(values[:, None] * shares).astype(np.int64)
+        scaled[:, int(np.argmax(shares))] += values - scaled.sum(axis=1)
+        forces[:] = scaled
+
+def _axis_target(axis):
+    if 'fortification' in axis:
+        return (axis['side'], 'fortification', int(axis['fortification']))
+    if 'force' in axis:
+        return (axis['side'], 'force', int(axis['force']))
+    return (axis['side'], 'force', None)
+
+def evaluate_grid(battle, specs, x_axis, y_axis):
+    # Every pairing of an x and a y value resolved in one vectorized pass; cells are laid out [y][x]
+    x_target, y_target = _axis_target(x_axis), _axis_target(y_axis)
+    # A side's total overlaps each of its forces
+    if x_target[:2] == y_target[:2] and (x_target[2] is None or y_target[2] is None or x_target[2] == y_target[2]):
+        raise ValueError('The axes must vary different strengths')
+    x_values, y_values = axis_values(x_axis), axis_values(y_axis)
+    cells = x_values.size * y_values.size
+    strengths = []
+    for group in specs:
+        if any(isinstance(spec, dict) for spec in group):
+            raise ValueError('Grid strengths must be fixed numbers')
+        strengths.append(np.tile(np.array([int(spec) if spec != '' else 0 for spec in group], dtype=np.int64), (cells, 1)))
+    _apply_axis(strengths, x_axis, np.tile(x_values, y_values.size))
+    _apply_axis(strengths, y_axis, np.repeat(y_values, x_values.size))
+    result = resolve_samples(battle, *strengths)
+
+    shape = (y_values.size, x_values.size)
+    imperial_forces, imperial_fortifications = len(battle.imperial_forces), len(battle.imperial_fortifications)
+    imperial_casualties = result.force_casualties[:, :imperial_forces].sum(axis=1) + result.fortification_casualties[:, :imperial_fortifications].sum(axis=1)
+    barbarian_casualties = result.force_casualties[:, imperial_forces:].sum(axis=1) + result.fortification_casualties[:, imperial_fortifications:].sum(axis=1)
+    return {
+        'x': {**x_axis, 'values': x_values.tolist()},
+        'y': {**y_axis, 'values': y_values.tolist()},
+        'outcomes': list(OUTCOMES),
+        'outcome': result.outcome.reshape(shape).tolist(),
+        'total_victory_points': result.total_victory_points.reshape(shape).tolist(),
+        'offensive_victory_points': result.offensive_victory_points.reshape(shape).tolist(),
+        'defensive_victory_points': result.defensive_victory_points.reshape(shape).tolist(),
+        'imperial_casualties': imperial_casualties.reshape(shape).tolist(),
+        'barbarian_casualties': barbarian_casualties.reshape(shape).tolist(),
+        'unresolved': result.unresolved.reshape(shape).tolist()
+    }
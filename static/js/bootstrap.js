@@ -0,0 +1,94 @@
+// Reference data for the battle form, fetched once per page and kept in localStorage.
+// The stored copy is revalidated with its ETag, so unchanged data is never downloaded twice.
+var referenceData = (function () {
+    var storageKey = 'army-calculator-bootstrap';
+    var request = null;
+
+    function readStored() {
+        try {
+            return JSON.parse(localStorage.getItem(storageKey));
+        } catch (error) {
+            return null;
+        }
+    }
+
+    function store(etag, data) {
+        try {
+            localStorage.setItem(storageKey, JSON.stringify({ 'etag': etag, 'data': data }));
+        } catch (error) {
+            console.error('Error:', error);
+        }
+    }
+
+    function buildIndex(data) {
+        var orderNames = new Map(data.orders);
+        var orderList = orderIds => orderIds.map(orderId => [orderId, orderNames.get(orderId)]);
+        var forces = new Map();
+        data.forces.forEach(force => {
+            var grantedOrders = new Map();
+            Object.entries(force[6]).forEach(([qualityId, orderIds]) => grantedOrders.set(Number(qualityId), orderList(orderIds)));
+            forces.set(String(force[0]), {
+                'id': force[0],
+                'name': force[1],
+                'quality': force[2],
+                'large': force[3],
+                'imperial': force[4],
+                'orders': orderList(force[5]),
+                'grantedOrders': grantedOrders
+            });
+        });
+        var fortifications = new Map();
+        ['imperial', 'barbarian'].forEach(role => {
+            data.fortifications[role].forEach(fortification => {
+                fortifications.set(String(fortification[0]), { 'id': fortification[0], 'name': fortification[1], 'strength': fortification[2] });
+            });
+        });
+        return {
+            'version': data.version,
+            'forces': forces,
+            'imperialForces': data.forces.filter(force => force[4]).map(force => [force[0], force[1]]),
+            'forceRituals': data.force_rituals.map(ritual => [ritual[0], ritual[1]]),
+            'ritualQualities': new Map(data.force_rituals.map(ritual => [String(ritual[0]), ritual[3]])),
+            'fortifications': fortifications,
+            'fortificationOptions': data.fortifications,
+            'fortificationRituals': new Map(data.fortification_rituals.map(ritual => [String(ritual[0]), ritual])),
+
+            // Orders open to a force, widened by the quality its ritual grants
+            forceOrders: function (force, ritualId) {
+                return force.grantedOrders.get(this.ritualQualities.get(ritualId)) || force.orders;
+            },
+
+            barbarianForces: function (selectedBarbarian) {
+                var name = selectedBarbarian.toLowerCase();
+                return data.forces.filter(force => force[1].toLowerCase().includes(name)).map(force => [force[0], force[1]]);
+            }
+        };
+    }
+
+    function load() {
+        if (request === null) {
+            var stored = readStored();
+            var headers = {};
+            if (stored && stored.etag) {
+                headers['If-None-Match'] = stored.etag;
+            }
+            request = fetch('/bootstrap', { headers: headers })
+                .then(response => {
+                    if (response.status === 304 && stored) {
+                        return stored.data;
+                    }
+                    if (!response.ok) {
+                        throw new Error('Could not load reference data: ' + response.status);
+                    }
+                    return response.json().then(data => {
+                        store(response.headers.get('ETag'), data);
+                        return data;
+                    });
+                })
+                .then(buildIndex);
+        }
+        return request;
+    }
+
+    return { load: load };
+})();
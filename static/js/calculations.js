@@ -6,43 +6,168 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     });
 
+    // The battle is posted to /battle_sessions once; after that each edit sends only the fields that changed
+    const MAX_SESSION_CHANGES = 100;
+    let session = null;
+    let pending = Promise.resolve();
+
     document.getElementById('calculate-outcome').addEventListener('click', function (e) {
         e.preventDefault();
+        const data = collectBattle(true);
+        if (data) {
+            recalculate(data);
+        }
+    });
 
-        const imperialForces = collectForces('imperial');
-        const barbarianForces = collectForces('barbarian');
-        const imperialFortifications = collectFortifications('imperial');
-        const barbarianFortifications = collectFortifications('barbarian');
-        if (imperialForces.length === 0 || (barbarianForces.length + barbarianFortifications.length) === 0) {
-            alert('Please select combatants for both sides.');
-            return;
+    // Once a battle has been calculated, changing a strength, order or ritual updates the outcome straight away.
+    // Problems with the battle are only reported when the button is pressed, not on every edit
+    document.addEventListener('change', function (event) {
+        if (session && /^(imperial|barbarian)-(strength|order|ritual|fortification-strength|fortification-ritual|fortification-besieged)-\d+$/.test(event.target.id)) {
+            const data = collectBattle(false);
+            if (data) {
+                recalculate(data);
+            }
         }
+    });
 
+    window.addEventListener('pagehide', function () {
+        if (session) {
+            endSession(true);
+        }
+    });
+
+    function collectBattle(notify) {
         const data = {
-            imperial_forces: imperialForces,
-            imperial_fortifications: imperialFortifications,
-            barbarian_forces: barbarianForces,
-            barbarian_fortifications: barbarianFortifications
+            imperial_forces: collectForces('imperial', notify),
+            imperial_fortifications: collectFortifications('imperial', notify),
+            barbarian_forces: collectForces('barbarian', notify),
+            barbarian_fortifications: collectFortifications('barbarian', notify)
         };
+        if (data.imperial_forces.length === 0 || (data.barbarian_forces.length + data.barbarian_fortifications.length) === 0) {
+            if (notify) {
+                alert('Please select combatants for both sides.');
+            }
+            return null;
+        }
+        return data;
+    }
 
-        // Send data to the server for calculation
-        fetch('/calculate_outcome', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'X-CSRFToken': getCSRFToken() // Include CSRF token in the headers
-            },
-            body: JSON.stringify(data)
-        })
-            .then(response => response.json())
-            .then(data => {
-                // Display outcome and details in the summary table
-                showSummary(data);
+    // Requests go out one at a time, so each delta is worked out against the battle the server already has
+    function recalculate(data) {
+        pending = pending
+            .then(() => {
+                const changes = session ? sessionChanges(session.battle, data) : null;
+                if (changes === null) {
+                    return createSession(data);
+                }
+                if (changes.length === 0) {
+                    if (session.result) {
+                        showSummary(session.result);
+                        return;
+                    }
+                    // The server could not resolve this battle last time, so it is posted again
+                    return createSession(data);
+                }
+                return updateSession(data, changes);
             })
             .catch(error => {
                 console.error('Error:', error);
             });
-    });
+    }
+
+    function createSession(data) {
+        if (session) {
+            endSession(false);
+        }
+        return sendJSON('POST', '/battle_sessions', data)
+            .then(response => response.json())
+            .then(body => {
+                if (body.session_id) {
+                    session = { id: body.session_id, battle: data, result: body.result };
+                }
+                showResult(body);
+            });
+    }
+
+    function updateSession(data, changes) {
+        return sendJSON('PATCH', `/battle_sessions/${session.id}`, { changes: changes })
+            .then(response => {
+                if (response.status === 404) {
+                    // The session expired or lives in another worker, so start again with the whole battle
+                    session = null;
+                    return createSession(data);
+                }
+                return response.json().then(body => {
+                    // A session_id means the changes were applied, even if the battle could not be resolved
+                    if (body.session_id) {
+                        session.battle = data;
+                        session.result = body.result;
+                    }
+                    showResult(body);
+                });
+            });
+    }
+
+    function endSession(keepalive) {
+        fetch(`/battle_sessions/${session.id}`, {
+            method: 'DELETE',
+            headers: { 'X-CSRFToken': getCSRFToken() },
+            keepalive: keepalive
+        }).catch(() => {});
+        session = null;
+    }
+
+    // The changes from one battle to the next, or null when combatants were added, removed or swapped
+    function sessionChanges(previous, data) {
+        const changes = [];
+        for (const role of ['imperial', 'barbarian']) {
+            const kinds = [
+                ['force', `${role}_forces`, ['strength', 'order', 'ritual']],
+                ['fortification', `${role}_fortifications`, ['strength', 'ritual', 'besieged']]
+            ];
+            for (const [kind, key, fields] of kinds) {
+                const before = previous[key];
+                const after = data[key];
+                if (before.length !== after.length) {
+                    return null;
+                }
+                for (let index = 0; index < after.length; index++) {
+                    if (before[index][kind] !== after[index][kind]) {
+                        return null;
+                    }
+                    const changed = fields.filter(field => before[index][field] !== after[index][field]);
+                    if (changed.length > 0) {
+                        const change = { side: role, [kind]: index };
+                        changed.forEach(field => {
+                            change[field] = after[index][field];
+                        });
+                        changes.push(change);
+                    }
+                }
+            }
+        }
+        return changes.length > MAX_SESSION_CHANGES ? null : changes;
+    }
+
+    function sendJSON(method, url, body) {
+        return fetch(url, {
+            method: method,
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCSRFToken() // Include CSRF token in the headers
+            },
+            body: JSON.stringify(body)
+        });
+    }
+
+    function showResult(body) {
+        if (body.error) {
+            console.error('Error:', body.error);
+            return;
+        }
+        // Display outcome and details in the summary table
+        showSummary(body.result);
+    }
 
     function hasDuplicates(array) {
         const ids = array.map(obj => obj.force); // Change 'force' to 'fortification' if checking fortifications
@@ -50,7 +175,7 @@ document.addEventListener('DOMContentLoaded', function () {
     }
 
     // Function to collect forces data
-    function collectForces(role) {
+    function collectForces(role, notify) {
         const forces = [];
         const tableBody = document.getElementById(`${role}-forces`);
         if (tableBody) {
@@ -84,13 +209,15 @@ document.addEventListener('DOMContentLoaded', function () {
         }
         console.log('Forces collected:', forces);
         if (hasDuplicates(forces)) {
-            alert('Please make sure each combatant is unique.');
+            if (notify) {
+                alert('Please make sure each combatant is unique.');
+            }
             return [];
         }
         return forces;
     }
 
-    function collectFortifications(role) {
+    function collectFortifications(role, notify) {
         const fortifications = [];
         const tableBody = document.getElementById(`${role}-forces`);
         if (tableBody) {
@@ -124,7 +251,9 @@ document.addEventListener('DOMContentLoaded', function () {
         }
         console.log('Fortifications collected:', fortifications);
         if (hasDuplicates(fortifications.map(f => f.fortification))) {
-            alert('Please make sure each combatant is unique.');
+            if (notify) {
+                alert('Please make sure each combatant is unique.');
+            }
             return [];
         }
         return fortifications;
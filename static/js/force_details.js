@@ -21,9 +21,18 @@ document.addEventListener('DOMContentLoaded', function () {
         updateBarbarianForces();
     });
 
+    function fillSelect(select, placeholder, options) {
+        select.innerHTML = '<option value="">' + placeholder + '</option>';
+        options.forEach(entry => {
+            var option = document.createElement('option');
+            option.value = entry[0];
+            option.textContent = entry[1];
+            select.appendChild(option);
+        });
+    }
+
     function updateFormFields(role, index) {
         var selectedForceId = document.getElementById(role + '-force-' + index).value;
-        var csrfToken = document.querySelector('input[name="csrf_token"]').value;
 
         if (selectedForceId === '') {
             document.getElementById(role + '-strength-' + index).value = '';
@@ -32,95 +41,48 @@ document.addEventListener('DOMContentLoaded', function () {
             return;
         }
 
-        fetchForceInfo(selectedForceId, role, index, csrfToken)
-            .then(forceQuality => {
-                fetchOrdersByForce(selectedForceId, role, index, csrfToken, forceQuality)
-                    .catch(error => console.error('Error:', error));
+        referenceData.load()
+            .then(reference => {
+                var force = reference.forces.get(selectedForceId);
+                if (!force) {
+                    console.error('Unknown force:', selectedForceId);
+                    return;
+                }
+                updateForceInfo(force, role, index);
+                fillSelect(document.getElementById(role + '-order-' + index), 'Select Order', force.orders);
+                updateRituals(reference, force, role, index);
             })
             .catch(error => console.error('Error:', error));
 
-        fetchRitualsByForce(selectedForceId, role, index, csrfToken)
-            .catch(error => console.error('Error:', error));
-
         addStrengthInputListener(role, index);
     }
 
-    function fetchForceInfo(selectedForceId, role, index, csrfToken) {
-        return fetch('/get_force_info', {
-            method: 'POST',
-            body: new URLSearchParams({
-                'force_id': selectedForceId,
-                'csrf_token': csrfToken
-            }),
-            headers: {
-                'Content-Type': 'application/x-www-form-urlencoded'
-            }
-        })
-            .then(response => response.json())
-            .then(data => {
-                var maxStrength = data.large ? 7500 : 5000;
-                var strengthField = document.getElementById(role + '-strength-' + index);
-                strengthField.setAttribute('data-max-strength', maxStrength);
-                strengthField.value = maxStrength;
-                strengthField.removeAttribute('readonly');
-                var forceQuality = data.quality;
-                return forceQuality;
-            })
-            .catch(error => console.error('Error:', error));
+    function updateForceInfo(force, role, index) {
+        var maxStrength = force.large ? 7500 : 5000;
+        var strengthField = document.getElementById(role + '-strength-' + index);
+        strengthField.setAttribute('data-max-strength', maxStrength);
+        strengthField.value = maxStrength;
+        strengthField.removeAttribute('readonly');
     }
 
-    function fetchOrdersByForce(selectedForceId, role, index, csrfToken, forceQuality) {
-        return fetch('/get_orders_by_force', {
-            method: 'POST',
-            body: new URLSearchParams({
-                'force_id': selectedForceId,
-                'force_quality': forceQuality,
-                'csrf_token': csrfToken
-            }),
-            headers: {
-                'Content-Type': 'application/x-www-form-urlencoded'
-            }
-        })
-            .then(response => response.json())
-            .then(data => {
-                var orderSelect = document.getElementById(role + '-order-' + index);
-                orderSelect.innerHTML = '<option value="">Select Order</option>';
-                data.orders.forEach(order => {
-                    var option = document.createElement('option');
-                    option.value = order[0];
-                    option.textContent = order[1];
-                    orderSelect.appendChild(option);
-                });
-            })
-            .catch(error => console.error('Error:', error));
+    function updateRituals(reference, force, role, index) {
+        var ritualSelect = document.getElementById(role + '-ritual-' + index);
+        fillSelect(ritualSelect, 'Select Ritual', reference.forceRituals);
+        ritualSelect.onchange = function () {
+            updateOrders(reference, force, role, index);
+            updateStrengthWithRitual(role, index);
+        };
     }
 
-    function fetchRitualsByForce(selectedForceId, role, index, csrfToken) {
-        return fetch('/get_rituals_by_force', {
-            method: 'POST',
-            body: new URLSearchParams({
-                'force_id': selectedForceId,
-                'csrf_token': csrfToken
-            }),
-            headers: {
-                'Content-Type': 'application/x-www-form-urlencoded'
-            }
-        })
-            .then(response => response.json())
-            .then(data => {
-                var ritualSelect = document.getElementById(role + '-ritual-' + index);
-                ritualSelect.innerHTML = '<option value="">Select Ritual</option>';
-                data.rituals.forEach(ritual => {
-                    var option = document.createElement('option');
-                    option.value = ritual[0];
-                    option.textContent = ritual[1];
-                    ritualSelect.appendChild(option);
-                });
-                ritualSelect.addEventListener('change', function () {
-                    updateStrengthWithRitual(role, index);
-                });
-            })
-            .catch(error => console.error('Error:', error));
+    // A ritual that grants a quality also opens up that quality's orders
+    function updateOrders(reference, force, role, index) {
+        var orderSelect = document.getElementById(role + '-order-' + index);
+        var selectedOrder = orderSelect.value;
+        var orders = reference.forceOrders(force, document.getElementById(role + '-ritual-' + index).value);
+        fillSelect(orderSelect, 'Select Order', orders);
+        if (orders.some(order => String(order[0]) === selectedOrder)) {
+            orderSelect.value = selectedOrder;
+        }
     }
 
     document.getElementById('add-imperial').addEventListener('click', function (e) {
@@ -180,7 +142,6 @@ document.addEventListener('DOMContentLoaded', function () {
 
     function updateBarbarianForces() {
         var selectedBarbarian = document.getElementById('barbarian-force-selector').value;
-        var csrfToken = document.querySelector('input[name="csrf_token"]').value;
 
         if (selectedBarbarian === '') {
             for (let i = 0; i < barbarianCount; i++) {
@@ -189,29 +150,11 @@ document.addEventListener('DOMContentLoaded', function () {
             return;
         }
 
-        fetch('/get_force_options', {
-            method: 'POST',
-            body: new URLSearchParams({
-                'role': 'barbarian',
-                'barbarian': 'true',
-                'selected_barbarian': selectedBarbarian,
-                'csrf_token': csrfToken
-            }),
-            headers: {
-                'Content-Type': 'application/x-www-form-urlencoded'
-            }
-        })
-            .then(response => response.json())
-            .then(data => {
+        referenceData.load()
+            .then(reference => {
+                var forces = reference.barbarianForces(selectedBarbarian);
                 for (let i = 0; i < barbarianCount; i++) {
-                    var forceDropdown = document.getElementById('barbarian-force-' + i);
-                    forceDropdown.innerHTML = '<option value="">Select Force</option>';
-                    data.forces.forEach(force => {
-                        var option = document.createElement('option');
-                        option.value = force[0];
-                        option.textContent = force[1];
-                        forceDropdown.appendChild(option);
-                    });
+                    fillSelect(document.getElementById('barbarian-force-' + i), 'Select Force', forces);
                 }
             })
             .catch(error => console.error('Error:', error));
@@ -219,32 +162,9 @@ document.addEventListener('DOMContentLoaded', function () {
 
     function fetchForceOptions(role, index) {
         var forceDropdown = document.getElementById(`${role}-force-${index}`);
-        var csrfToken = document.querySelector('input[name="csrf_token"]').value;
 
-        fetch('/get_force_options', {
-            method: 'POST',
-            body: new URLSearchParams({
-                'role': role,
-                'csrf_token': csrfToken
-            }),
-            headers: {
-                'Content-Type': 'application/x-www-form-urlencoded'
-            }
-        })
-            .then(response => response.json())
-            .then(data => {
-                if (Array.isArray(data.forces)) {
-                    forceDropdown.innerHTML = '<option value="">Select Force</option>';
-                    data.forces.forEach(force => {
-                        var option = document.createElement('option');
-                        option.value = force[0];
-                        option.textContent = force[1];
-                        forceDropdown.appendChild(option);
-                    });
-                } else {
-                    console.error('Invalid forces data:', data);
-                }
-            })
+        referenceData.load()
+            .then(reference => fillSelect(forceDropdown, 'Select Force', reference.imperialForces))
             .catch(error => console.error('Error:', error));
     }
 
@@ -89,86 +89,50 @@ document.addEventListener('DOMContentLoaded', function () {
         });
     }
 
+    function fillSelect(select, placeholder, options) {
+        select.innerHTML = '<option value="">' + placeholder + '</option>';
+        options.forEach(entry => {
+            var option = document.createElement('option');
+            option.value = entry[0];
+            option.textContent = entry[1];
+            select.appendChild(option);
+        });
+    }
+
     function fetchFortificationOptions(role, index) {
         var fortificationDropdown = document.getElementById(`${role}-fortification-${index}`);
-        var csrfToken = document.querySelector('input[name="csrf_token"]').value;
-
-        // Fetch fortification options
-        fetch('/get_fortification_options', {
-            method: 'POST',
-            body: new URLSearchParams({
-                'role': role,
-                'csrf_token': csrfToken
-            }),
-            headers: {
-                'Content-Type': 'application/x-www-form-urlencoded'
-            }
-        })
-            .then(response => response.json())
-            .then(data => {
-                // Populate the dropdown list with fortification options
-                fortificationDropdown.innerHTML = '<option value="">Select Fortification</option>';
-                data.fortifications.forEach(fortification => {
-                    var option = document.createElement('option');
-                    option.value = fortification[0];
-                    option.textContent = fortification[1];
-                    fortificationDropdown.appendChild(option);
-                });
-            })
+
+        // Populate the dropdown list with fortification options
+        referenceData.load()
+            .then(reference => fillSelect(fortificationDropdown, 'Select Fortification', reference.fortificationOptions[role] || []))
             .catch(error => console.error('Error:', error));
     }
 
     function fetchFortificationRitualOptions(role, index) {
         var fortificationRitualDropdown = document.getElementById(`${role}-fortification-ritual-${index}`);
-        var csrfToken = document.querySelector('input[name="csrf_token"]').value;
-
-        // Fetch fortification ritual options
-        fetch('/get_rituals_by_fortification', {
-            method: 'POST',
-            body: new URLSearchParams({
-                'csrf_token': csrfToken
-            }),
-            headers: {
-                'Content-Type': 'application/x-www-form-urlencoded'
-            }
-        })
-            .then(response => response.json())
-            .then(data => {
-                // Populate the dropdown list with fortification ritual options
-                fortificationRitualDropdown.innerHTML = '<option value="">Select Ritual</option>';
-                data.rituals.forEach(ritual => {
-                    var option = document.createElement('option');
-                    option.value = ritual[0];
-                    option.textContent = ritual[1];
-                    fortificationRitualDropdown.appendChild(option);
-                });
-            })
+
+        // Populate the dropdown list with fortification ritual options
+        referenceData.load()
+            .then(reference => fillSelect(fortificationRitualDropdown, 'Select Ritual', Array.from(reference.fortificationRituals.values())))
             .catch(error => console.error('Error:', error));
     }
 
     function updateFortificationStrength(role, index) {
         var selectedFortificationId = document.getElementById(role + '-fortification-' + index).value;
-        var csrfToken = document.querySelector('input[name="csrf_token"]').value;
 
         if (selectedFortificationId === '') {
             document.getElementById(role + '-fortification-strength-' + index).value = '';
             return;
         }
 
-        // Fetch fortification info
-        fetch('/get_fortification_info', {
-            method: 'POST',
-            body: new URLSearchParams({
-                'fortification_id': selectedFortificationId,
-                'csrf_token': csrfToken
-            }),
-            headers: {
-                'Content-Type': 'application/x-www-form-urlencoded'
-            }
-        })
-            .then(response => response.json())
-            .then(data => {
-                var maxStrength = data.strength;
+        referenceData.load()
+            .then(reference => {
+                var fortification = reference.fortifications.get(selectedFortificationId);
+                if (!fortification) {
+                    console.error('Unknown fortification:', selectedFortificationId);
+                    return;
+                }
+                var maxStrength = fortification.strength;
                 document.getElementById(role + '-fortification-strength-' + index).value = maxStrength;
                 document.getElementById(role + '-fortification-strength-' + index).setAttribute('data-max-strength', maxStrength);
             })
@@ -180,27 +144,16 @@ document.addEventListener('DOMContentLoaded', function () {
         var selectedRitualId = document.getElementById(role + '-fortification-ritual-' + index).value;
         var strengthField = document.getElementById(role + '-fortification-strength-' + index);
         var maxStrength = parseInt(strengthField.getAttribute('data-max-strength'));
-        var csrfToken = document.querySelector('input[name="csrf_token"]').value;
 
         if (selectedRitualId === '') {
             strengthField.value = maxStrength;
             return;
         }
 
-        // Fetch fortification ritual effect
-        fetch('/get_fortification_ritual_effect', {
-            method: 'POST',
-            body: new URLSearchParams({
-                'ritual_id': selectedRitualId,
-                'csrf_token': csrfToken
-            }),
-            headers: {
-                'Content-Type': 'application/x-www-form-urlencoded'
-            }
-        })
-            .then(response => response.json())
-            .then(data => {
-                var strengthModifier = data.fortification_effective_strength_modifier;
+        referenceData.load()
+            .then(reference => {
+                var ritual = reference.fortificationRituals.get(selectedRitualId);
+                var strengthModifier = ritual ? ritual[2] : 0;
                 var newStrength = maxStrength + strengthModifier;
                 strengthField.value = newStrength;
             })